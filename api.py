@@ -0,0 +1,233 @@
+# api.py — API JSON (ASGI) do Consultor: o mesmo pipeline do app, sem sessão de navegador
+#
+# Uso:
+#   uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+#
+# Rotas:
+#   POST /v1/consulta          resposta única: roteamento, resultado, origem, frete, tempos
+#   POST /v1/consulta/stream   NDJSON com os eventos de consultor.consulta_eventos, à medida que saem
+#   POST /v1/frete             só a cotação: {cep_from, cep_to, dims "CxLxA", peso_kg}
+#   GET  /healthz              vivo
+#   GET  /metrics              métricas do processo (Prometheus)
+#
+# O pipeline é síncrono (requests/OpenAI): cada consulta roda num pool de API_THREADS
+# threads e o event loop só repassa os eventos. Sem estado por sessão: escala com
+# mais workers/réplicas atrás de um balanceador (cada processo tem seus caches; use
+# CONSULTOR_CACHE_DB para compartilhar respostas da IA entre workers da mesma máquina).
+import asyncio
+import contextvars
+import hmac
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import historico
+import metricas
+from consultor import (
+    PESO_MAX_KG, SUPERFRETE_API_TOKEN, EntradaInvalida, consulta_eventos, cotacao_publica, cotar_frete, ler_numero,
+    parse_dimensions, sanitize_cep,
+)
+
+API_TOKEN = os.getenv("API_TOKEN", "")  # Bearer exigido nas rotas /v1 (vazio = aberta)
+API_THREADS = int(os.getenv("API_THREADS", "32"))  # consultas simultâneas por worker
+API_CORS_ORIGENS = [o.strip() for o in os.getenv("API_CORS_ORIGENS", "").split(",") if o.strip()]  # ex.: embed HubSpot
+API_MAX_CORPO = int(os.getenv("API_MAX_CORPO", "65536"))  # bytes
+
+_pool = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api")
+_pool_frete = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api-frete")
+
+class ErroHTTP(Exception):
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+
+# ==================== HTTP (ASGI cru, sem framework) ====================
+def _cabecalhos(scope) -> dict:
+    return {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers") or []}
+
+def _cors(origem: str | None) -> list:
+    if not origem or not API_CORS_ORIGENS:
+        return []
+    if "*" not in API_CORS_ORIGENS and origem not in API_CORS_ORIGENS:
+        return []
+    return [(b"access-control-allow-origin", origem.encode("latin-1")), (b"vary", b"Origin")]
+
+async def _ler_json(receive) -> dict:
+    partes, total = [], 0
+    while True:
+        msg = await receive()
+        if msg["type"] == "http.disconnect":
+            raise ErroHTTP(400, "Conexão encerrada.")
+        corpo = msg.get("body", b"")
+        total += len(corpo)
+        if total > API_MAX_CORPO:
+            raise ErroHTTP(413, "Corpo grande demais.")
+        partes.append(corpo)
+        if not msg.get("more_body"):
+            break
+    try:
+        dados = json.loads(b"".join(partes) or b"{}")
+    except ValueError:
+        raise ErroHTTP(400, "JSON inválido.") from None
+    if not isinstance(dados, dict):
+        raise ErroHTTP(400, "Esperado um objeto JSON.")
+    return dados
+
+async def _responder(send, status: int, corpo, extras: list, tipo: bytes = b"application/json"):
+    if not isinstance(corpo, bytes):
+        corpo = json.dumps(corpo, ensure_ascii=False, default=str).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", tipo), (b"content-length", str(len(corpo)).encode()), *extras]})
+    await send({"type": "http.response.body", "body": corpo})
+
+async def _em_thread(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, contextvars.copy_context().run, func, *args)
+
+async def _eventos_async(dados: dict, streaming: bool):
+    """Roda consulta_eventos numa thread do pool e entrega os eventos ao event loop."""
+    loop = asyncio.get_running_loop()
+    fila: asyncio.Queue = asyncio.Queue()
+    parar = threading.Event()
+    fim = object()
+
+    def produzir():
+        gen = consulta_eventos(dados, executor=_pool_frete, streaming=streaming)
+        try:
+            for ev in gen:
+                loop.call_soon_threadsafe(fila.put_nowait, ev)
+                if parar.is_set():  # cliente desconectou: não gasta mais upstream
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(fila.put_nowait, e)
+        finally:
+            gen.close()
+            loop.call_soon_threadsafe(fila.put_nowait, fim)
+
+    loop.run_in_executor(_pool, contextvars.copy_context().run, produzir)
+    try:
+        while True:
+            ev = await fila.get()
+            if ev is fim:
+                return
+            if isinstance(ev, Exception):
+                raise ev
+            yield ev
+    finally:
+        parar.set()
+
+def _resumo(eventos: list) -> tuple[int, dict]:
+    """Junta os eventos numa resposta única; 422 em validação, 503 se a recomendação falhou."""
+    out, resultado = {}, {}
+    for ev in eventos:
+        tipo = ev["evento"]
+        if tipo == "roteamento":
+            out["roteamento"] = {k: v for k, v in ev.items() if k != "evento"}
+        elif tipo == "campo":
+            resultado[ev["campo"]] = ev["valor"]
+        elif tipo == "consultor":
+            out["origem"] = ev["origem"]
+        elif tipo == "frete":
+            out["frete"] = ev["cotacao"] if ev["cotacao"] is not None else {"motivo": ev.get("motivo")}
+        elif tipo == "matriz":
+            out["matriz"] = {"tabela": ev["tabela"], "stats": ev["stats"]}
+        elif tipo == "erro":
+            out["erro"] = {k: v for k, v in ev.items() if k != "evento"}
+        elif tipo == "fim":
+            out["trace"] = ev["trace"]["trace"]
+            out["tempos"] = ev["trace"]["etapas"]
+    if resultado:
+        out["resultado"] = resultado
+    status = 200
+    if "erro" in out:
+        status = 422 if out["erro"]["etapa"] in ("validacao", "roteamento") else 503
+    return status, out
+
+def _frete(dados: dict) -> tuple[int, dict]:
+    cep_from = sanitize_cep(str(dados.get("cep_from") or ""))
+    cep_to = sanitize_cep(str(dados.get("cep_to") or ""))
+    dims = dados.get("dims")
+    try:
+        if isinstance(dims, list):
+            dims = tuple(ler_numero(x, "dims", 0.1, 300.0) for x in dims) if len(dims) == 3 else None
+        else:
+            dims = parse_dimensions(dims) if isinstance(dims, str) else None
+        peso_kg = ler_numero(dados.get("peso_kg"), "peso_kg", 0.0, PESO_MAX_KG, padrao=0.3)
+    except EntradaInvalida as e:
+        return 422, {"erro": str(e)}
+    if not (cep_from and cep_to and dims):
+        return 422, {"erro": "Informe cep_from, cep_to (8 dígitos) e dims (CxLxA em cm)."}
+    if not SUPERFRETE_API_TOKEN:
+        return 503, {"erro": "Token da SuperFrete não configurado no servidor (SUPERFRETE_API_TOKEN)."}
+    cot = cotar_frete(cep_from, cep_to, dims, peso_kg)
+    if not cot.get("error"):
+        return 200, cotacao_publica(cot)
+    # transitório = SuperFrete fora/instável; o resto é recusa da própria SuperFrete
+    return (503 if cot.get("transitorio") else 502), cotacao_publica(cot)
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                # HISTORICO_AQUECER: caches a partir do histórico, sem atrasar a subida
+                threading.Thread(target=historico.aquecer_na_partida, name="historico-aquecer", daemon=True).start()
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                _pool.shutdown(wait=False)
+                _pool_frete.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    metodo, rota = scope["method"], scope["path"].rstrip("/") or "/"
+    h = _cabecalhos(scope)
+    extras = _cors(h.get("origin"))
+    try:
+        if metodo == "OPTIONS" and extras:
+            await _responder(send, 204, b"", extras + [
+                (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                (b"access-control-allow-headers", b"authorization, content-type"),
+                (b"access-control-max-age", b"600")])
+            return
+        if rota == "/healthz":
+            await _responder(send, 200, {"ok": True}, extras)
+            return
+        if rota == "/metrics":
+            from cache import stats_caches
+            from clientes import stats_conexoes
+            from similares import stats_similares
+            texto = metricas.REGISTRO.prometheus({"cache": {**stats_caches(), **stats_similares()},
+                                                  "conexoes": stats_conexoes()})
+            await _responder(send, 200, texto.encode("utf-8"), extras, b"text/plain; version=0.0.4; charset=utf-8")
+            return
+        if not rota.startswith("/v1/"):
+            raise ErroHTTP(404, "Rota desconhecida.")
+        if metodo != "POST":
+            raise ErroHTTP(405, "Use POST.")
+        if API_TOKEN and not hmac.compare_digest(h.get("authorization", ""), f"Bearer {API_TOKEN}"):
+            raise ErroHTTP(401, "Token inválido.")
+        dados = await _ler_json(receive)
+
+        if rota == "/v1/consulta":
+            eventos = [ev async for ev in _eventos_async(dados, streaming=False)]
+            status, corpo = _resumo(eventos)
+            await _responder(send, status, corpo, extras)
+        elif rota == "/v1/consulta/stream":
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-store"), *extras]})
+            async for ev in _eventos_async(dados, streaming=bool(dados.get("streaming", True))):
+                linha = (json.dumps(ev, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                await send({"type": "http.response.body", "body": linha, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        elif rota == "/v1/frete":
+            status, corpo = await _em_thread(_frete, dados)
+            await _responder(send, status, corpo, extras)
+        else:
+            raise ErroHTTP(404, "Rota desconhecida.")
+        metricas.incrementar("api_requests_total", rota=rota)
+    except ErroHTTP as e:
+        metricas.incrementar("api_erros_total", status=e.status)
+        await _responder(send, e.status, {"erro": str(e)}, extras)
@@ -0,0 +1,225 @@
+# batch.py — consultoria em lote: catálogo CSV/JSONL -> embalagem (+ frete) em JSONL
+#
+# Uso:
+#   python batch.py catalogo.csv -o saida.jsonl --concorrencia 8
+#   python batch.py catalogo.jsonl -o saida.jsonl --frete --cep-from 01001000
+#
+# Colunas/campos reconhecidos (os ausentes usam o padrão do formulário):
+#   sku|id, produto, categoria, fragilidade, dimensoes (CxLxA), peso_kg, qtd,
+#   tamanho_roupa, dores (separadas por ';'), cep_from, cep_to
+#
+# A saída é o próprio checkpoint: cada linha processada é gravada (e flushada) na
+# ordem do catálogo; ao reexecutar, SKUs já presentes em `saida` sem "erro" são pulados
+# e os com erro são refeitos (a nova linha vem depois; vale a última de cada id).
+# Cada linha passa pela mesma validação da API (validar_entrada): campo inválido vira
+# "erro" naquela linha e o lote continua.
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache import TTLCache, chave_normalizada
+from consultor import (
+    SUPERFRETE_API_TOKEN, EntradaInvalida, classificar_familia, sanitize_cep, parse_dimensions,
+    preparar_consulta, consultar_embalagem, cotar_frete, cotacao_publica, validar_entrada,
+)
+
+# ==================== LEITURA ====================
+def ler_catalogo(path: str):
+    """Gera (id, linha) do catálogo sem carregá-lo inteiro; id = sku/id ou nº da linha."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+    try:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            linhas = (json.loads(t) for t in f if t.strip())
+        else:
+            linhas = csv.DictReader(f)
+        for n, row in enumerate(linhas, start=1):
+            row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+            rid = str(row.get("sku") or row.get("id") or n)
+            yield rid, row
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def ids_processados(path: str) -> set:
+    """IDs já gravados sem erro numa saída anterior (para retomar; os com erro são refeitos)."""
+    feitos = set()
+    if not path or not os.path.exists(path):
+        return feitos
+    with open(path, encoding="utf-8") as f:
+        for t in f:
+            try:
+                rec = json.loads(t)
+                if "erro" not in rec:
+                    feitos.add(str(rec["id"]))
+            except (ValueError, KeyError, TypeError):
+                continue  # linha truncada por interrupção: reprocessa
+    return feitos
+
+def _primeiro(row: dict, *campos):
+    for c in campos:
+        if row.get(c) not in (None, ""):
+            return row[c]
+    return None
+
+def normalizar_linha(row: dict, cep_from: str | None = None, cep_to: str | None = None) -> dict:
+    """Linha do catálogo -> campos do envio, ainda sem validar (sem o id, para deduplicar linhas iguais)."""
+    dores = row.get("dores") or []
+    if isinstance(dores, str):
+        dores = [d.strip() for d in dores.split(";") if d.strip()]
+    elif isinstance(dores, list) and all(isinstance(d, str) for d in dores):
+        dores = sorted(dores)
+    produto = row.get("produto")
+    return {
+        "produto": produto.strip() if isinstance(produto, str) else produto,
+        "categoria": row.get("categoria"),
+        "fragilidade": row.get("fragilidade"),
+        "dim": _primeiro(row, "dimensoes", "dimensoes_cm", "dim"),
+        "peso_kg": _primeiro(row, "peso_kg", "peso"),
+        "qtd": _primeiro(row, "qtd", "qtd_por_envio"),
+        "tamanho_roupa": row.get("tamanho_roupa"),
+        "dores": dores,
+        "cep_from": row.get("cep_from") or cep_from,
+        "cep_to": row.get("cep_to") or cep_to,
+    }
+
+# ==================== PROCESSAMENTO ====================
+def processar_item(item: dict, com_frete: bool = False) -> dict:
+    """Roda o pipeline para uma linha normalizada; erros viram campo 'erro' (o lote continua)."""
+    out = {"produto": item.get("produto")}
+    try:
+        dados = validar_entrada(item)
+    except EntradaInvalida as e:
+        out["erro"] = f"Entrada: {e}"
+        return out
+    try:
+        return _processar(dados, com_frete, out)
+    except Exception as e:
+        out["erro"] = f"{type(e).__name__}: {e}"
+        return out
+
+def _processar(item: dict, com_frete: bool, out: dict) -> dict:
+    out["familia"] = classificar_familia(item["produto"])
+    prep = preparar_consulta(
+        item["produto"], item["fragilidade"], qtd=item["qtd"], peso_kg=item["peso_kg"],
+        categoria=item["categoria"], dim=item["dim"], nao_sei_dim=not parse_dimensions(item["dim"] or ""),
+        tamanho_roupa=item["tamanho_roupa"], dores=item["dores"],
+    )
+    if not prep:
+        out["erro"] = "Sem dimensões válidas."
+        return out
+    out["tipo_preferido"] = prep["tipo_preferido"]
+    out["embalagem_hint"] = prep["embalagem_hint"]
+    if prep["empacotamento"]:
+        out["embalagem"] = prep["empacotamento"]["nome"]
+    try:
+        result, out["origem"] = consultar_embalagem(prep)
+    except Exception as e:
+        out["erro"] = f"IA: {e}"
+        return out
+    out["result"] = result
+
+    cep_from, cep_to = sanitize_cep(item["cep_from"]), sanitize_cep(item["cep_to"])
+    if com_frete and cep_from and cep_to and SUPERFRETE_API_TOKEN:
+        caixa = result.get("caixa_recomendada", {}) or {}
+        dims_caixa = parse_dimensions(caixa.get("dimensoes_cm") or "") or prep["dims_hint"]
+        try:
+            cot = cotar_frete(cep_from, cep_to, dims_caixa, prep["peso_envio_kg"])
+        except Exception as e:
+            out["erro"] = f"Frete: {e}"
+            return out
+        out["frete"] = cotacao_publica(cot)
+    return out
+
+def run_batch(entrada: str, saida: str, concorrencia: int = 4, com_frete: bool = False,
+              cep_from: str | None = None, cep_to: str | None = None, retomar: bool = True,
+              dedup_max: int = 10000, progresso=None) -> dict:
+    """Processa o catálogo em streaming com até `concorrencia` itens em paralelo.
+
+    A ordem da saída segue a do catálogo; linhas idênticas (exceto o id) reaproveitam
+    o mesmo processamento. Devolve contadores e itens/s.
+    """
+    feitos = ids_processados(saida) if retomar else set()
+    modo = "a" if retomar else "w"
+    janela = deque()  # (id, chave, future) na ordem do catálogo
+    em_voo: dict[str, object] = {}  # chave da linha -> future (dedup enquanto processa)
+    prontos = TTLCache(maxsize=dedup_max, ttl=0)  # chave da linha -> resultado (dedup após processar)
+    stats = {"lidos": 0, "pulados": 0, "processados": 0, "duplicados": 0, "erros": 0}
+    t0 = time.perf_counter()
+
+    def _gravar(f, rid, res):
+        rec = {"id": rid, **res}
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush()
+        stats["processados"] += 1
+        if "erro" in res:
+            stats["erros"] += 1
+        if progresso:
+            progresso(stats)
+
+    with open(saida, modo, encoding="utf-8") as f, ThreadPoolExecutor(max_workers=concorrencia) as ex:
+        def _escoar(limite):
+            while len(janela) > limite:
+                rid, chave, fut = janela.popleft()
+                res = fut.result()
+                if em_voo.get(chave) is fut:
+                    em_voo.pop(chave)
+                    prontos.set(chave, res)
+                _gravar(f, rid, res)
+
+        for rid, row in ler_catalogo(entrada):
+            stats["lidos"] += 1
+            if rid in feitos:
+                stats["pulados"] += 1
+                continue
+            item = normalizar_linha(row, cep_from, cep_to)
+            chave = chave_normalizada("batch", com_frete, item)
+            fut = em_voo.get(chave)
+            res = prontos.get(chave) if fut is None else None
+            if res is not None:
+                stats["duplicados"] += 1
+                fut = Future()
+                fut.set_result(res)
+            elif fut is None:
+                fut = em_voo[chave] = ex.submit(processar_item, item, com_frete)
+            else:
+                stats["duplicados"] += 1
+            janela.append((rid, chave, fut))
+            # janela limitada: memória constante independentemente do tamanho do catálogo
+            _escoar(concorrencia * 2)
+        _escoar(0)
+
+    dur = time.perf_counter() - t0
+    stats["segundos"] = round(dur, 3)
+    stats["itens_por_s"] = round(stats["processados"] / dur, 2) if dur > 0 else 0.0
+    return stats
+
+# ==================== CLI ====================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Consultor de Embalagens em lote (CSV/JSONL -> JSONL).")
+    ap.add_argument("entrada", help="catálogo .csv ou .jsonl ('-' = stdin CSV)")
+    ap.add_argument("-o", "--saida", required=True, help="arquivo JSONL de saída (também é o checkpoint)")
+    ap.add_argument("-c", "--concorrencia", type=int, default=4)
+    ap.add_argument("--frete", action="store_true", help="cota frete na SuperFrete quando houver CEPs")
+    ap.add_argument("--cep-from", help="CEP de origem padrão")
+    ap.add_argument("--cep-to", help="CEP de destino padrão")
+    ap.add_argument("--do-zero", action="store_true", help="ignora a saída existente e recomeça")
+    args = ap.parse_args(argv)
+
+    def _progresso(s):
+        if s["processados"] % 100 == 0:
+            print(f"... {s['processados']} itens", file=sys.stderr)
+
+    stats = run_batch(
+        args.entrada, args.saida, concorrencia=max(1, args.concorrencia), com_frete=args.frete,
+        cep_from=args.cep_from, cep_to=args.cep_to, retomar=not args.do_zero, progresso=_progresso,
+    )
+    print(json.dumps(stats, ensure_ascii=False), file=sys.stderr)
+    print(f"{stats['processados']} itens em {stats['segundos']}s ({stats['itens_por_s']} itens/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# benchmarks/carga.py — teste de carga do pipeline inteiro (sem navegador)
+#
+# Uso:
+#   python benchmarks/carga.py --mock -n 500 -c 32 --distintos 50
+#   python benchmarks/carga.py --mock --streaming --latencia-ia-ms 2500 --taxa-429-ia 0.05
+#   python benchmarks/carga.py --mock --sem-cache -n 200 -c 16 --json > antes.json
+#
+# Cada envio é consultor.consulta_eventos, o fluxo do app e da API: validação -> roteamento ->
+# frete em paralelo com a IA (streaming opcional) -> recotação se a caixa mudou. Com --mock sobe servidor_mock.py
+# na mesma máquina e aponta SuperFrete/OpenAI para ele ANTES de importar o consultor.
+# Relata vazão e p50/p95/p99 do total e de cada etapa, origens, erros, caches e reuso de conexões.
+import argparse
+import contextvars
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# raiz do repo antes de benchmarks/ (que tem um classificador.py próprio)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import servidor_mock  # noqa: E402
+
+PRODUTOS = [
+    ("camiseta básica", "Moda", "Baixa", None, 0.2),
+    ("moletom com capuz", "Moda", "Baixa", None, 0.6),
+    ("caneca de porcelana 300ml", "Artesanato", "Alta", "12x9x10", 0.35),
+    ("livro A5 capa dura", "Papelaria", "Média", "22x16x4", 0.45),
+    ("mouse sem fio", "Eletrônicos leves", "Média", "14x10x7", 0.15),
+    ("perfume 100ml", "Cosméticos", "Alta", "16x8x8", 0.3),
+    ("colar de prata", "Outros", "Média", "10x10x5", 0.05),
+    ("luminária de mesa", "Outros", "Alta", "35x20x20", 1.2),
+]
+CEPS = ["01001000", "20010000", "30130000", "40010000", "69005000", "80010000", "90010000"]
+
+def amostras(distintos: int, seed: int):
+    """`distintos` combinações produto x qtd x CEPs; a repetição entre envios exercita os caches."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(max(1, distintos)):
+        produto, categoria, fragilidade, dim, peso = PRODUTOS[i % len(PRODUTOS)]
+        out.append({
+            "produto": produto if i < len(PRODUTOS) else f"{produto} #{i}",
+            "categoria": categoria, "fragilidade": fragilidade, "dim": dim, "nao_sei_dim": dim is None,
+            "peso_kg": peso, "qtd": 1 if rng.random() < 0.7 else rng.randint(2, 6),
+            "cep_from": rng.choice(CEPS), "cep_to": rng.choice(CEPS),
+        })
+    return out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Teste de carga do Consultor de Embalagens (pipeline completo).")
+    ap.add_argument("-n", "--envios", type=int, default=200)
+    ap.add_argument("-c", "--concorrencia", type=int, default=16)
+    ap.add_argument("--distintos", type=int, default=50, help="envios distintos (o resto repete: acerto de cache)")
+    ap.add_argument("--streaming", action="store_true", help="consome a IA em streaming, como a tela")
+    ap.add_argument("--modo", choices=("ia", "regras", "auto"), default=None, help="CONSULTOR_MODO")
+    ap.add_argument("--sem-cache", action="store_true", help="desliga os caches de IA e frete")
+    ap.add_argument("--mock", action="store_true", help="sobe o servidor mock e aponta as APIs para ele")
+    ap.add_argument("--porta-mock", type=int, default=0, help="0 = porta livre")
+    ap.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    servidor_mock.adicionar_argumentos(ap)
+    args = ap.parse_args(argv)
+
+    srv = None
+    if args.mock:
+        srv = servidor_mock.iniciar(args.porta_mock, **servidor_mock.config_de_args(args))
+        url = "http://127.0.0.1:%d" % srv.server_address[1]
+        os.environ.update({"SUPERFRETE_BASE_URL": url, "SUPERFRETE_API_TOKEN": "mock",
+                           "OPENAI_BASE_URL": url + "/v1", "OPENAI_API_KEY": "mock"})
+    if args.modo:
+        os.environ["CONSULTOR_MODO"] = args.modo
+    if args.sem_cache:
+        os.environ.update({"CONSULTOR_CACHE_MAX": "0", "CONSULTOR_CACHE_DB": "", "SUPERFRETE_CACHE_MAX": "0"})
+    # HTTP_POOL_SIZE acompanha a concorrência (frete + IA por envio)
+    os.environ.setdefault("HTTP_POOL_SIZE", str(max(20, args.concorrencia * 2)))
+
+    # só agora: consultor/clientes leem a configuração do ambiente no import
+    import consultor
+    import metricas
+    import resiliencia
+    from cache import stats_caches
+    from clientes import stats_conexoes
+    from similares import stats_similares
+
+    frete_pool = ThreadPoolExecutor(max_workers=max(1, args.concorrencia))
+
+    def envio(a: dict) -> dict:
+        # o mesmo pipeline do app e da API: consome os eventos e fica com o registro do trace
+        reg = {}
+        for ev in consultor.consulta_eventos(a, executor=frete_pool, streaming=args.streaming):
+            if ev["evento"] == "frete" and ev.get("cotacao"):
+                cot = ev["cotacao"]
+                if cot.get("error"):
+                    metricas.anotar(erro_frete=cot["error"][:80])
+                elif cot.get("stale"):
+                    metricas.anotar(frete_stale=1)
+            elif ev["evento"] == "fim":
+                reg = ev["trace"]
+        return reg
+
+    lote = amostras(args.distintos, args.seed or 0)
+    rng = random.Random(args.seed)
+    fila = [rng.choice(lote) for _ in range(args.envios)]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concorrencia)) as ex:
+        regs = list(ex.map(lambda a: contextvars.copy_context().run(envio, a), fila))
+    dur = time.perf_counter() - t0
+    frete_pool.shutdown()
+
+    # percentis com o mesmo Registro das métricas do app (janela do tamanho do teste)
+    reg = metricas.Registro(amostras=max(1, len(regs)))
+    origens, erros = {}, {}
+    for r in regs:
+        reg.observar("total_s", r["total_s"])
+        for etapa, s in r["etapas"].items():
+            reg.observar("etapa_s", s, etapa=etapa)
+        if "primeiro_conteudo_s" in r:
+            reg.observar("primeiro_conteudo_s", r["primeiro_conteudo_s"])
+        if r.get("origem"):
+            origens[r["origem"]] = origens.get(r["origem"], 0) + 1
+        for k in ("erro", "erro_frete"):
+            if r.get(k):
+                erros[f"{k}:{r[k]}"] = erros.get(f"{k}:{r[k]}", 0) + 1
+
+    relatorio = {
+        "envios": len(regs), "concorrencia": args.concorrencia, "segundos": round(dur, 3),
+        "envios_por_s": round(len(regs) / dur, 2) if dur > 0 else 0.0,
+        "latencias": [{k: (round(v, 4) if isinstance(v, float) else v) for k, v in l.items()} for l in reg.resumo()],
+        "origens": origens, "erros": erros,
+        "contadores": [c for c in metricas.REGISTRO.contadores() if c["metrica"] != "etapa_segundos"],
+        "caches": {**stats_caches(), **stats_similares()}, "conexoes": stats_conexoes(), "upstreams": resiliencia.estado_upstreams(),
+    }
+    if srv is not None:
+        with srv.lock:
+            relatorio["mock"] = dict(srv.contagem)
+        srv.shutdown()
+
+    if args.json:
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+        return
+    print(f"{relatorio['envios']} envios, concorrência {args.concorrencia}: "
+          f"{relatorio['segundos']}s ({relatorio['envios_por_s']} envios/s)")
+    print(f"{'série':<28}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for l in relatorio["latencias"]:
+        nome = l["metrica"] + (f"[{l['etapa']}]" if "etapa" in l else "")
+        print(f"{nome:<28}{l['n']:>6}{l['p50']:>9.3f}{l['p95']:>9.3f}{l['p99']:>9.3f}")
+    print("origens:", origens)
+    if erros:
+        print("erros:", erros)
+    for nome, s in relatorio["caches"].items():
+        print(f"cache {nome}: hit_rate {s.get('hit_rate')} ({s.get('itens')} itens)")
+    for nome, s in relatorio["conexoes"].items():
+        print(f"conexões {nome}: {s['requests']} requests, {s['conexoes_novas']} novas, reuso {s['reuso']}")
+    if "mock" in relatorio:
+        print("mock:", relatorio["mock"])
+
+if __name__ == "__main__":
+    main()
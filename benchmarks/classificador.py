@@ -0,0 +1,76 @@
+# benchmarks/classificador.py — custo por chamada: varredura linear x índice pré-compilado
+#
+# Uso: python benchmarks/classificador.py [--chamadas 20000]
+#
+# Cresce a tabela de palavras-chave com termos sintéticos e mede µs/chamada de:
+#   linear  : a implementação antiga (`any(k in p for k in kws)` por família)
+#   indice  : ClassificadorPalavras (sem memo)
+#   memo    : índice + lru_cache, como em consultor.classificar_familia
+import argparse
+import os
+import random
+import sys
+import time
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from classificador import ClassificadorPalavras  # noqa: E402
+
+FAMILIAS_BASE = {
+    "textil": ["camiseta", "blusa", "moletom", "calça", "bermuda", "meia", "roupa", "pijama", "boné"],
+    "livro_papel": ["livro", "caderno", "planner", "revista", "hq", "mangá", "a4", "a5"],
+    "ceramica_vidro": ["caneca", "xícara", "taça", "vidro", "garrafa", "vaso", "porcelana", "cerâmica"],
+    "eletronicos_leves": ["fone", "headset", "mouse", "teclado", "pendrive", "carregador", "cabo"],
+    "cosmeticos": ["perfume", "shampoo", "creme", "hidratante", "maquiagem", "batom", "sérum"],
+    "joias_acessorios": ["colar", "pulseira", "anel", "brinco", "óculos", "relógio"],
+}
+
+PRODUTOS = [
+    "camiseta básica M", "caneca de porcelana 300ml", "livro A5 capa dura", "mouse sem fio",
+    "perfume 100ml", "colar de prata", "luminária de mesa", "kit 3 xícaras de cerâmica",
+    "fone bluetooth", "quadro decorativo 40x60",
+]
+
+def linear(familias):
+    def classificar(produto):
+        p = (produto or "").lower()
+        for fam, kws in familias.items():
+            if any(k in p for k in kws):
+                return fam
+        return "outros"
+    return classificar
+
+def tabela(n_kws: int, rng: random.Random) -> dict:
+    fams = {f: list(k) for f, k in FAMILIAS_BASE.items()}
+    nomes = list(fams)
+    base = sum(len(k) for k in fams.values())
+    for i in range(max(0, n_kws - base)):
+        termo = "".join(rng.choice("bcdfgjklmnpqrstvz") + rng.choice("aeiou") for _ in range(4)) + str(i)
+        fams[nomes[i % len(nomes)]].append(termo)
+    return fams
+
+def medir(fn, chamadas: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(chamadas):
+        fn(PRODUTOS[i % len(PRODUTOS)])
+    return (time.perf_counter() - t0) / chamadas * 1e6
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Microbenchmark do classificador de família.")
+    ap.add_argument("--chamadas", type=int, default=20000)
+    args = ap.parse_args(argv)
+    rng = random.Random(42)
+
+    print(f"{'palavras':>9} {'linear µs':>10} {'indice µs':>10} {'memo µs':>8} {'build ms':>9}")
+    for n in (50, 500, 2000, 5000, 20000):
+        fams = tabela(n, rng)
+        t0 = time.perf_counter()
+        clf = ClassificadorPalavras(fams)
+        build_ms = (time.perf_counter() - t0) * 1e3
+        memo = lru_cache(maxsize=4096)(clf.classificar)
+        lin = linear(fams)
+        print(f"{n:>9} {medir(lin, args.chamadas):>10.2f} {medir(clf.classificar, args.chamadas):>10.2f} "
+              f"{medir(memo, args.chamadas):>8.2f} {build_ms:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/partida.py — custo de partida (cold start) e de rerun da página Streamlit
+#
+# Uso:
+#   python benchmarks/partida.py                 # 5 partidas a frio, 20 reruns em cada
+#   python benchmarks/partida.py -n 10 --reruns 50 --json > antes.json
+#
+# Cada medida roda num processo novo (caches de import e st.cache_resource zerados):
+#   import_s[módulo]    import isolado (python -X importtime) dos módulos pesados
+#   primeira_pintura_s  AppTest executa app.py do zero até o fim do formulário (o runtime do
+#                       Streamlit já carregado, como num servidor que acabou de subir)
+#   rerun_s             reexecuções seguintes do script (após o aquecimento): o custo de cada interação
+#   na_pintura          módulos pesados já carregados quando a 1ª pintura termina
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS = ["streamlit", "consultor", "api", "openai", "numpy", "requests", "metricas"]
+PESADOS = ["consultor", "openai", "numpy", "requests", "metricas"]
+
+def tempo_import(modulo: str) -> float:
+    """Segundos do import de `modulo` num interpretador novo (tempo cumulativo do -X importtime)."""
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                       cwd=RAIZ, capture_output=True, text=True)
+    if r.returncode != 0:
+        return float("nan")
+    ultima = [l for l in r.stderr.splitlines() if l.startswith("import time:")][-1]
+    return int(ultima.split("|")[1]) / 1e6
+
+def filho(reruns: int):
+    """Uma partida a frio (roda no processo filho); imprime o resultado em JSON."""
+    sys.path.insert(0, RAIZ)
+    import threading
+    from streamlit.testing.v1 import AppTest
+
+    # um script vazio antes: o runtime do Streamlit já carregado, como num servidor no ar
+    AppTest.from_string("import streamlit as st\nst.write('ok')").run()
+    t0 = time.perf_counter()
+    at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=60).run()
+    pintura = time.perf_counter() - t0
+    na_pintura = [m for m in PESADOS if m in sys.modules]
+    if at.exception:
+        raise SystemExit(f"app.py falhou: {at.exception[0].message}")
+    # reruns em regime: espera o aquecimento em segundo plano (se houver) terminar
+    for t in threading.enumerate():
+        if t.name == "aquecimento":
+            t.join()
+    tempos = []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        at.run()
+        tempos.append(time.perf_counter() - t0)
+    print(json.dumps({"primeira_pintura_s": pintura, "rerun_s": tempos, "na_pintura": na_pintura,
+                      "widgets": len(at.text_input) + len(at.selectbox) + len(at.number_input)}))
+
+def _resumo(valores: list) -> dict:
+    ordenado = sorted(valores)
+    return {"n": len(ordenado), "p50": round(statistics.median(ordenado), 4),
+            "p95": round(ordenado[max(0, int(0.95 * len(ordenado)) - 1)], 4), "max": round(ordenado[-1], 4)}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Partida a frio e custo de rerun da página Streamlit.")
+    ap.add_argument("-n", "--partidas", type=int, default=5, help="processos novos (partidas a frio)")
+    ap.add_argument("--reruns", type=int, default=20, help="reruns medidos em cada partida")
+    ap.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    ap.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.filho:
+        filho(args.reruns)
+        return
+
+    imports = {m: _resumo([tempo_import(m) for _ in range(max(1, args.partidas))]) for m in MODULOS}
+    pinturas, reruns, na_pintura = [], [], {}
+    for _ in range(max(1, args.partidas)):
+        r = subprocess.run([sys.executable, os.path.abspath(__file__), "--filho", "--reruns", str(args.reruns)],
+                           cwd=RAIZ, capture_output=True, text=True)
+        if r.returncode != 0:
+            raise SystemExit(r.stderr.strip()[-2000:])
+        d = json.loads(r.stdout.strip().splitlines()[-1])
+        pinturas.append(d["primeira_pintura_s"])
+        reruns.extend(d["rerun_s"])
+        for m in d["na_pintura"]:
+            na_pintura[m] = na_pintura.get(m, 0) + 1
+
+    relatorio = {"import_s": imports, "primeira_pintura_s": _resumo(pinturas),
+                 "rerun_s": _resumo(reruns) if reruns else None, "na_pintura": na_pintura}
+    if args.json:
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+        return
+    print(f"{'série':<28}{'n':>5}{'p50':>9}{'p95':>9}{'max':>9}")
+    linhas = [(f"import[{m}]", s) for m, s in imports.items()]
+    linhas += [("primeira_pintura", relatorio["primeira_pintura_s"])]
+    if reruns:
+        linhas += [("rerun", relatorio["rerun_s"])]
+    for nome, s in linhas:
+        print(f"{nome:<28}{s['n']:>5}{s['p50']:>9.3f}{s['p95']:>9.3f}{s['max']:>9.3f}")
+    print("carregados na 1ª pintura:", na_pintura or "nenhum dos pesados")
+
+if __name__ == "__main__":
+    main()
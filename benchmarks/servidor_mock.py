@@ -0,0 +1,275 @@
+# benchmarks/servidor_mock.py — SuperFrete + OpenAI de mentira, para medir sem gastar
+#
+# Uso:
+#   python benchmarks/servidor_mock.py --porta 8089 --latencia-frete-ms 300 --taxa-429-ia 0.05
+#
+# e aponte o app/batch para ele:
+#   SUPERFRETE_BASE_URL=http://127.0.0.1:8089  SUPERFRETE_API_TOKEN=mock
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1   OPENAI_API_KEY=mock
+#
+# Endpoints:
+#   POST /api/v0/calculator       ofertas nos formatos que _norm_offer aceita
+#                                 (lista, {"data"}, {"quotes"}, {"results"}; "rotativo" alterna)
+#   POST /v1/chat/completions     resposta no schema do consultor, com ou sem stream (SSE)
+# Latência (média ± jitter), taxa de 5xx e taxa de 429 (com Retry-After) por upstream.
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FORMATOS = ("lista", "data", "quotes", "results")
+
+CONFIG_PADRAO = {
+    "latencia_frete_ms": 250.0,
+    "latencia_ia_ms": 1500.0,   # até o 1º token (streaming) ou resposta inteira
+    "pedaco_ia_ms": 15.0,       # entre pedaços do streaming
+    "jitter": 0.3,              # latência uniforme em [média*(1-j), média*(1+j)]
+    "erro_frete": 0.0,          # fração de 503
+    "erro_ia": 0.0,             # fração de 500
+    "taxa_429_frete": 0.0,
+    "taxa_429_ia": 0.0,
+    "retry_after_s": 1.0,
+    "formato": "rotativo",
+    "seed": None,
+}
+
+# ==================== RESPOSTAS ====================
+def ofertas_frete(body: dict) -> list[dict]:
+    """Ofertas determinísticas pelo pacote e pela distância aproximada (1º dígito dos CEPs)."""
+    pkg = body.get("package") or {}
+    peso = float(pkg.get("weight") or 0.3)
+    vol = float(pkg.get("length") or 1) * float(pkg.get("width") or 1) * float(pkg.get("height") or 1)
+    tarifado = max(peso, vol / 6000.0)
+    origem = str((body.get("from") or {}).get("postal_code") or "0")[:1]
+    destino = str((body.get("to") or {}).get("postal_code") or "0")[:1]
+    dist = abs(int(origem or 0) - int(destino or 0))
+    base = 14.0 + 6.5 * tarifado + 2.2 * dist
+    return [
+        {"company": {"name": "Correios"}, "name": "PAC", "service": "PAC",
+         "price": round(base, 2), "delivery_time": {"days": 5 + dist}},
+        {"company": {"name": "Correios"}, "name": "SEDEX", "service": "SEDEX",
+         "price": round(base * 1.8, 2), "delivery_time": {"days": 1 + dist // 2}},
+        {"company": "Jadlog", "service_name": ".Package", "total": round(base * 1.1, 2), "deadline": 4 + dist},
+    ]
+
+def envelopar(ofertas: list, formato: str):
+    if formato == "lista":
+        return ofertas
+    return {formato: ofertas}
+
+def resposta_consultor(texto_usuario: str) -> dict:
+    """JSON no schema do consultor (prompts.py), com o tipo/dimensões do prompt quando houver."""
+    def _linha(rotulo, padrao):
+        for l in texto_usuario.splitlines():
+            if l.strip().lstrip("- ").startswith(f"{rotulo}:"):
+                return l.split(":", 1)[1].strip() or padrao
+        return padrao
+
+    produto = _linha("Produto", "o item")
+    tipo = _linha("Tipo preferido", "Caixa de papelão padrão")
+    dims = _linha("Dimensões sugeridas da embalagem", "20x15x10")
+    return {
+        "resumo_curto": f"Para {produto}: {tipo.lower()} de {dims} cm com proteção adequada.",
+        "caixa_recomendada": {"descricao": tipo, "dimensoes_cm": dims,
+                              "justificativa": "Segue a diretriz do roteador (resposta simulada)."},
+        "protecao_interna": [{"tipo": "Plástico bolha", "qtde_sugerida": "1-2 voltas", "observacao": "Envolva o item."}],
+        "lacres_e_reforcos": [{"tipo": "Fita adesiva em H", "observacao": "Fecha as abas."}],
+        "boas_praticas": ["Teste de sacudir", "Etiqueta na face maior", "Evite folga excessiva"],
+        "riscos_e_mitigacoes": [{"risco": "Impacto", "mitigacao": "Acolchoamento em todos os lados."}],
+        "impacto_cubagem": {"comentario": "Folga mínima mantém o peso cubado baixo."},
+    }
+
+def _tokens(texto: str) -> int:
+    return max(1, len(texto) // 4)  # ~4 caracteres por token
+
+# ==================== SERVIDOR ====================
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: mede o reuso de conexões dos clientes
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def cfg(self) -> dict:
+        return self.server.config
+
+    def _sortear(self, p: float) -> bool:
+        with self.server.lock:
+            return self.server.rng.random() < p
+
+    def _dormir(self, media_ms: float):
+        j = self.cfg["jitter"]
+        with self.server.lock:
+            ms = self.server.rng.uniform(media_ms * (1 - j), media_ms * (1 + j))
+        time.sleep(max(0.0, ms) / 1000.0)
+
+    def _json(self, status: int, obj, headers: dict | None = None):
+        corpo = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _contar(self, chave: str):
+        with self.server.lock:
+            self.server.contagem[chave] = self.server.contagem.get(chave, 0) + 1
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(n) or b"{}")
+        except ValueError:
+            self._json(400, {"error": "JSON inválido"})
+            return
+        rota = self.path.split("?")[0].rstrip("/")
+        if rota == "/api/v0/calculator":
+            self._calculadora(body)
+        elif rota in ("/v1/chat/completions", "/chat/completions"):
+            self._chat(body)
+        else:
+            self._json(404, {"error": "rota desconhecida"})
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/stats":
+            with self.server.lock:
+                self._json(200, dict(self.server.contagem))
+            return
+        self._json(404, {"error": "rota desconhecida"})
+
+    # ---- SuperFrete
+    def _calculadora(self, body: dict):
+        self._dormir(self.cfg["latencia_frete_ms"])
+        if self._sortear(self.cfg["taxa_429_frete"]):
+            self._contar("frete_429")
+            self._json(429, {"message": "Too Many Attempts."}, {"Retry-After": str(self.cfg["retry_after_s"])})
+            return
+        if self._sortear(self.cfg["erro_frete"]):
+            self._contar("frete_5xx")
+            self._json(503, {"message": "Service Unavailable"})
+            return
+        formato = self.cfg["formato"]
+        if formato == "rotativo":
+            with self.server.lock:
+                self.server.rodada += 1
+                formato = FORMATOS[self.server.rodada % len(FORMATOS)]
+        self._contar("frete_ok")
+        self._json(200, envelopar(ofertas_frete(body), formato))
+
+    # ---- OpenAI
+    def _chat(self, body: dict):
+        msgs = body.get("messages") or []
+        texto_usuario = next((m.get("content") or "" for m in reversed(msgs) if m.get("role") == "user"), "")
+        prompt_tokens = sum(_tokens(str(m.get("content") or "")) for m in msgs)
+        stream = bool(body.get("stream"))
+
+        # em streaming a latência configurada é o tempo até o 1º token
+        self._dormir(self.cfg["latencia_ia_ms"])
+        if self._sortear(self.cfg["taxa_429_ia"]):
+            self._contar("ia_429")
+            self._json(429, {"error": {"message": "Rate limit reached (mock).", "type": "requests",
+                                       "code": "rate_limit_exceeded"}},
+                       {"retry-after": str(self.cfg["retry_after_s"])})
+            return
+        if self._sortear(self.cfg["erro_ia"]):
+            self._contar("ia_5xx")
+            self._json(500, {"error": {"message": "The server had an error (mock).", "type": "server_error"}})
+            return
+
+        resposta = resposta_consultor(texto_usuario)
+        schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema")
+        if schema:  # structured outputs: só os campos pedidos
+            resposta = {k: v for k, v in resposta.items() if k in schema.get("properties", {})}
+        conteudo = json.dumps(resposta, ensure_ascii=False)
+        fim = "stop"
+        if body.get("max_tokens") and _tokens(conteudo) > body["max_tokens"]:
+            conteudo, fim = conteudo[:body["max_tokens"] * 4], "length"  # corta como o modelo real
+        uso = {"prompt_tokens": prompt_tokens, "completion_tokens": _tokens(conteudo),
+               "total_tokens": prompt_tokens + _tokens(conteudo)}
+        base = {"id": "chatcmpl-" + uuid.uuid4().hex[:12], "created": int(time.time()),
+                "model": body.get("model") or "gpt-4o-mini"}
+        self._contar("ia_ok")
+        if not stream:
+            self._json(200, {**base, "object": "chat.completion", "usage": uso, "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": conteudo}, "finish_reason": fim}]})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def _evento(obj):
+            dados = f"data: {obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(dados):x}\r\n".encode() + dados + b"\r\n")
+            self.wfile.flush()
+
+        def _delta(delta, fim=None):
+            return {**base, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": fim}]}
+
+        _evento(_delta({"role": "assistant", "content": ""}))
+        for i in range(0, len(conteudo), 24):
+            _evento(_delta({"content": conteudo[i:i + 24]}))
+            if self.cfg["pedaco_ia_ms"]:
+                time.sleep(self.cfg["pedaco_ia_ms"] / 1000.0)
+        _evento(_delta({}, fim))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            _evento({**base, "object": "chat.completion.chunk", "choices": [], "usage": uso})
+        _evento("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+def iniciar(porta: int = 8089, host: str = "127.0.0.1", **config) -> ThreadingHTTPServer:
+    """Sobe o servidor numa thread daemon; devolve o servidor (server_address traz a porta real)."""
+    srv = ThreadingHTTPServer((host, porta), _Handler)
+    srv.daemon_threads = True
+    srv.config = {**CONFIG_PADRAO, **{k: v for k, v in config.items() if v is not None}}
+    srv.rng = random.Random(srv.config["seed"])
+    srv.lock = threading.Lock()
+    srv.rodada = 0
+    srv.contagem = {}
+    threading.Thread(target=srv.serve_forever, name="servidor-mock", daemon=True).start()
+    return srv
+
+# ==================== CLI ====================
+def adicionar_argumentos(ap: argparse.ArgumentParser):
+    """Flags de configuração do mock (reaproveitadas por benchmarks/carga.py)."""
+    g = ap.add_argument_group("servidor mock")
+    g.add_argument("--latencia-frete-ms", type=float, default=CONFIG_PADRAO["latencia_frete_ms"])
+    g.add_argument("--latencia-ia-ms", type=float, default=CONFIG_PADRAO["latencia_ia_ms"])
+    g.add_argument("--pedaco-ia-ms", type=float, default=CONFIG_PADRAO["pedaco_ia_ms"])
+    g.add_argument("--jitter", type=float, default=CONFIG_PADRAO["jitter"])
+    g.add_argument("--erro-frete", type=float, default=0.0, help="fração de respostas 503 da calculadora")
+    g.add_argument("--erro-ia", type=float, default=0.0, help="fração de respostas 500 da IA")
+    g.add_argument("--taxa-429-frete", type=float, default=0.0)
+    g.add_argument("--taxa-429-ia", type=float, default=0.0)
+    g.add_argument("--retry-after-s", type=float, default=CONFIG_PADRAO["retry_after_s"])
+    g.add_argument("--formato", choices=("rotativo", *FORMATOS), default="rotativo")
+    g.add_argument("--seed", type=int, default=None)
+
+def config_de_args(args) -> dict:
+    return {k: getattr(args, k) for k in CONFIG_PADRAO}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Servidor mock de SuperFrete e OpenAI para benchmarks.")
+    ap.add_argument("--porta", type=int, default=8089)
+    ap.add_argument("--host", default="127.0.0.1")
+    adicionar_argumentos(ap)
+    args = ap.parse_args(argv)
+    srv = iniciar(args.porta, args.host, **config_de_args(args))
+    host, porta = srv.server_address[:2]
+    print(f"mock em http://{host}:{porta}  (SuperFrete: /api/v0/calculator | OpenAI: /v1/chat/completions)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# cache.py — cache em memória (LRU + TTL) com camada opcional em disco (SQLite)
+#
+# Fica num módulo separado de propósito: o Streamlit reexecuta app.py a cada
+# interação, mas módulos importados ficam em sys.modules, então as instâncias
+# criadas aqui sobrevivem entre reruns e são compartilhadas entre sessões.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISS = object()
+
+# ==================== CHAVES ====================
+def _normalizar(v):
+    if isinstance(v, str):
+        return " ".join(v.strip().lower().split())
+    if isinstance(v, float):
+        return round(v, 3)
+    if isinstance(v, dict):
+        return {str(k): _normalizar(x) for k, x in sorted(v.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(v, (list, tuple)):
+        return [_normalizar(x) for x in v]
+    return v
+
+def chave_normalizada(*partes) -> str:
+    """sha256 de partes JSON-serializáveis (texto sem caixa/espaços extras, floats com 3 casas)."""
+    raw = json.dumps([_normalizar(p) for p in partes], sort_keys=True,
+                     ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# ==================== DISCO (SQLite) ====================
+class SQLiteCache:
+    """Camada persistente: chave -> JSON, com TTL e limite de linhas (descarta as menos acessadas)."""
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_linhas: int = 50000):
+        self.path = path
+        self.ttl = float(ttl)
+        self.max_linhas = int(max_linhas)
+        self._lock = threading.Lock()
+        pasta = os.path.dirname(os.path.abspath(path))
+        os.makedirs(pasta, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " chave TEXT PRIMARY KEY, valor TEXT NOT NULL,"
+            " criado REAL NOT NULL, acessado REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_acessado ON cache(acessado)")
+
+    def get(self, chave: str, default=None):
+        agora = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT valor, criado FROM cache WHERE chave = ?", (chave,)
+            ).fetchone()
+            if row is None:
+                return default
+            valor, criado = row
+            if self.ttl > 0 and agora - criado > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE chave = ?", (chave,))
+                return default
+            self._conn.execute("UPDATE cache SET acessado = ? WHERE chave = ?", (agora, chave))
+        return json.loads(valor)
+
+    def set(self, chave: str, valor):
+        agora = time.time()
+        raw = json.dumps(valor, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (chave, valor, criado, acessado) VALUES (?, ?, ?, ?)",
+                (chave, raw, agora, agora),
+            )
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+            excesso = n - self.max_linhas
+            if excesso > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE chave IN "
+                    "(SELECT chave FROM cache ORDER BY acessado ASC LIMIT ?)",
+                    (excesso,),
+                )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._lock:
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        return n
+
+# ==================== MEMÓRIA (LRU + TTL) ====================
+class TTLCache:
+    """LRU em memória com expiração por entrada e, opcionalmente, uma camada SQLite atrás.
+
+    Em miss na memória consulta o disco; se achar, promove para a memória.
+    Contadores de hit/miss ficam em `stats()`.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 3600.0, disco: SQLiteCache | None = None):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self.disco = disco
+        self._dados: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "hits_disco": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0}
+
+    @property
+    def ativo(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, chave: str, default=None):
+        if not self.ativo:
+            return default
+        agora = time.monotonic()
+        with self._lock:
+            item = self._dados.get(chave, _MISS)
+            if item is not _MISS:
+                expira, valor = item
+                if expira and agora > expira:
+                    del self._dados[chave]
+                    self._stats["expirations"] += 1
+                else:
+                    self._dados.move_to_end(chave)
+                    self._stats["hits"] += 1
+                    return valor
+        if self.disco is not None:
+            valor = self.disco.get(chave, _MISS)
+            if valor is not _MISS:
+                self._guardar(chave, valor)
+                with self._lock:
+                    self._stats["hits_disco"] += 1
+                return valor
+        with self._lock:
+            self._stats["misses"] += 1
+        return default
+
+    def set(self, chave: str, valor):
+        if not self.ativo:
+            return
+        self._guardar(chave, valor)
+        with self._lock:
+            self._stats["sets"] += 1
+        if self.disco is not None:
+            self.disco.set(chave, valor)
+
+    def _guardar(self, chave: str, valor):
+        expira = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._dados[chave] = (expira, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.maxsize:
+                self._dados.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+        if self.disco is not None:
+            self.disco.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["itens"] = len(self._dados)
+        consultas = s["hits"] + s["hits_disco"] + s["misses"]
+        s["hit_rate"] = round((s["hits"] + s["hits_disco"]) / consultas, 4) if consultas else 0.0
+        return s
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dados)
+
+# ==================== REGISTRO (instâncias por processo) ====================
+_caches: dict[str, TTLCache] = {}
+_caches_lock = threading.Lock()
+
+def obter_cache(nome: str, maxsize: int = 1000, ttl: float = 3600.0,
+                db_path: str | None = None, db_max_linhas: int = 50000) -> TTLCache:
+    """Devolve o cache `nome` do processo, criando-o na primeira chamada."""
+    with _caches_lock:
+        c = _caches.get(nome)
+        if c is None:
+            disco = SQLiteCache(db_path, ttl=ttl, max_linhas=db_max_linhas) if db_path else None
+            c = TTLCache(maxsize=maxsize, ttl=ttl, disco=disco)
+            _caches[nome] = c
+        return c
+
+def stats_caches() -> dict:
+    with _caches_lock:
+        itens = list(_caches.items())
+    return {nome: c.stats() for nome, c in itens}
+
+# ==================== SINGLE-FLIGHT (coalescência) ====================
+class _Voo:
+    __slots__ = ("evento", "resultado", "erro")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+class SingleFlight:
+    """Chamadas concorrentes com a mesma chave compartilham uma única execução de `fn`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_voo: dict[str, _Voo] = {}
+        self._stats = {"execucoes": 0, "coalescidas": 0}
+
+    def do(self, chave: str, fn):
+        with self._lock:
+            voo = self._em_voo.get(chave)
+            lider = voo is None
+            if lider:
+                voo = _Voo()
+                self._em_voo[chave] = voo
+                self._stats["execucoes"] += 1
+            else:
+                self._stats["coalescidas"] += 1
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+        try:
+            voo.resultado = fn()
+            return voo.resultado
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                self._em_voo.pop(chave, None)
+            voo.evento.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["em_voo"] = len(self._em_voo)
+        return s
+
+_voos: dict[str, SingleFlight] = {}
+
+def obter_single_flight(nome: str) -> SingleFlight:
+    """Devolve o coalescedor `nome` do processo, criando-o na primeira chamada."""
+    with _caches_lock:
+        sf = _voos.get(nome)
+        if sf is None:
+            sf = _voos[nome] = SingleFlight()
+        return sf
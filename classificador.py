@@ -0,0 +1,57 @@
+# classificador.py — classificador de família por palavras-chave, pré-compilado
+#
+# Em vez de varrer todas as listas com `k in texto` a cada chamada, indexa as
+# palavras-chave (sem acento, singular) num dicionário de n-gramas de palavras.
+# Classificar custa O(palavras do produto) e não depende do tamanho da tabela.
+import re
+import unicodedata
+
+_PALAVRAS = re.compile(r"[a-z0-9]+")
+
+def dobrar_acentos(texto: str) -> str:
+    """'Cerâmica Xícara' -> 'ceramica xicara'."""
+    t = unicodedata.normalize("NFKD", texto or "")
+    return "".join(ch for ch in t if not unicodedata.combining(ch)).lower()
+
+def _variantes(palavra: str):
+    # a própria palavra e formas singulares simples (camisetas, colares, anéis -> aneis)
+    yield palavra
+    if len(palavra) > 3 and palavra.endswith("es"):
+        yield palavra[:-2]
+    if len(palavra) > 2 and palavra.endswith("s"):
+        yield palavra[:-1]
+
+class ClassificadorPalavras:
+    """Família de maior prioridade (ordem do dict) com alguma palavra-chave no texto.
+
+    Casa palavras inteiras (ou sequências de palavras, ex.: 'caderno grande'),
+    sem acento e aceitando plural simples.
+    """
+
+    def __init__(self, familias: dict, padrao: str = "outros"):
+        self.padrao = padrao
+        self.indice: dict[tuple[str, ...], int] = {}
+        self.nomes = list(familias)
+        self.max_ngrama = 1
+        for prioridade, fam in enumerate(self.nomes):
+            for kw in familias[fam]:
+                chave = tuple(_PALAVRAS.findall(dobrar_acentos(kw)))
+                if not chave:
+                    continue
+                # mantém a família de maior prioridade se a palavra aparece em duas
+                self.indice.setdefault(chave, prioridade)
+                self.max_ngrama = max(self.max_ngrama, len(chave))
+
+    def classificar(self, texto: str) -> str:
+        palavras = _PALAVRAS.findall(dobrar_acentos(texto))
+        melhor = len(self.nomes)
+        for i in range(len(palavras)):
+            for n in range(1, min(self.max_ngrama, len(palavras) - i) + 1):
+                *prefixo, ultima = palavras[i:i + n]
+                for v in _variantes(ultima):
+                    p = self.indice.get((*prefixo, v))
+                    if p is not None and p < melhor:
+                        melhor = p
+                        if melhor == 0:
+                            return self.nomes[0]
+        return self.nomes[melhor] if melhor < len(self.nomes) else self.padrao
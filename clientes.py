@@ -0,0 +1,102 @@
+# clientes.py — clientes HTTP compartilhados pelo processo (keep-alive + pool de conexões)
+#
+# Equivalente ao st.cache_resource, mas sem depender do Streamlit: módulos importados
+# sobrevivem aos reruns, então a mesma sessão/cliente atende todas as sessões do app
+# e as conexões TCP+TLS com SuperFrete e OpenAI são reaproveitadas.
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))  # conexões mantidas por host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # s
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))  # s
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))  # s (leitura da resposta da IA)
+
+_lock = threading.Lock()
+_sessao: requests.Session | None = None
+_clientes_openai: dict = {}
+_stats_openai = {"requests": 0, "conexoes_novas": 0}
+
+def timeout_http() -> tuple[float, float]:
+    """(connect, read) para requests."""
+    return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# ==================== REQUESTS (SuperFrete) ====================
+def obter_sessao_http() -> requests.Session:
+    """Session única do processo, com HTTPAdapter dimensionado por HTTP_POOL_SIZE."""
+    global _sessao
+    with _lock:
+        if _sessao is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, pool_block=False)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessao = s
+        return _sessao
+
+def _stats_requests() -> dict:
+    s = {"requests": 0, "conexoes_novas": 0, "pools": 0}
+    if _sessao is None:
+        return s
+    vistos = set()
+    for adapter in _sessao.adapters.values():
+        if id(adapter) in vistos:
+            continue
+        vistos.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for chave in list(pools.keys()):
+            pool = pools.get(chave)
+            if pool is None:
+                continue
+            s["pools"] += 1
+            s["requests"] += getattr(pool, "num_requests", 0)
+            s["conexoes_novas"] += getattr(pool, "num_connections", 0)
+    return s
+
+# ==================== OPENAI ====================
+def _trace_openai(evento: str, info):
+    # extensão "trace" do httpx/httpcore: um connect_tcp por conexão nova
+    if evento == "connection.connect_tcp.complete":
+        with _lock:
+            _stats_openai["conexoes_novas"] += 1
+
+def _hook_request_openai(request):
+    request.extensions["trace"] = _trace_openai
+    with _lock:
+        _stats_openai["requests"] += 1
+
+def obter_cliente_openai(api_key: str):
+    """Cliente OpenAI único por chave, com pool httpx e timeouts configuráveis."""
+    with _lock:
+        cliente = _clientes_openai.get(api_key)
+        if cliente is not None:
+            return cliente
+    import httpx
+    from openai import OpenAI, DefaultHttpxClient
+
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        event_hooks={"request": [_hook_request_openai]},
+    )
+    with _lock:
+        cliente = _clientes_openai.get(api_key)
+        if cliente is None:
+            # retries ficam com resiliencia.executar (backoff, orçamento, circuit breaker)
+            cliente = OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+            _clientes_openai[api_key] = cliente
+        else:
+            http_client.close()
+    return cliente
+
+# ==================== INSTRUMENTAÇÃO ====================
+def stats_conexoes() -> dict:
+    """Requests feitos x conexões abertas por upstream; reuso = 1 - conexões/requests."""
+    with _lock:
+        openai_s = dict(_stats_openai)
+    out = {"superfrete": _stats_requests(), "openai": openai_s}
+    for s in out.values():
+        s["reuso"] = round(1 - s["conexoes_novas"] / s["requests"], 4) if s["requests"] else 0.0
+    return out
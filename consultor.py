@@ -0,0 +1,885 @@
+# consultor.py — regras, IA e cotação do Consultor de Embalagens (sem Streamlit)
+#
+# Importado pelo app Streamlit e pelos modos headless (batch), para que o
+# pipeline possa rodar sem sessão de navegador.
+import os
+import re
+import json
+import math
+import time
+import contextvars
+import requests
+from functools import lru_cache
+from cache import obter_cache, obter_single_flight, chave_normalizada
+from clientes import obter_cliente_openai, obter_sessao_http, timeout_http, OPENAI_TIMEOUT
+from regras import TEMPLATES, resposta_por_regras
+from classificador import ClassificadorPalavras
+from json_incremental import CamposJSONIncrementais
+from empacotamento import escolher_embalagem
+from prompts import ASSINATURA_PROMPT, parametros_chamada
+import tabela_consultor
+import similares
+import zonas_frete
+import historico
+import metricas
+from resiliencia import (
+    CircuitoAberto, PrazoEsgotado, ErroUpstream, STATUS_RETENTAVEIS, executar, retentavel, timeout_no_prazo,
+    definir_prazo,
+)
+
+# ==================== ENV VARS ====================
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # obrigatório
+SUPERFRETE_API_TOKEN = os.getenv("SUPERFRETE_API_TOKEN")  # obrigatório p/ frete
+SUPERFRETE_CONTACT_EMAIL = os.getenv("SUPERFRETE_CONTACT_EMAIL", "contato@superfrete.com")
+SUPERFRETE_USE_SANDBOX = os.getenv("SUPERFRETE_USE_SANDBOX", "false").lower() == "true"
+SUPERFRETE_BASE_URL = os.getenv("SUPERFRETE_BASE_URL", "").rstrip("/")  # ex.: servidor mock dos benchmarks
+SUPERFRETE_SERVICES = os.getenv("SUPERFRETE_SERVICES", "1,2,17")  # ex.: PAC, SEDEX, Mini Envios
+CONSULTOR_CACHE_TTL = float(os.getenv("CONSULTOR_CACHE_TTL", "86400"))  # s (0 = sem expiração)
+CONSULTOR_CACHE_MAX = int(os.getenv("CONSULTOR_CACHE_MAX", "1000"))  # itens em memória (0 = desliga)
+CONSULTOR_CACHE_DB = os.getenv("CONSULTOR_CACHE_DB", "")  # ex.: .cache/consultor.sqlite (vazio = só memória)
+CONSULTOR_CACHE_DB_MAX = int(os.getenv("CONSULTOR_CACHE_DB_MAX", "50000"))
+SUPERFRETE_CACHE_TTL = float(os.getenv("SUPERFRETE_CACHE_TTL", "900"))  # s
+SUPERFRETE_CACHE_MAX = int(os.getenv("SUPERFRETE_CACHE_MAX", "5000"))  # cotações em memória (0 = desliga)
+SUPERFRETE_PESO_BUCKET_KG = float(os.getenv("SUPERFRETE_PESO_BUCKET_KG", "0.1"))  # arredonda p/ cima (0 = exato)
+SUPERFRETE_RESERVA_TTL = float(os.getenv("SUPERFRETE_RESERVA_TTL", "86400"))  # s: cotação antiga servida se a API cair
+RESILIENCIA_FALLBACK_REGRAS = os.getenv("RESILIENCIA_FALLBACK_REGRAS", "true").lower() == "true"  # IA fora -> regras
+# Modo do consultor: "ia" (sempre IA), "regras" (nunca IA) ou "auto" (regras, escalando p/ IA pela política)
+CONSULTOR_MODO = os.getenv("CONSULTOR_MODO", "ia").lower()
+CONSULTOR_FAMILIAS_REGRAS = [f.strip() for f in os.getenv("CONSULTOR_FAMILIAS_REGRAS", "textil,livro_papel").split(",") if f.strip()]
+CONSULTOR_ESCALAR_FRAGILIDADE = [f.strip().lower() for f in os.getenv("CONSULTOR_ESCALAR_FRAGILIDADE", "Alta").split(",") if f.strip()]
+CONSULTOR_ESCALAR_DIM_DESCONHECIDA = os.getenv("CONSULTOR_ESCALAR_DIM_DESCONHECIDA", "true").lower() == "true"
+CONSULTOR_STREAMING = os.getenv("CONSULTOR_STREAMING", "true").lower() == "true"  # renderiza a resposta aos poucos
+# Cota o frete com as dimensões do roteador EM PARALELO à IA; só recota se a IA mudar a caixa
+FRETE_PARALELO = os.getenv("FRETE_PARALELO", "true").lower() == "true"
+FRETE_TOLERANCIA_CM = float(os.getenv("FRETE_TOLERANCIA_CM", "2"))
+FRETE_TOLERANCIA_REL = float(os.getenv("FRETE_TOLERANCIA_REL", "0.10"))
+# exato: toda cotação vai à SuperFrete (com cache pelo CEP exato); zonas: tabela por região (zonas_frete.py)
+FRETE_MODO = os.getenv("FRETE_MODO", "exato").lower()
+# qtd > 1: escolhe a embalagem padrão que acomoda todas as unidades (empacotamento.py)
+EMPACOTAMENTO_MULTI = os.getenv("EMPACOTAMENTO_MULTI", "true").lower() == "true"
+
+# ==================== HELPERS ====================
+def parse_dimensions(dim_str: str):
+    """'20x15x10' -> (20.0,15.0,10.0) em cm."""
+    if not dim_str:
+        return None
+    m = re.search(
+        r'(\d+(?:[.,]\d+)?)\s*[xX]\s*(\d+(?:[.,]\d+)?)\s*[xX]\s*(\d+(?:[.,]\d+)?)',
+        dim_str
+    )
+    if not m:
+        return None
+    c, l, a = m.groups()
+    to_f = lambda s: float(s.replace(",", "."))
+    return (to_f(c), to_f(l), to_f(a))
+
+def cubagem_kg(c, l, a, fator=6000.0):
+    """Peso cubado (kg) ≈ (C*L*A)/fator com cm."""
+    return (c * l * a) / fator
+
+def sanitize_cep(cep: str):
+    """Mantém apenas 8 dígitos se válido."""
+    if not cep:
+        return None
+    digits = re.sub(r"\D", "", cep)
+    return digits if len(digits) == 8 else None
+
+def bucket_peso(weight_kg: float, passo: float = 0.1) -> float:
+    """Arredonda o peso PARA CIMA no múltiplo de `passo` (conservador p/ cotação)."""
+    w = float(weight_kg)
+    if passo <= 0:
+        return round(w, 3)
+    return round(math.ceil(round(w / passo, 6)) * passo, 3)
+
+def peso_para_cotacao(peso_item_kg: float, dims_caixa, peso_extra: float = 0.05) -> float:
+    """Conservador: max(peso real + folga da embalagem, cubado da EMBALAGEM)."""
+    Cc, Ll, Aa = dims_caixa
+    return max(float(peso_item_kg) + peso_extra, cubagem_kg(Cc, Ll, Aa, fator=6000.0))
+
+def dimensoes_divergem(a, b, tol_cm: float = 2.0, tol_rel: float = 0.10) -> bool:
+    """True se alguma aresta (comparadas em ordem crescente) difere além de max(tol_cm, tol_rel*aresta)."""
+    for x, y in zip(sorted(a), sorted(b)):
+        if abs(x - y) > max(tol_cm, tol_rel * max(x, y)):
+            return True
+    return False
+
+def cronometrado(func, *args, **kwargs):
+    """Executa func e devolve (resultado, segundos)."""
+    t0 = time.perf_counter()
+    out = func(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+# ==================== VALIDAÇÃO DA ENTRADA (API e formulário) ====================
+QTD_MAX = 50         # mesmos limites do formulário
+PESO_MAX_KG = 100.0
+
+class EntradaInvalida(ValueError):
+    """Campo do envio com tipo ou faixa inválidos; a mensagem vai para o usuário."""
+
+def ler_numero(valor, campo: str, minimo: float, maximo: float, padrao=None, inteiro: bool = False):
+    """Número (ou texto numérico) dentro de [minimo, maximo]; None/"" usa o padrão."""
+    if valor is None or valor == "":
+        if padrao is None:
+            raise EntradaInvalida(f"Informe {campo}.")
+        return padrao
+    if isinstance(valor, bool) or not isinstance(valor, (int, float, str)):
+        raise EntradaInvalida(f"{campo} deve ser um número.")
+    try:
+        n = float(str(valor).replace(",", ".")) if isinstance(valor, str) else float(valor)
+    except ValueError:
+        raise EntradaInvalida(f"{campo} deve ser um número.") from None
+    if not math.isfinite(n) or (inteiro and not n.is_integer()):
+        raise EntradaInvalida(f"{campo} deve ser um número{' inteiro' if inteiro else ''}.")
+    if not minimo <= n <= maximo:
+        raise EntradaInvalida(f"{campo} deve estar entre {minimo:g} e {maximo:g}.")
+    return int(n) if inteiro else n
+
+def _texto(dados: dict, campo: str, padrao=None):
+    v = dados.get(campo)
+    if v is None or v == "":
+        return padrao
+    if not isinstance(v, str):
+        raise EntradaInvalida(f"{campo} deve ser texto.")
+    return v
+
+def validar_entrada(dados: dict) -> dict:
+    """Campos do envio (ver consulta_eventos) com tipos e faixas conferidos; EntradaInvalida se não."""
+    dores = dados.get("dores") or []
+    if not isinstance(dores, list) or not all(isinstance(d, str) for d in dores):
+        raise EntradaInvalida("dores deve ser uma lista de textos.")
+    return {
+        "cep_from": _texto(dados, "cep_from", ""),
+        "cep_to": _texto(dados, "cep_to", ""),
+        "produto": _texto(dados, "produto", ""),
+        "categoria": _texto(dados, "categoria", "Outros"),
+        "fragilidade": _texto(dados, "fragilidade", "Média"),
+        "dim": _texto(dados, "dim"),
+        "nao_sei_dim": bool(dados.get("nao_sei_dim")),
+        "tamanho_roupa": _texto(dados, "tamanho_roupa"),
+        "peso_kg": ler_numero(dados.get("peso_kg"), "peso_kg", 0.0, PESO_MAX_KG, padrao=0.3),
+        "qtd": ler_numero(dados.get("qtd"), "qtd", 1, QTD_MAX, padrao=1, inteiro=True),
+        "dores": dores,
+        "matriz": bool(dados.get("matriz")),
+    }
+
+# ==================== ROTEADOR DE EMBALAGEM (regras) ====================
+FAMILIAS = {
+    "textil": ["camiseta","blusa","moletom","calça","calca","bermuda","short","meia","roupa","body","pijama","sutiã","sutia","cueca","boné","bone"],
+    "livro_papel": ["livro","caderno","planner","revista","hq","mangá","manga","papelaria","a4","a5"],
+    "ceramica_vidro": ["caneca","xícara","xicara","taça","taca","vidro","garrafa","vaso","porcelana","cerâmica","ceramica"],
+    "eletronicos_leves": ["fone","headset","mouse","teclado","pendrive","carregador","cabo","powerbank"],
+    "cosmeticos": ["perfume","shampoo","creme","hidratante","maquiagem","batom","sérum","serum"],
+    "joias_acessorios": ["colar","pulseira","anel","anéis","brinco","óculos","oculos","relógio","relogio"],
+}
+
+# (C,L,A) estimadas em cm
+ESTIMATIVAS_DIM = {
+    ("textil","camiseta_s"): (26, 20, 3),
+    ("textil","camiseta_m"): (28, 22, 3),
+    ("textil","camiseta_l"): (30, 23, 3),
+    ("textil","moletom"):    (32, 25, 8),
+    ("textil","calca"):      (32, 24, 5),
+    ("livro_papel","livro_a5"): (22, 16, 4),
+    ("livro_papel","livro_a4"): (31, 23, 4),
+    ("livro_papel","caderno_a5"): (22, 16, 3),
+    ("livro_papel","caderno_a4"): (31, 23, 3),
+    ("cosmeticos","frasco_peq"): (12, 6, 6),
+    ("cosmeticos","frasco_med"): (16, 8, 8),
+    ("eletronicos_leves","fone"): (12, 12, 6),
+    ("eletronicos_leves","mouse"): (14, 10, 7),
+    ("joias_acessorios","oculos"): (18, 8, 6),
+}
+
+# Compilado uma vez no import; chame compilar_classificador() se FAMILIAS mudar em runtime
+_classificador = ClassificadorPalavras(FAMILIAS)
+
+def compilar_classificador():
+    global _classificador
+    _classificador = ClassificadorPalavras(FAMILIAS)
+    classificar_familia.cache_clear()
+
+@lru_cache(maxsize=4096)
+def classificar_familia(produto: str) -> str:
+    """Família pela 1ª (em ordem de FAMILIAS) com palavra-chave no produto; sem acento, aceita plural."""
+    return _classificador.classificar(produto or "")
+
+def roteador_tipo_embalagem(produto: str, fragilidade: str, qtd: int) -> str:
+    fam = classificar_familia(produto)
+    fr = (fragilidade or "Média").lower()
+    if fam == "textil":
+        return "Envelope de segurança (plástico coextrusado)"
+    if fam == "livro_papel":
+        return "Envelope rígido + reforço (ou caixa baixa se >1 un)"
+    if fam == "ceramica_vidro":
+        return "Caixa de papelão + proteção interna (múltiplas camadas)"
+    if fam == "eletronicos_leves":
+        return "Caixa de papelão pequena + acolchoamento"
+    if fam == "cosmeticos":
+        return "Caixa de papelão pequena (ou blister) + proteção pontual"
+    if fam == "joias_acessorios":
+        return "Caixa pequena (ou estojo) + envelope externo"
+    return "Caixa de papelão padrão"
+
+def tipos_da_diretriz(tipo_preferido: str) -> tuple[str, ...]:
+    """Tipos do catálogo de embalagens que a diretriz do roteador admite; o 1º é o principal.
+
+    "Envelope rígido + reforço (ou caixa baixa ...)" -> ("envelope", "caixa"); a alternativa só
+    entra se vier como "(ou <tipo> ...)".
+    """
+    t = (tipo_preferido or "").lower()
+    achados = sorted((k for k in ("envelope", "caixa") if k in t), key=t.index)
+    if not achados:
+        return ("caixa",)
+    principal = achados[0]
+    outro = "caixa" if principal == "envelope" else "envelope"
+    return (principal, outro) if f"(ou {outro}" in t else (principal,)
+
+def diretriz_para_embalagem(tipo_preferido: str, tipo_embalagem: str) -> str:
+    """Diretriz reescrita quando a embalagem escolhida é a alternativa: "(ou caixa baixa se >1 un)"
+    vira "Caixa baixa + <resto da diretriz>". Sem alternativa desse tipo, devolve a original."""
+    if tipos_da_diretriz(tipo_preferido)[0] == tipo_embalagem:
+        return tipo_preferido
+    m = re.search(r"\(ou (" + tipo_embalagem + r"[^)]*?)(?: se [^)]*)?\)", tipo_preferido, re.IGNORECASE)
+    if not m:
+        return tipo_preferido
+    resto = tipo_preferido[:m.start()].split("+", 1)
+    return m.group(1).strip().capitalize() + (f" +{resto[1].rstrip()}" if len(resto) > 1 else "")
+
+def estimar_dimensoes_se_necessario(produto: str, familia: str, tamanho_roupa: str|None=None) -> tuple[int,int,int]:
+    fam = familia or classificar_familia(produto)
+    p = (produto or "").lower()
+    if fam == "textil":
+        t = (tamanho_roupa or "").lower()
+        if "moletom" in p: return ESTIMATIVAS_DIM[("textil","moletom")]
+        if "calça" in p or "calca" in p: return ESTIMATIVAS_DIM[("textil","calca")]
+        if t in ["p","pp","xs","s"]: return ESTIMATIVAS_DIM[("textil","camiseta_s")]
+        if t in ["m"]: return ESTIMATIVAS_DIM[("textil","camiseta_m")]
+        if t in ["g","gg","l","xl","xxl"]: return ESTIMATIVAS_DIM[("textil","camiseta_l")]
+        return ESTIMATIVAS_DIM[("textil","camiseta_m")]
+    if fam == "livro_papel":
+        if "a4" in p or "caderno grande" in p: return ESTIMATIVAS_DIM[("livro_papel","livro_a4")]
+        return ESTIMATIVAS_DIM[("livro_papel","livro_a5")]
+    if fam == "cosmeticos":
+        if any(k in p for k in ["100ml","200ml","médio","medio"]): return ESTIMATIVAS_DIM[("cosmeticos","frasco_med")]
+        return ESTIMATIVAS_DIM[("cosmeticos","frasco_peq")]
+    if fam == "eletronicos_leves":
+        if "mouse" in p: return ESTIMATIVAS_DIM[("eletronicos_leves","mouse")]
+        if any(k in p for k in ["fone","earbud"]): return ESTIMATIVAS_DIM[("eletronicos_leves","fone")]
+        return (18, 12, 8)
+    if fam == "joias_acessorios":
+        if any(k in p for k in ["óculos","oculos"]): return ESTIMATIVAS_DIM[("joias_acessorios","oculos")]
+        return (10, 10, 5)
+    return (20, 15, 10)
+
+def expandir_dimensoes_para_embalagem(c, l, a, tipo: str) -> tuple[int,int,int]:
+    if "envelope" in tipo.lower():
+        return (int(round(c)), int(round(l)), max(3, int(round(a+1))))
+    return (int(round(c+2)), int(round(l+2)), int(round(a+2)))
+
+# ==================== OPENAI (Consultor) ====================
+# Prompts, schema e teto de tokens ficam em prompts.py
+
+def _cache_consultor():
+    return obter_cache(
+        "consultor",
+        maxsize=CONSULTOR_CACHE_MAX,
+        ttl=CONSULTOR_CACHE_TTL,
+        db_path=CONSULTOR_CACHE_DB or None,
+        db_max_linhas=CONSULTOR_CACHE_DB_MAX,
+    )
+
+def chave_consultor(payload: dict, tipo_preferido: str, embalagem_hint: str, model: str) -> str:
+    """Chave do cache: payload normalizado + diretriz do roteador + modelo + assinatura do prompt."""
+    p = dict(payload)
+    p["dores"] = sorted(p.get("dores") or [])
+    return chave_normalizada("consultor", ASSINATURA_PROMPT, model, p, tipo_preferido, embalagem_hint)
+
+def _registrar_openai(model: str, segundos: float, uso, fim: str | None = None):
+    metricas.observar("upstream_segundos", segundos, upstream="openai")
+    if fim == "length":
+        # bateu em CONSULTOR_MAX_TOKENS: o JSON vem cortado (JSONDecodeError logo em seguida)
+        metricas.incrementar("openai_truncadas_total", modelo=model)
+        metricas.anotar(openai_truncada=True)
+    if uso is None:
+        return
+    tp, tc = getattr(uso, "prompt_tokens", 0) or 0, getattr(uso, "completion_tokens", 0) or 0
+    # parte do prompt servida pelo cache de prefixo do provedor (cobrada com desconto)
+    tcache = getattr(getattr(uso, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+    metricas.incrementar("openai_tokens_total", tp, tipo="prompt", modelo=model)
+    metricas.incrementar("openai_tokens_total", tc, tipo="completion", modelo=model)
+    metricas.incrementar("openai_tokens_total", tcache, tipo="prompt_cache", modelo=model)
+    metricas.observar("openai_tokens_por_chamada", tp + tc, modelo=model)
+    metricas.anotar(tokens_prompt=tp, tokens_completion=tc, tokens_prompt_cache=tcache)
+
+def call_consultor_ia(payload: dict, tipo_preferido: str, embalagem_hint: str, model: str = "gpt-4o-mini",
+                      usar_cache: bool = True):
+    """Chama OpenAI pedindo JSON estrito com recomendações de EMBALAGEM (com cache por conteúdo)."""
+    cache = _cache_consultor() if usar_cache else None
+    chave = chave_consultor(payload, tipo_preferido, embalagem_hint, model) if cache is not None else None
+    if cache is not None:
+        content = cache.get(chave)
+        metricas.anotar(cache_consultor="hit" if content is not None else "miss")
+        if content is not None:
+            return json.loads(content)
+
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY não encontrado no servidor.")
+    client = obter_cliente_openai(OPENAI_API_KEY)
+
+    t0 = time.perf_counter()
+    resp = executar("openai", lambda: client.chat.completions.create(
+        model=model,
+        **parametros_chamada(payload, tipo_preferido, embalagem_hint),
+        timeout=timeout_no_prazo(OPENAI_TIMEOUT),
+    ))
+    _registrar_openai(model, time.perf_counter() - t0, getattr(resp, "usage", None), resp.choices[0].finish_reason)
+    content = resp.choices[0].message.content
+    result = json.loads(content)
+    if cache is not None:
+        # guarda o texto cru: cada hit devolve um dict novo (sem aliasing entre sessões)
+        cache.set(chave, content)
+    return result
+
+def call_consultor_ia_stream(payload: dict, tipo_preferido: str, embalagem_hint: str, model: str = "gpt-4o-mini",
+                             usar_cache: bool = True):
+    """Como call_consultor_ia, mas devolve um iterador de (campo, valor) que entrega cada campo
+    de 1º nível assim que ele fecha. A abertura do stream é imediata (erros de conexão/circuito
+    saem aqui, não no meio da iteração)."""
+    cache = _cache_consultor() if usar_cache else None
+    chave = chave_consultor(payload, tipo_preferido, embalagem_hint, model) if cache is not None else None
+    if cache is not None:
+        content = cache.get(chave)
+        metricas.anotar(cache_consultor="hit" if content is not None else "miss")
+        if content is not None:
+            return iter(json.loads(content).items())
+
+    if not OPENAI_API_KEY:
+        raise RuntimeError("OPENAI_API_KEY não encontrado no servidor.")
+    client = obter_cliente_openai(OPENAI_API_KEY)
+
+    # retry só na abertura do stream: depois do 1º token o conteúdo já foi para a tela
+    t0 = time.perf_counter()
+    stream = executar("openai", lambda: client.chat.completions.create(
+        model=model,
+        **parametros_chamada(payload, tipo_preferido, embalagem_hint),
+        stream=True,
+        stream_options={"include_usage": True},
+        timeout=timeout_no_prazo(OPENAI_TIMEOUT),
+    ))
+    return _campos_do_stream(stream, model, t0, cache, chave)
+
+def _campos_do_stream(stream, model: str, t0: float, cache, chave):
+    parser = CamposJSONIncrementais()
+    partes = []
+    uso = fim = None
+    for chunk in stream:
+        uso = getattr(chunk, "usage", None) or uso
+        if not chunk.choices:
+            continue
+        fim = chunk.choices[0].finish_reason or fim
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        partes.append(delta)
+        yield from parser.feed(delta)
+
+    _registrar_openai(model, time.perf_counter() - t0, uso, fim)
+    content = "".join(partes)
+    json.loads(content)  # valida o objeto completo (levanta JSONDecodeError como no modo normal)
+    if cache is not None:
+        cache.set(chave, content)
+
+# ==================== SUPERFRETE (Cotação opcional, normalizada) ====================
+def _cache_frete():
+    return obter_cache("superfrete", maxsize=SUPERFRETE_CACHE_MAX, ttl=SUPERFRETE_CACHE_TTL)
+
+def _reserva_frete():
+    return obter_cache("superfrete_reserva", maxsize=SUPERFRETE_CACHE_MAX, ttl=SUPERFRETE_RESERVA_TTL)
+
+def call_superfrete_calculator(token, user_agent_email, cep_from, cep_to,
+                               length_cm, width_cm, height_cm, weight_kg,
+                               services="1,2,17", use_sandbox=False, usar_cache=True):
+    """
+    Produção: https://api.superfrete.com/api/v0/calculator
+    Sandbox : https://sandbox.superfrete.com/api/v0/calculator
+
+    Aceita resposta como dict OU list e normaliza para:
+      offer = {company, service, price, days}
+
+    Cotações bem-sucedidas ficam em cache (SUPERFRETE_CACHE_TTL) pela chave do
+    corpo normalizado; pedidos idênticos simultâneos compartilham um único POST.
+    """
+    base = SUPERFRETE_BASE_URL or ("https://sandbox.superfrete.com" if use_sandbox else "https://api.superfrete.com")
+    url = f"{base}/api/v0/calculator"
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "User-Agent": f"SuperFrete-Consultor/1.0 ({user_agent_email})"
+    }
+    body = {
+        "from": {"postal_code": cep_from},
+        "to": {"postal_code": cep_to},
+        "services": ",".join(sorted(s.strip() for s in str(services).split(",") if s.strip())),
+        "options": {
+            "own_hand": False,
+            "receipt": False,
+            "insurance_value": 0,
+            "use_insurance_value": False
+        },
+        "package": {
+            "height": int(round(height_cm)),
+            "width":  int(round(width_cm)),
+            "length": int(round(length_cm)),
+            "weight": bucket_peso(weight_kg, SUPERFRETE_PESO_BUCKET_KG)
+        }
+    }
+
+    def _norm_offer(o):
+        company_name = "-"
+        comp = o.get("company") if isinstance(o, dict) else None
+        if isinstance(comp, dict):
+            company_name = comp.get("name") or comp.get("company") or "-"
+        elif isinstance(comp, str):
+            company_name = comp
+
+        service = o.get("service") or o.get("service_name") or "-"
+
+        raw_price = o.get("price", None)
+        if raw_price is None:
+            raw_price = o.get("total", None)
+        if raw_price is None:
+            raw_price = o.get("value", 0)
+        try:
+            price = float(raw_price)
+        except Exception:
+            price = 0.0
+
+        days = None
+        dt = o.get("delivery_time") or o.get("delivery") or o.get("deadline")
+        if isinstance(dt, dict):
+            days = dt.get("days") or dt.get("estimate") or dt.get("min")
+        elif isinstance(dt, (int, float)):
+            days = int(dt)
+
+        return {
+            "company": company_name or "-",
+            "service": service or "-",
+            "price": price,
+            "days": None if days in (None, "", "-") else int(days),
+            "_raw": o,
+        }
+
+    def _post():
+        connect, read = timeout_http()
+        t0 = time.perf_counter()
+        r = obter_sessao_http().post(url, headers=headers, json=body,
+                                     timeout=(timeout_no_prazo(connect), timeout_no_prazo(read)))
+        dt = time.perf_counter() - t0
+        metricas.observar("upstream_segundos", dt, upstream="superfrete")
+        metricas.incrementar("superfrete_respostas_total", status=r.status_code)
+        metricas.anotar(superfrete_status=r.status_code, superfrete_s=round(dt, 4))
+        if r.status_code in STATUS_RETENTAVEIS:
+            raise ErroUpstream(r.status_code, r.text[:300], r.headers.get("Retry-After"))
+        return r
+
+    def _cotar():
+        try:
+            r = executar("superfrete", _post)
+            if r.status_code == 401:
+                return {"error": "Token inválido/expirado (401). Gere um novo e configure SUPERFRETE_API_TOKEN."}
+            if r.status_code >= 400:
+                return {"error": f"Erro {r.status_code}: {r.text}"}
+
+            data = r.json()
+            if isinstance(data, list):
+                ofertas = data
+            elif isinstance(data, dict):
+                ofertas = data.get("data") or data.get("quotes") or data.get("results") or []
+            else:
+                ofertas = []
+
+            if not isinstance(ofertas, list) or not ofertas:
+                return {"error": "Nenhuma oferta de frete retornada."}
+
+            norm = []
+            for o in ofertas:
+                if isinstance(o, dict):
+                    norm.append(_norm_offer(o))
+            if not norm:
+                return {"error": "Formato inesperado nas ofertas."}
+
+            best_price = min(norm, key=lambda x: (x["price"] if x["price"] > 0 else 1e12))
+            best_time  = min(norm, key=lambda x: (x["days"] if isinstance(x["days"], int) else 1e9))
+
+            return {"best_price": best_price, "best_time": best_time, "offers": norm}
+
+        except ErroUpstream as e:
+            return {"error": str(e), "transitorio": True}
+        except CircuitoAberto:
+            return {"error": "SuperFrete instável no momento. Tente novamente em instantes.", "transitorio": True}
+        except PrazoEsgotado:
+            return {"error": "A cotação demorou demais e foi interrompida.", "transitorio": True}
+        except requests.RequestException as e:
+            metricas.incrementar("superfrete_respostas_total", status="erro_rede")
+            metricas.anotar(superfrete_status="erro_rede")
+            return {"error": f"Falha de rede: {e}", "transitorio": True}
+
+    if not usar_cache:
+        return _cotar()
+
+    cache = _cache_frete()
+    chave = chave_normalizada("superfrete", base, token, body)
+    cot = cache.get(chave)
+    metricas.anotar(cache_frete="hit" if cot is not None else "miss")
+    if cot is not None:
+        return cot
+
+    def _cotar_e_guardar():
+        # outro líder pode ter acabado de preencher o cache enquanto esperávamos a vez
+        cot = cache.get(chave)
+        if cot is None:
+            cot = _cotar()
+            if not cot.get("error"):
+                cache.set(chave, cot)
+                _reserva_frete().set(chave, cot)
+            elif cot.get("transitorio"):
+                # API degradada: serve a última cotação conhecida, sinalizada como antiga
+                antiga = _reserva_frete().get(chave)
+                if antiga is not None:
+                    metricas.anotar(cache_frete="reserva")
+                    return {**antiga, "stale": True}
+        return cot
+
+    return obter_single_flight("superfrete").do(chave, _cotar_e_guardar)
+
+# ==================== MODO REGRAS x IA ====================
+def motivo_para_ia(familia: str, fragilidade: str, dims_genericas: bool = False) -> str | None:
+    """Política de escalonamento: devolve o motivo para chamar a IA, ou None se as regras bastam."""
+    if familia not in CONSULTOR_FAMILIAS_REGRAS or familia not in TEMPLATES:
+        return f"família '{familia}' fora das regras"
+    if (fragilidade or "Média").lower() in CONSULTOR_ESCALAR_FRAGILIDADE:
+        return f"fragilidade {fragilidade}"
+    if dims_genericas and CONSULTOR_ESCALAR_DIM_DESCONHECIDA:
+        return "dimensões desconhecidas"
+    return None
+
+def _responder_por_regras(prep: dict, modo: str | None) -> bool:
+    modo = (modo or CONSULTOR_MODO).lower()
+    familia = prep["familia"]
+    if modo == "ia" or familia not in TEMPLATES:
+        return False
+    return modo == "regras" or motivo_para_ia(familia, prep["payload"].get("fragilidade"), prep["dims_genericas"]) is None
+
+def _ia_indisponivel(e: Exception) -> bool:
+    return RESILIENCIA_FALLBACK_REGRAS and (isinstance(e, (CircuitoAberto, PrazoEsgotado)) or retentavel(e))
+
+def _regras(prep: dict) -> dict:
+    return resposta_por_regras(prep["payload"], prep["tipo_preferido"], prep["embalagem_hint"], prep["familia"])
+
+def _indexar_ao_final(campos, prep: dict, indice):
+    # só entra no índice de similares a resposta que chegou inteira
+    result = {}
+    for campo, valor in campos:
+        result[campo] = valor
+        yield campo, valor
+    indice.adicionar(prep, result)
+
+def consultar_embalagem(prep: dict, model: str = "gpt-4o-mini", modo: str | None = None) -> tuple[dict, str]:
+    """Resposta do consultor para um `preparar_consulta`, por regras ou IA. Devolve (result, origem).
+
+    Combinações pré-computadas (tabela_consultor.py) saem da tabela, com origem "tabela"; com
+    CONSULTOR_SIMILAR, um produto parecido já respondido pela IA é reaproveitado (origem "similar").
+    Com a IA degradada (circuito aberto, prazo esgotado, retries esgotados) cai nas regras
+    com origem "regras_fallback", se RESILIENCIA_FALLBACK_REGRAS.
+    """
+    if _responder_por_regras(prep, modo):
+        return _regras(prep), "regras"
+    pronta = tabela_consultor.buscar(prep, model)
+    if pronta is not None:
+        return pronta, "tabela"
+    indice = similares.obter_indice()
+    achado = indice.buscar(prep) if indice is not None else None
+    if achado is not None:
+        return achado[0], "similar"
+    try:
+        result = call_consultor_ia(prep["payload"], prep["tipo_preferido"], prep["embalagem_hint"], model=model)
+        if indice is not None:
+            indice.adicionar(prep, result)
+        return result, "ia"
+    except Exception as e:
+        if not _ia_indisponivel(e):
+            raise
+        metricas.incrementar("fallback_total", upstream="openai")
+        return _regras(prep), "regras_fallback"
+
+def consultar_embalagem_stream(prep: dict, model: str = "gpt-4o-mini", modo: str | None = None):
+    """Versão streaming de consultar_embalagem: devolve (origem, gerador de (campo, valor))."""
+    if _responder_por_regras(prep, modo):
+        return "regras", iter(_regras(prep).items())
+    pronta = tabela_consultor.buscar(prep, model)
+    if pronta is not None:
+        return "tabela", iter(pronta.items())
+    indice = similares.obter_indice()
+    achado = indice.buscar(prep) if indice is not None else None
+    if achado is not None:
+        return "similar", iter(achado[0].items())
+    try:
+        campos = call_consultor_ia_stream(prep["payload"], prep["tipo_preferido"], prep["embalagem_hint"], model=model)
+        return "ia", (_indexar_ao_final(campos, prep, indice) if indice is not None else campos)
+    except Exception as e:
+        if not _ia_indisponivel(e):
+            raise
+        metricas.incrementar("fallback_total", upstream="openai")
+        return "regras_fallback", iter(_regras(prep).items())
+
+# ==================== PIPELINE (compartilhado entre app e modos headless) ====================
+def preparar_consulta(produto: str, fragilidade: str = "Média", qtd: int = 1, peso_kg: float = 0.3,
+                      categoria: str = "Outros", dim: str | None = None, nao_sei_dim: bool = False,
+                      tamanho_roupa: str | None = None, dores: list | None = None) -> dict | None:
+    """Dimensões do item + roteador + payload de call_consultor_ia. None se não houver dimensões."""
+    fam = classificar_familia(produto)
+    dims_genericas = False
+    if nao_sei_dim:
+        dims_item = estimar_dimensoes_se_necessario(produto, fam, tamanho_roupa)
+        # fora da tabela = chute genérico do estimador
+        dims_genericas = tuple(dims_item) not in ESTIMATIVAS_DIM.values()
+    else:
+        dims_item = parse_dimensions(dim)
+    if not dims_item:
+        return None
+
+    c, l, a = dims_item
+    cubado_item = cubagem_kg(c, l, a, fator=6000.0)
+
+    # Roteia tipo e estima embalagem com folga
+    tipo_preferido = roteador_tipo_embalagem(produto, fragilidade, int(qtd))
+    peso_envio_kg = round(float(peso_kg) * max(1, int(qtd)), 3)
+    empacotamento = None
+    if int(qtd) > 1 and EMPACOTAMENTO_MULTI:
+        # N unidades: embalagem padrão com menor peso tarifado, só dos tipos que a diretriz admite
+        # (senão o roteador diz "envelope" e a caixa escolhida é outra)
+        empacotamento = escolher_embalagem(
+            [(c, l, a)] * int(qtd), peso_envio_kg + 0.05, tipos=tipos_da_diretriz(tipo_preferido),
+        )
+        tipo_preferido = diretriz_para_embalagem(tipo_preferido, empacotamento["tipo"])
+        if tipos_da_diretriz(tipo_preferido)[0] != empacotamento["tipo"]:
+            # não deveria acontecer; se acontecer, a descrição segue a embalagem que vai na cotação
+            metricas.incrementar("embalagem_divergente_total", familia=fam)
+            tipo_preferido = f"{empacotamento['nome']} ({empacotamento['tipo']})"
+        dims_hint = tuple(empacotamento["dims_cm"])
+    else:
+        dims_hint = expandir_dimensoes_para_embalagem(c, l, a, tipo_preferido)
+    embalagem_hint = "{}x{}x{}".format(*dims_hint)
+
+    payload = {
+        "categoria": categoria,
+        "produto": produto or "Produto não informado",
+        "fragilidade": fragilidade,
+        "dimensoes_cm": f"{int(c)}x{int(l)}x{int(a)}",
+        "peso_kg": round(peso_kg, 3),
+        "qtd_por_envio": int(qtd),
+        "dores": list(dores or []),
+        "peso_cubado_kg": round(cubado_item, 3),
+    }
+    return {
+        "familia": fam,
+        "dims_item": dims_item,
+        "dims_genericas": dims_genericas,
+        "cubado_item": cubado_item,
+        "tipo_preferido": tipo_preferido,
+        "dims_hint": dims_hint,
+        "embalagem_hint": embalagem_hint,
+        "empacotamento": empacotamento,
+        "peso_envio_kg": peso_envio_kg,
+        "payload": payload,
+    }
+
+def cotar_frete(cep_from: str, cep_to: str, dims_caixa, peso_item_kg: float) -> dict:
+    """call_superfrete_calculator com a configuração do servidor e o peso conservador da caixa.
+
+    `peso_item_kg` é o conteúdo inteiro da caixa (prep["peso_envio_kg"] quando qtd > 1).
+    Com FRETE_MODO=zonas, devolve a estimativa da célula da região (estimativa=True, cotada
+    com o peso e as arestas máximas da faixa) e só cota de verdade células novas ou vencidas.
+    """
+    peso = peso_para_cotacao(peso_item_kg, dims_caixa)
+
+    def _cotar(dims, peso_kg):
+        Cc, Ll, Aa = dims
+        return call_superfrete_calculator(
+            token=SUPERFRETE_API_TOKEN,
+            user_agent_email=SUPERFRETE_CONTACT_EMAIL,
+            cep_from=cep_from,
+            cep_to=cep_to,
+            length_cm=Cc,
+            width_cm=Ll,
+            height_cm=Aa,
+            weight_kg=peso_kg,
+            services=SUPERFRETE_SERVICES,
+            use_sandbox=SUPERFRETE_USE_SANDBOX
+        )
+
+    if FRETE_MODO == "zonas":
+        # a célula é cotada com o pacote no limite da faixa (ver zonas_frete.cotar_por_zona)
+        return zonas_frete.cotar_por_zona(cep_from, cep_to, dims_caixa, peso, _cotar)
+    return _cotar(dims_caixa, peso)
+
+def cotacao_publica(cot: dict) -> dict:
+    """Cotação sem o '_raw' de cada oferta (só incha JSONL/respostas da API)."""
+    if cot.get("error"):
+        return dict(cot)
+    out = {k: {c: v for c, v in cot[k].items() if c != "_raw"} for k in ("best_price", "best_time")}
+    if cot.get("stale"):
+        out["stale"] = True
+    if cot.get("estimativa"):
+        out.update(estimativa=True, zona=cot.get("zona"), idade_s=cot.get("idade_s"))
+    return out
+
+def mensagem_erro_ia(e: Exception) -> tuple[str, str]:
+    """(nível, mensagem) para o usuário quando a recomendação falha; nível = error | warning."""
+    emsg = str(e).lower()
+    if "insufficient_quota" in emsg or ("429" in emsg and "quota" in emsg):
+        return "error", "Sem créditos na OpenAI agora. Verifique Billing/Usage e a variável OPENAI_API_KEY."
+    if "rate limit" in emsg or "429" in emsg:
+        return "warning", "Muitos pedidos. Aguarde alguns segundos e tente novamente."
+    if isinstance(e, json.JSONDecodeError) or "invalid json" in emsg:
+        return "error", "A IA retornou um formato inesperado. Tente novamente."
+    return "error", "Não consegui concluir sua recomendação agora. Tente novamente."
+
+def consulta_eventos(dados: dict, executor=None, streaming: bool | None = None):
+    """O envio inteiro como uma sequência de eventos (dicts serializáveis em JSON).
+
+    `dados` traz os campos do formulário: cep_from, cep_to, produto, categoria, fragilidade,
+    dim, nao_sei_dim, tamanho_roupa, peso_kg, qtd, dores e matriz (bool). Eventos, em ordem:
+      roteamento  familia, tipo_preferido, embalagem_hint, dims_hint, cubado_item, peso_envio_kg, empacotamento
+      campo       campo, valor  (um por campo da resposta, assim que chega)
+      consultor   origem
+      frete       cotacao (ou motivo: sem_cep_destino | sem_token)
+      matriz      tabela, stats  (só com dados["matriz"])
+      erro        etapa, nivel, mensagem, tipo  (interrompe o envio; tipos/faixas inválidos: etapa validacao)
+      fim         trace (registro de metricas.Trace: etapas, total_s, atributos) — sempre o último
+    Com `executor`, o frete começa em paralelo com a IA (FRETE_PARALELO). Usado pelo app,
+    pela API (api.py) e pelo teste de carga. Com HISTORICO_DIR, o envio vai para o
+    histórico (historico.py) sem esperar a gravação.
+    """
+    streaming = CONSULTOR_STREAMING if streaming is None else streaming
+    trace = metricas.Trace("consulta")
+    # orçamento total do envio (CONSULTA_PRAZO_S): limita timeouts e esperas de retry de IA e frete
+    definir_prazo()
+    eventos = [] if historico.HISTORICO_DIR else None
+    gerador = _eventos_consulta(dados, trace, executor, streaming)
+    try:
+        for ev in gerador:
+            if eventos is not None:
+                eventos.append(ev)
+            yield ev
+    finally:
+        gerador.close()
+        reg = trace.finalizar()
+        if eventos is not None:
+            historico.registrar(historico.registro(dados, eventos, reg))
+    yield {"evento": "fim", "trace": reg}
+
+def _eventos_consulta(dados: dict, trace, executor, streaming: bool):
+    with trace.etapa("validacao"):
+        try:
+            dados = validar_entrada(dados)
+        except EntradaInvalida as e:
+            dados = None
+            erro = str(e)
+        if dados is not None:
+            cep_from = sanitize_cep(dados["cep_from"])
+            cep_to = sanitize_cep(dados["cep_to"])
+    if dados is None:
+        trace.anotar(erro="entrada")
+        yield {"evento": "erro", "etapa": "validacao", "nivel": "error", "mensagem": erro}
+        return
+    if not cep_from:
+        trace.anotar(erro="cep_origem")
+        yield {"evento": "erro", "etapa": "validacao", "nivel": "error",
+               "mensagem": "Informe um **CEP de origem** válido (8 dígitos)."}
+        return
+
+    with trace.etapa("roteamento"):
+        prep = preparar_consulta(
+            dados["produto"], dados["fragilidade"], qtd=dados["qtd"], peso_kg=dados["peso_kg"],
+            categoria=dados["categoria"], dim=dados["dim"], nao_sei_dim=dados["nao_sei_dim"],
+            tamanho_roupa=dados["tamanho_roupa"], dores=dados["dores"],
+        )
+    if not prep:
+        trace.anotar(erro="dimensoes")
+        yield {"evento": "erro", "etapa": "roteamento", "nivel": "error",
+               "mensagem": "Informe CxLxA em cm (ex.: 20x15x10) ou marque 'Não sei as dimensões'."}
+        return
+    trace.anotar(familia=prep["familia"])
+    emp = prep["empacotamento"]
+    if emp:
+        trace.anotar(embalagem=emp["nome"], empacotamento=emp["metodo"])
+    yield {
+        "evento": "roteamento", "familia": prep["familia"], "tipo_preferido": prep["tipo_preferido"],
+        "embalagem_hint": prep["embalagem_hint"], "dims_hint": list(prep["dims_hint"]),
+        "cubado_item": prep["cubado_item"], "peso_envio_kg": prep["peso_envio_kg"],
+        "empacotamento": {k: v for k, v in emp.items() if k != "posicoes"} if emp else None,
+    }
+
+    # ===== FRETE (em paralelo com a IA, com as dimensões do roteador) =====
+    pode_cotar = bool(cep_to and SUPERFRETE_API_TOKEN)
+    cot_futura = None
+    if pode_cotar and FRETE_PARALELO and executor is not None:
+        # copy_context: as anotações da thread (status, cache) vão para o trace deste envio
+        cot_futura = executor.submit(contextvars.copy_context().run, cronometrado, cotar_frete,
+                                     cep_from, cep_to, prep["dims_hint"], prep["peso_envio_kg"])
+
+    # ===== CONSULTOR =====
+    t0 = time.perf_counter()
+    result = {}
+    try:
+        if streaming:
+            origem, campos = consultar_embalagem_stream(prep)
+        else:
+            result, origem = consultar_embalagem(prep)
+            campos = list(result.items())
+        for campo, valor in campos:
+            if "primeiro_conteudo_s" not in trace.atributos:
+                t_primeiro = time.perf_counter() - t0
+                trace.anotar(primeiro_conteudo_s=round(t_primeiro, 4))
+                metricas.observar("primeiro_conteudo_segundos", t_primeiro)
+            result[campo] = valor
+            yield {"evento": "campo", "campo": campo, "valor": valor}
+    except Exception as e:
+        trace.registrar_etapa("consultor", time.perf_counter() - t0)
+        trace.anotar(erro=type(e).__name__)
+        nivel, mensagem = mensagem_erro_ia(e)
+        yield {"evento": "erro", "etapa": "consultor", "nivel": nivel, "mensagem": mensagem, "tipo": type(e).__name__}
+        return
+    trace.registrar_etapa("consultor", time.perf_counter() - t0)
+    trace.anotar(origem=origem)
+    yield {"evento": "consultor", "origem": origem}
+
+    # Dimensões usadas na COTAÇÃO = EMBALAGEM recomendada (fallback: hint/roteador)
+    caixa = result.get("caixa_recomendada", {}) or {}
+    dims_caixa = parse_dimensions(caixa.get("dimensoes_cm") or "") or prep["dims_hint"]
+    if not cep_to:
+        yield {"evento": "frete", "cotacao": None, "motivo": "sem_cep_destino"}
+    elif not SUPERFRETE_API_TOKEN:
+        yield {"evento": "frete", "cotacao": None, "motivo": "sem_token"}
+    else:
+        cot = None
+        if cot_futura is not None:
+            cot, dt = cot_futura.result()
+            trace.registrar_etapa("frete", dt)
+            # a cotação antecipada usou o hint; só recota se a IA mudou a caixa de verdade
+            if dimensoes_divergem(dims_caixa, prep["dims_hint"], FRETE_TOLERANCIA_CM, FRETE_TOLERANCIA_REL):
+                cot = None
+        if cot is None:
+            etapa = "frete_recotacao" if "frete" in trace.etapas else "frete"
+            cot, dt = cronometrado(cotar_frete, cep_from, cep_to, dims_caixa, prep["peso_envio_kg"])
+            trace.registrar_etapa(etapa, dt)
+        yield {"evento": "frete", "cotacao": cotacao_publica(cot)}
+
+    if dados.get("matriz") and SUPERFRETE_API_TOKEN:
+        from matriz_frete import cotar_matriz, tabela  # matriz_frete importa este módulo
+        mtz, dt = cronometrado(cotar_matriz, cep_from, [dims_caixa], prep["peso_envio_kg"])
+        trace.registrar_etapa("frete_matriz", dt)
+        yield {"evento": "matriz", "tabela": tabela(mtz), "stats": mtz["stats"]}
@@ -0,0 +1,202 @@
+# empacotamento.py — escolhe a embalagem padrão para N itens (bin packing 3D)
+#
+# Para cada embalagem do catálogo tenta acomodar os itens (com rotação) e fica com a
+# que minimiza o peso tarifado = max(peso real, cubagem). Caminhos:
+#   grade      : itens idênticos em grade (n_c x n_l x n_a) — O(1) por orientação
+#   heuristica : pontos extremos + first-fit decreasing
+#   exata      : busca exaustiva em pontos extremos para N pequeno (com limite de nós)
+# Sem embalagem do catálogo que sirva, devolve uma caixa sob medida (menor grade).
+import itertools
+
+# (nome, tipo, C, L, A) em cm — medidas EXTERNAS, que vão para a cotação
+CATALOGO_EMBALAGENS = [
+    ("Envelope P", "envelope", 20, 15, 3),
+    ("Envelope M", "envelope", 28, 22, 4),
+    ("Envelope G", "envelope", 36, 28, 5),
+    ("Envelope GG", "envelope", 44, 34, 8),
+    ("Caixa P", "caixa", 16, 11, 6),
+    ("Caixa M", "caixa", 20, 15, 10),
+    ("Caixa G", "caixa", 27, 18, 9),
+    ("Caixa 30", "caixa", 30, 20, 15),
+    ("Caixa 36", "caixa", 36, 27, 18),
+    ("Caixa 40", "caixa", 40, 30, 25),
+    ("Caixa 50", "caixa", 50, 40, 30),
+    ("Caixa 60", "caixa", 60, 45, 40),
+]
+
+# folga interna (C, L, A) por tipo, como em expandir_dimensoes_para_embalagem
+FOLGA = {"caixa": (2, 2, 2), "envelope": (0, 0, 1)}
+
+EXATO_MAX_ITENS = 6
+EXATO_MAX_NOS = 20000
+
+def _orientacoes(dims):
+    # sem repetir rotações equivalentes (ex.: cubo tem 1)
+    return sorted(set(itertools.permutations(dims)))
+
+def _cabe(p, caixa):
+    return p[0] <= caixa[0] + 1e-9 and p[1] <= caixa[1] + 1e-9 and p[2] <= caixa[2] + 1e-9
+
+def _sobrepoe(a, b):
+    ax, ay, az, ac, al, aa = a
+    bx, by, bz, bc, bl, ba = b
+    return ax < bx + bc - 1e-9 and bx < ax + ac - 1e-9 and ay < by + bl - 1e-9 and \
+        by < ay + al - 1e-9 and az < bz + ba - 1e-9 and bz < az + aa - 1e-9
+
+# ==================== GRADE (itens idênticos) ====================
+def empacotar_grade(item, n, interno):
+    """Itens idênticos em grade; devolve posições ou None."""
+    for o in _orientacoes(item):
+        nc, nl, na = (int(interno[i] // o[i]) if o[i] > 0 else 0 for i in range(3))
+        if nc * nl * na >= n:
+            pos = []
+            for k in range(n):
+                i, j, h = k % nc, (k // nc) % nl, k // (nc * nl)
+                pos.append((i * o[0], j * o[1], h * o[2], *o))
+            return pos
+    return None
+
+# ==================== PONTOS EXTREMOS ====================
+def _tentar_colocar(dims, pontos, colocados, interno):
+    for (x, y, z) in pontos:
+        for o in _orientacoes(dims):
+            if not _cabe((x + o[0], y + o[1], z + o[2]), interno):
+                continue
+            cand = (x, y, z, *o)
+            if not any(_sobrepoe(cand, c) for c in colocados):
+                return cand
+    return None
+
+def _novos_pontos(pontos, cand):
+    x, y, z, c, l, a = cand
+    novos = [p for p in pontos if p != (x, y, z)]
+    novos += [(x + c, y, z), (x, y + l, z), (x, y, z + a)]
+    return sorted(set(novos), key=lambda p: (p[2], p[1], p[0]))
+
+def empacotar_heuristica(itens, interno):
+    """First-fit decreasing em pontos extremos (baixo, fundo, esquerda primeiro)."""
+    ordem = sorted(itens, key=lambda d: d[0] * d[1] * d[2], reverse=True)
+    pontos = [(0, 0, 0)]
+    colocados = []
+    for dims in ordem:
+        cand = _tentar_colocar(dims, pontos, colocados, interno)
+        if cand is None:
+            return None
+        colocados.append(cand)
+        pontos = _novos_pontos(pontos, cand)
+    return colocados
+
+def empacotar_exato(itens, interno, max_nos: int = EXATO_MAX_NOS):
+    """Busca exaustiva (backtracking em pontos extremos x orientações).
+
+    Devolve (posições | None, completo); completo=False se estourou `max_nos`.
+    """
+    ordem = sorted(itens, key=lambda d: d[0] * d[1] * d[2], reverse=True)
+    nos = [0]
+
+    def _dfs(i, pontos, colocados):
+        if i == len(ordem):
+            return colocados
+        for (x, y, z) in pontos:
+            for o in _orientacoes(ordem[i]):
+                nos[0] += 1
+                if nos[0] > max_nos:
+                    return None
+                if not _cabe((x + o[0], y + o[1], z + o[2]), interno):
+                    continue
+                cand = (x, y, z, *o)
+                if any(_sobrepoe(cand, c) for c in colocados):
+                    continue
+                r = _dfs(i + 1, _novos_pontos(pontos, cand), colocados + [cand])
+                if r is not None:
+                    return r
+        return None
+
+    r = _dfs(0, [(0, 0, 0)], [])
+    return r, nos[0] <= max_nos
+
+# ==================== ESCOLHA DA EMBALAGEM ====================
+def _interno(dims, tipo):
+    f = FOLGA.get(tipo, (0, 0, 0))
+    return tuple(max(0, dims[i] - f[i]) for i in range(3))
+
+def _acomodar(itens, interno):
+    """(posições, método) ou (None, None)."""
+    vol_itens = sum(d[0] * d[1] * d[2] for d in itens)
+    if vol_itens > interno[0] * interno[1] * interno[2] + 1e-9:
+        return None, None
+    if any(not any(_cabe(o, interno) for o in _orientacoes(d)) for d in itens):
+        return None, None
+    if len(set(itens)) == 1:
+        pos = empacotar_grade(itens[0], len(itens), interno)
+        if pos:
+            return pos, "grade"
+    pos = empacotar_heuristica(itens, interno)
+    if pos:
+        return pos, "heuristica"
+    if len(itens) <= EXATO_MAX_ITENS:
+        pos, _ = empacotar_exato(itens, interno)
+        if pos:
+            return pos, "exata"
+    return None, None
+
+def caixa_sob_medida(itens, tipo: str = "caixa"):
+    """Menor caixa (em peso cubado) para empilhar os itens em grade pela maior orientação comum.
+
+    Envelope: uma camada, itens deitados."""
+    f = FOLGA.get(tipo, (0, 0, 0))
+    if len(set(itens)) == 1:
+        n = len(itens)
+        melhor = None
+        for o in _orientacoes(itens[0]):
+            if tipo == "envelope" and o[2] != min(o):
+                continue  # envelope: itens deitados, numa camada só
+            for nc in range(1, n + 1):
+                for nl in range(1, n // nc + 2):
+                    na = -(-n // (nc * nl))
+                    if tipo == "envelope" and na > 1:
+                        continue
+                    dims = (o[0] * nc + f[0], o[1] * nl + f[1], o[2] * na + f[2])
+                    vol = (dims[0] * dims[1] * dims[2], max(dims))  # empate: a menos comprida
+                    if melhor is None or vol < melhor[0]:
+                        melhor = (vol, dims)
+        dims = melhor[1]
+    else:
+        # itens diferentes: empilha na altura, base = maior base
+        c = max(max(d[0], d[1]) for d in itens)
+        l = max(min(d[0], d[1]) for d in itens)
+        a = sum(d[2] for d in itens)
+        dims = (c + f[0], l + f[1], a + f[2])
+    return tuple(int(round(x + 0.499)) for x in dims)
+
+def escolher_embalagem(itens, peso_total_kg: float, tipos=("envelope", "caixa"), catalogo=None) -> dict:
+    """Embalagem do catálogo, entre os `tipos` aceitos, que acomoda `itens` [(C,L,A), ...] com menor peso tarifado.
+
+    Empate: menor volume. Sem nenhuma que sirva, uma sob medida do 1º tipo aceito. Devolve nome, tipo, dims_cm, peso_tarifado_kg, cubagem_kg, itens,
+    método (grade/heuristica/exata/sob_medida) e posições (x, y, z, c, l, a) de cada item.
+    A cubagem é a do frete (consultor.cubagem_kg), para o divisor não divergir.
+    """
+    from consultor import cubagem_kg  # aqui: consultor importa este módulo
+    itens = [tuple(float(x) for x in d) for d in itens]
+    melhor = None
+    for nome, tipo, c, l, a in (catalogo or CATALOGO_EMBALAGENS):
+        if tipo not in tipos:
+            continue
+        pos, metodo = _acomodar(itens, _interno((c, l, a), tipo))
+        if pos is None:
+            continue
+        cub = cubagem_kg(c, l, a)
+        tarifado = max(float(peso_total_kg), cub)
+        chave = (round(tarifado, 3), c * l * a)
+        if melhor is None or chave < melhor[0]:
+            melhor = (chave, {"nome": nome, "tipo": tipo, "dims_cm": (c, l, a), "cubagem_kg": round(cub, 3),
+                              "peso_tarifado_kg": round(tarifado, 3), "metodo": metodo, "itens": len(itens),
+                              "posicoes": pos})
+    if melhor is not None:
+        return melhor[1]
+
+    tipo = tipos[0] if tipos else "caixa"
+    dims = caixa_sob_medida(itens, tipo)
+    cub = cubagem_kg(*dims)
+    return {"nome": f"{tipo.capitalize()} sob medida", "tipo": tipo, "dims_cm": dims, "cubagem_kg": round(cub, 3),
+            "peso_tarifado_kg": round(max(float(peso_total_kg), cub), 3), "metodo": "sob_medida", "itens": len(itens), "posicoes": []}
@@ -0,0 +1,470 @@
+# historico.py — histórico das consultas (segmentos JSONL só de acréscimo) + consultas agregadas
+#
+# Uso:
+#   python historico.py resumo --desde 2026-10-01 --top 15
+#   python historico.py ajuste                     # candidatos para FAMILIAS / ESTIMATIVAS_DIM
+#   python historico.py catalogo -o top.jsonl --top 200
+#   python tabela_consultor.py --produtos top.jsonl --top 200
+#   FRETE_ZONAS_DB=.cache/frete_zonas.sqlite python historico.py aquecer
+#
+# Com HISTORICO_DIR, cada envio (consulta_eventos) vira uma linha JSON: entrada do
+# formulário, roteamento, origem e resposta do consultor, cotação e tempos. O envio só
+# coloca o registro numa fila; uma thread grava em lotes (HISTORICO_LOTE registros ou
+# HISTORICO_FLUSH_S segundos), então persistir não soma latência à resposta. Fila cheia
+# descarta o registro (contado em historico_total{resultado="descartado"}).
+#
+# Cada processo escreve no seu segmento (consultas-<data>-<pid>-<n>.jsonl); ele é fechado e
+# comprimido (.jsonl.gz) ao passar de HISTORICO_SEGMENTO_MB ou HISTORICO_SEGMENTO_S. Os
+# CEPs ficam só com os HISTORICO_CEP_DIGITOS primeiros dígitos.
+#
+# O histórico também aquece caches num processo novo (HISTORICO_AQUECER): respostas da
+# IA voltam para o índice de produtos parecidos e cotações reais para as células de
+# zona (FRETE_MODO=zonas).
+import argparse
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+import metricas
+from prompts import ASSINATURA_PROMPT
+
+HISTORICO_DIR = os.getenv("HISTORICO_DIR", "")  # ex.: .cache/historico (vazio = desliga)
+HISTORICO_LOTE = int(os.getenv("HISTORICO_LOTE", "200"))  # registros por escrita
+HISTORICO_FLUSH_S = float(os.getenv("HISTORICO_FLUSH_S", "1.0"))  # espera máxima de um registro na fila
+HISTORICO_FILA_MAX = int(os.getenv("HISTORICO_FILA_MAX", "10000"))  # acima disso, descarta
+HISTORICO_SEGMENTO_MB = float(os.getenv("HISTORICO_SEGMENTO_MB", "64"))  # tamanho para rotacionar
+HISTORICO_SEGMENTO_S = float(os.getenv("HISTORICO_SEGMENTO_S", "86400"))  # idade para rotacionar
+HISTORICO_RETER_DIAS = float(os.getenv("HISTORICO_RETER_DIAS", "0"))  # apaga segmentos antigos (0 = mantém)
+HISTORICO_CEP_DIGITOS = int(os.getenv("HISTORICO_CEP_DIGITOS", "5"))  # 8 = CEP inteiro
+HISTORICO_AQUECER = int(os.getenv("HISTORICO_AQUECER", "0"))  # registros recentes lidos na partida (0 = não)
+FORMATO = 1  # suba se o layout do registro mudar
+
+CAMPOS_ENTRADA = ("produto", "categoria", "fragilidade", "dim", "nao_sei_dim", "tamanho_roupa",
+                  "peso_kg", "qtd", "dores", "matriz")
+
+# ==================== REGISTRO ====================
+def _cep(cep) -> str:
+    digitos = "".join(filter(str.isdigit, str(cep or "")))
+    return digitos[:HISTORICO_CEP_DIGITOS] if len(digitos) == 8 else ""
+
+def registro(dados: dict, eventos: list, trace: dict) -> dict:
+    """Uma linha do histórico a partir do formulário, dos eventos do envio e do trace final."""
+    reg = {"v": FORMATO, "ts": trace.get("ts"), "trace": trace.get("trace"),
+           **{k: dados.get(k) for k in CAMPOS_ENTRADA},
+           "cep_from": _cep(dados.get("cep_from")), "cep_to": _cep(dados.get("cep_to"))}
+    resultado = {}
+    for ev in eventos:
+        tipo = ev.get("evento")
+        if tipo == "roteamento":
+            emp = ev.get("empacotamento") or {}
+            reg.update(familia=ev["familia"], tipo_preferido=ev["tipo_preferido"], embalagem_hint=ev["embalagem_hint"],
+                       dims_hint=ev["dims_hint"], peso_envio_kg=ev["peso_envio_kg"], embalagem=emp.get("nome"))
+        elif tipo == "campo":
+            resultado[ev["campo"]] = ev["valor"]
+        elif tipo == "consultor":
+            reg["origem"] = ev["origem"]
+        elif tipo == "frete":
+            reg["frete"] = ev["cotacao"] if ev.get("cotacao") is not None else {"motivo": ev.get("motivo")}
+        elif tipo == "erro":
+            reg["erro"] = {"etapa": ev.get("etapa"), "tipo": ev.get("tipo")}
+    if resultado:
+        reg["resultado"] = resultado
+        reg["assinatura_prompt"] = ASSINATURA_PROMPT
+    reg["total_s"] = trace.get("total_s")
+    reg["etapas"] = trace.get("etapas")
+    return reg
+
+# ==================== ESCRITA (write-behind) ====================
+class Escritor:
+    """Fila + thread que grava lotes no segmento do processo e rotaciona por tamanho/idade."""
+
+    def __init__(self, pasta: str, lote: int = HISTORICO_LOTE, flush_s: float = HISTORICO_FLUSH_S,
+                 fila_max: int = HISTORICO_FILA_MAX):
+        self.pasta = pasta
+        self.lote = max(1, int(lote))
+        self.flush_s = max(0.01, float(flush_s))
+        self._fila: queue.Queue = queue.Queue(maxsize=max(1, int(fila_max)))
+        self._arquivo = None
+        self._path = None
+        self._aberto_em = 0.0
+        self._bytes = 0
+        self._seq = 0
+        os.makedirs(pasta, exist_ok=True)
+        self._thread = threading.Thread(target=self._rodar, name="historico", daemon=True)
+        self._thread.start()
+
+    def enfileirar(self, reg: dict) -> bool:
+        try:
+            self._fila.put_nowait(reg)
+        except queue.Full:
+            metricas.incrementar("historico_total", resultado="descartado")
+            return False
+        metricas.incrementar("historico_total", resultado="enfileirado")
+        return True
+
+    def fechar(self, timeout: float = 5.0):
+        """Grava o que está na fila e fecha o segmento (chamado no atexit)."""
+        try:
+            self._fila.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _rodar(self):
+        while True:
+            item = self._fila.get()
+            lote, fim = [], item is None
+            if not fim:
+                lote.append(item)
+            prazo = time.monotonic() + self.flush_s
+            while not fim and len(lote) < self.lote:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self._fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if item is None:
+                    fim = True
+                else:
+                    lote.append(item)
+            if lote:
+                try:
+                    self._gravar(lote)
+                except Exception:
+                    metricas.incrementar("historico_total", n=len(lote), resultado="erro_escrita")
+            if fim:
+                self._fechar_segmento(compactar=True)  # só o segmento vivo (ou de um processo que caiu) fica em .jsonl
+                return
+
+    def _gravar(self, lote: list):
+        t0 = time.perf_counter()
+        dados = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+                        for r in lote).encode("utf-8")
+        if self._arquivo is not None and (self._bytes + len(dados) > HISTORICO_SEGMENTO_MB * 2**20
+                                          or time.time() - self._aberto_em > HISTORICO_SEGMENTO_S):
+            self._fechar_segmento(compactar=True)
+        if self._arquivo is None:
+            self._abrir_segmento()
+        self._arquivo.write(dados)
+        self._arquivo.flush()  # um write por lote; sem fsync (o histórico tolera perder o último lote)
+        self._bytes += len(dados)
+        metricas.incrementar("historico_total", n=len(lote), resultado="gravado")
+        metricas.observar("historico_lote_segundos", time.perf_counter() - t0)
+
+    def _abrir_segmento(self):
+        self._seq += 1  # dois segmentos no mesmo segundo não colidem
+        nome = f"consultas-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._seq:04d}.jsonl"
+        self._path = os.path.join(self.pasta, nome)
+        self._arquivo = open(self._path, "ab")
+        self._aberto_em = time.time()
+        self._bytes = self._arquivo.tell()
+
+    def _fechar_segmento(self, compactar: bool):
+        if self._arquivo is None:
+            return
+        self._arquivo.close()
+        self._arquivo = None
+        if compactar:
+            _compactar(self._path)
+            _apagar_antigos(self.pasta)
+
+def _compactar(path: str):
+    tmp = path + ".gz.tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+        while bloco := src.read(1 << 20):
+            dst.write(bloco)
+    os.replace(tmp, path + ".gz")  # quem lê nunca vê o .gz pela metade
+    os.remove(path)
+
+def _apagar_antigos(pasta: str):
+    if HISTORICO_RETER_DIAS <= 0:
+        return
+    limite = time.time() - HISTORICO_RETER_DIAS * 86400
+    for path in glob.glob(os.path.join(pasta, "consultas-*.jsonl.gz")):
+        if os.path.getmtime(path) < limite:
+            os.remove(path)
+
+_escritor: Escritor | None = None
+_escritor_lock = threading.Lock()
+
+def registrar(reg: dict) -> bool:
+    """Põe o registro na fila de gravação (não bloqueia). False se desligado ou com a fila cheia."""
+    global _escritor
+    if not HISTORICO_DIR:
+        return False
+    if _escritor is None:
+        with _escritor_lock:
+            if _escritor is None:
+                _escritor = Escritor(HISTORICO_DIR)
+                atexit.register(_escritor.fechar)
+    return _escritor.enfileirar(reg)
+
+# ==================== LEITURA ====================
+def segmentos(pasta: str | None = None) -> list[str]:
+    """Segmentos em ordem de criação (o nome começa com a data)."""
+    pasta = pasta or HISTORICO_DIR
+    paths = glob.glob(os.path.join(pasta, "consultas-*.jsonl")) + glob.glob(os.path.join(pasta, "consultas-*.jsonl.gz"))
+    return sorted(paths, key=os.path.basename)
+
+def _linhas(path: str):
+    abrir = gzip.open if path.endswith(".gz") else open
+    try:
+        with abrir(path, "rt", encoding="utf-8") as f:
+            for t in f:
+                try:
+                    yield json.loads(t)
+                except ValueError:
+                    continue  # última linha de um processo interrompido
+    except (OSError, EOFError):
+        return  # .gz truncado ou segmento removido durante a leitura
+
+def ler(pasta: str | None = None, desde: float | None = None):
+    """Gera os registros do histórico, do mais antigo ao mais novo (a partir de `desde`, epoch)."""
+    for path in segmentos(pasta):
+        for reg in _linhas(path):
+            if desde is None or (reg.get("ts") or 0) >= desde:
+                yield reg
+
+def _ultimas(path: str, n: int, bloco: int = 1 << 16) -> list[dict]:
+    """Os `n` últimos registros de um segmento sem carregá-lo: o .jsonl é lido do fim em blocos;
+    o .gz não permite isso e passa em streaming, guardando só os n últimos."""
+    if path.endswith(".gz"):
+        return list(deque(_linhas(path), maxlen=n))
+    out, resto = [], b""
+    try:
+        with open(path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END)
+            while pos > 0 and len(out) < n:
+                ler_n = min(bloco, pos)
+                pos -= ler_n
+                f.seek(pos)
+                partes = (f.read(ler_n) + resto).split(b"\n")
+                resto = partes.pop(0) if pos > 0 else b""  # linha possivelmente cortada: junta com o bloco anterior
+                for t in reversed(partes):
+                    try:
+                        out.append(json.loads(t))
+                    except ValueError:
+                        continue  # linha vazia ou última linha de um processo interrompido
+                    if len(out) >= n:
+                        break
+    except OSError:
+        return []  # segmento removido durante a leitura
+    return out[::-1]
+
+def recentes(n: int, pasta: str | None = None) -> list[dict]:
+    """Os `n` registros mais novos (lê os segmentos de trás para frente até juntar n)."""
+    out = []
+    for path in reversed(segmentos(pasta)):
+        if len(out) >= n:
+            break
+        out = _ultimas(path, n - len(out)) + out
+    return out
+
+# ==================== AGREGADOS ====================
+def _nome(produto) -> str:
+    return " ".join(str(produto or "").strip().lower().split())
+
+def _mediana(valores: list):
+    return round(statistics.median(valores), 2) if valores else None
+
+def resumo(registros, top: int = 10, digitos: int = 3) -> dict:
+    """Totais, origens, erros, produtos/famílias mais frequentes e frete mediano por rota (prefixos de CEP)."""
+    total, origens, erros, produtos, familias = 0, Counter(), Counter(), Counter(), Counter()
+    precos, prazos, tempos = defaultdict(list), defaultdict(list), []
+    for r in registros:
+        total += 1
+        origens[r.get("origem") or "-"] += 1
+        if r.get("erro"):
+            erros[f"{r['erro'].get('etapa')}:{r['erro'].get('tipo')}"] += 1
+        if r.get("produto"):
+            produtos[_nome(r["produto"])] += 1
+        if r.get("familia"):
+            familias[r["familia"]] += 1
+        if r.get("total_s") is not None:
+            tempos.append(r["total_s"])
+        melhor = (r.get("frete") or {}).get("best_price")
+        if melhor and r.get("cep_from") and r.get("cep_to"):
+            rota = f"{r['cep_from'][:digitos]}>{r['cep_to'][:digitos]}"
+            precos[rota].append(float(melhor.get("price") or 0))
+            if melhor.get("days") is not None:
+                prazos[rota].append(melhor["days"])
+    rotas = sorted(precos, key=lambda k: -len(precos[k]))[:top]
+    return {
+        "consultas": total,
+        "origens": dict(origens.most_common()),
+        "erros": dict(erros.most_common()),
+        "total_s_p50": _mediana(tempos),
+        "produtos": produtos.most_common(top),
+        "familias": familias.most_common(),
+        "rotas": [{"rota": k, "n": len(precos[k]), "preco_p50": _mediana(precos[k]),
+                   "dias_p50": _mediana(prazos[k])} for k in rotas],
+    }
+
+def ajuste(registros, minimo: int = 3, top: int = 20) -> dict:
+    """Dados para calibrar o roteador: produtos que caem em 'outros' (palavras-chave faltando em
+    FAMILIAS) e, por família, a mediana das dimensões informadas x a estimativa usada sem elas."""
+    from consultor import estimar_dimensoes_se_necessario, parse_dimensions
+    outros, informadas, produtos_fam = Counter(), defaultdict(list), defaultdict(Counter)
+    for r in registros:
+        fam = r.get("familia")
+        if not fam:
+            continue
+        if fam == "outros" and r.get("produto"):
+            outros[_nome(r["produto"])] += 1
+        dims = None if r.get("nao_sei_dim") else parse_dimensions(r.get("dim") or "")
+        if dims:
+            informadas[fam].append(sorted(dims, reverse=True))
+            produtos_fam[fam][_nome(r.get("produto"))] += 1
+    familias = {}
+    for fam, lista in sorted(informadas.items()):
+        if len(lista) < minimo:
+            continue
+        mediana = [_mediana([d[i] for d in lista]) for i in range(3)]
+        produto = produtos_fam[fam].most_common(1)[0][0]
+        familias[fam] = {"n": len(lista), "informadas_p50": mediana, "produto_mais_comum": produto,
+                         "estimativa": sorted(estimar_dimensoes_se_necessario(produto, fam), reverse=True)}
+    return {"sem_familia": [(p, n) for p, n in outros.most_common(top) if n >= minimo], "dimensoes": familias}
+
+def catalogo(registros, top: int) -> list[dict]:
+    """Entradas mais frequentes no formato do batch.py / tabela_consultor.py --produtos."""
+    from cache import chave_normalizada
+    contagem, itens = Counter(), {}
+    for r in registros:
+        if not r.get("produto") or not r.get("familia"):
+            continue
+        item = {"produto": r["produto"], "categoria": r.get("categoria") or "Outros",
+                "fragilidade": r.get("fragilidade") or "Média", "dim": "" if r.get("nao_sei_dim") else r.get("dim") or "",
+                "peso_kg": r.get("peso_kg"), "qtd": r.get("qtd") or 1, "tamanho_roupa": r.get("tamanho_roupa"),
+                "dores": ";".join(sorted(r.get("dores") or []))}
+        k = chave_normalizada(item)
+        contagem[k] += 1
+        itens.setdefault(k, item)
+    return [{**itens[k], "ocorrencias": n} for k, n in contagem.most_common(top)]
+
+# ==================== AQUECIMENTO ====================
+def aquecer(registros) -> dict:
+    """Devolve respostas da IA ao índice de parecidos (CONSULTOR_SIMILAR) e cotações reais às
+    células de zona (FRETE_MODO=zonas). Registros de outro prompt ficam de fora."""
+    import consultor
+    import similares
+    import zonas_frete
+    indice = similares.obter_indice()
+    zonas = consultor.FRETE_MODO == "zonas"
+    n = {"similares": 0, "zonas": 0}
+    for r in registros:
+        if indice is not None and r.get("origem") == "ia" and r.get("assinatura_prompt") == ASSINATURA_PROMPT:
+            prep = consultor.preparar_consulta(
+                r.get("produto") or "", r.get("fragilidade") or "Média", qtd=int(r.get("qtd") or 1),
+                peso_kg=float(r.get("peso_kg") or 0.3), categoria=r.get("categoria") or "Outros",
+                dim=r.get("dim"), nao_sei_dim=bool(r.get("nao_sei_dim")),
+                tamanho_roupa=r.get("tamanho_roupa"), dores=r.get("dores"),
+            )
+            if prep and r.get("resultado"):
+                indice.adicionar(prep, r["resultado"])
+                n["similares"] += 1
+        cot = r.get("frete") or {}
+        if zonas and cot.get("best_price") and r.get("cep_from") and r.get("cep_to") and r.get("dims_hint"):
+            # o CEP guardado é um prefixo: completa com zeros (mesma zona com FRETE_ZONA_DIGITOS <= dígitos)
+            cep_from, cep_to = r["cep_from"].ljust(8, "0"), r["cep_to"].ljust(8, "0")
+            caixa = (r.get("resultado") or {}).get("caixa_recomendada") or {}
+            dims = consultor.parse_dimensions(caixa.get("dimensoes_cm") or "") or tuple(r["dims_hint"])
+            peso = consultor.peso_para_cotacao(r.get("peso_envio_kg") or 0.3, dims)
+            n["zonas"] += zonas_frete.semear(cep_from, cep_to, dims, peso, cot, r.get("ts") or 0)
+    metricas.incrementar("historico_aquecidos_total", n["similares"], destino="similares")
+    metricas.incrementar("historico_aquecidos_total", n["zonas"], destino="zonas")
+    return n
+
+def aquecer_na_partida():
+    """HISTORICO_AQUECER registros mais recentes -> caches deste processo (chamado em segundo plano)."""
+    if not HISTORICO_DIR or HISTORICO_AQUECER <= 0:
+        return None
+    return aquecer(recentes(HISTORICO_AQUECER))
+
+# ==================== CLI ====================
+def _epoch(data: str | None) -> float | None:
+    return time.mktime(time.strptime(data, "%Y-%m-%d")) if data else None
+
+def _imprimir_resumo(r: dict):
+    print(f"consultas: {r['consultas']}  total_s p50: {r['total_s_p50']}")
+    print("origens:", ", ".join(f"{k}={v}" for k, v in r["origens"].items()) or "-")
+    if r["erros"]:
+        print("erros:", ", ".join(f"{k}={v}" for k, v in r["erros"].items()))
+    print("\nfamílias:")
+    for fam, n in r["familias"]:
+        print(f"  {fam:<22}{n:>8}")
+    print("\nprodutos mais frequentes:")
+    for p, n in r["produtos"]:
+        print(f"  {p[:40]:<42}{n:>6}")
+    print(f"\n{'rota (prefixo CEP)':<22}{'n':>6}{'preço p50':>12}{'dias p50':>10}")
+    for rota in r["rotas"]:
+        dias = "-" if rota["dias_p50"] is None else rota["dias_p50"]
+        print(f"  {rota['rota']:<20}{rota['n']:>6}{rota['preco_p50']:>12.2f}{dias:>10}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Consultas agregadas e exportação do histórico de consultas.")
+    ap.add_argument("--dir", default=HISTORICO_DIR or ".cache/historico", help="pasta dos segmentos (HISTORICO_DIR)")
+    ap.add_argument("--desde", help="AAAA-MM-DD (inclusive)")
+    sub = ap.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("resumo", help="totais, produtos, famílias e frete mediano por rota")
+    p.add_argument("--top", type=int, default=10)
+    p.add_argument("--digitos", type=int, default=3, help="dígitos do CEP que definem a rota")
+    p.add_argument("--json", action="store_true")
+    p = sub.add_parser("ajuste", help="produtos sem família e dimensões informadas por família")
+    p.add_argument("--min", type=int, default=3, help="ocorrências mínimas")
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--json", action="store_true")
+    p = sub.add_parser("catalogo", help="entradas mais frequentes em JSONL (batch.py / tabela_consultor.py --produtos)")
+    p.add_argument("-o", "--saida", default="-")
+    p.add_argument("--top", type=int, default=200)
+    p = sub.add_parser("aquecer", help="grava cotações do histórico nas células de zona (use com FRETE_ZONAS_DB)")
+    args = ap.parse_args(argv)
+
+    registros = ler(args.dir, _epoch(args.desde))
+    if args.comando == "resumo":
+        r = resumo(registros, args.top, args.digitos)
+        if args.json:
+            print(json.dumps(r, ensure_ascii=False, indent=2))
+        else:
+            _imprimir_resumo(r)
+    elif args.comando == "ajuste":
+        r = ajuste(registros, args.min, args.top)
+        if args.json:
+            print(json.dumps(r, ensure_ascii=False, indent=2))
+            return
+        print("produtos em 'outros' (palavras-chave que faltam em FAMILIAS):")
+        for prod, n in r["sem_familia"]:
+            print(f"  {prod[:40]:<42}{n:>6}")
+        print(f"\n{'família':<22}{'n':>6}  {'informadas p50':<18}estimativa (produto mais comum)")
+        for fam, d in r["dimensoes"].items():
+            inf = "x".join(f"{x:g}" for x in d["informadas_p50"])
+            est = "x".join(str(x) for x in d["estimativa"])
+            print(f"  {fam:<20}{d['n']:>6}  {inf:<18}{est} ({d['produto_mais_comum'][:30]})")
+    elif args.comando == "catalogo":
+        itens = catalogo(registros, max(0, args.top))
+        f = sys.stdout if args.saida == "-" else open(args.saida, "w", encoding="utf-8")
+        try:
+            for item in itens:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        print(f"{len(itens)} entradas -> {args.saida}", file=sys.stderr)
+    elif args.comando == "aquecer":
+        import consultor
+        if consultor.FRETE_MODO != "zonas":
+            sys.exit("Defina FRETE_MODO=zonas (e FRETE_ZONAS_DB para as células sobreviverem a este processo).")
+        n = aquecer(registros)
+        print(f"{n['zonas']} células de zona gravadas", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
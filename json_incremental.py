@@ -0,0 +1,61 @@
+# json_incremental.py — extrai campos de 1º nível de um objeto JSON que chega em pedaços
+#
+# Usado no streaming da IA: cada campo (ex.: "resumo_curto") é entregue assim que
+# seu valor fecha, sem esperar o restante do objeto.
+import json
+
+class CamposJSONIncrementais:
+    """Alimente com `feed(pedaco)`; devolve a lista de (chave, valor) de 1º nível que fecharam."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0          # próximo caractere a examinar
+        self._inicio = None    # início do campo atual (após '{' ou ',')
+        self._prof = 0
+        self._em_string = False
+        self._escape = False
+        self.terminado = False
+
+    def feed(self, pedaco: str) -> list[tuple[str, object]]:
+        self._buf += pedaco
+        saida = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf) and not self.terminado:
+            ch = buf[i]
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._em_string = False
+            elif ch == '"':
+                self._em_string = True
+            elif ch in "{[":
+                self._prof += 1
+                if self._prof == 1:
+                    self._inicio = i + 1
+            elif ch in "}]":
+                self._prof -= 1
+                if self._prof == 0:
+                    saida.extend(self._campo(buf[self._inicio:i]))
+                    self.terminado = True
+            elif ch == "," and self._prof == 1:
+                saida.extend(self._campo(buf[self._inicio:i]))
+                self._inicio = i + 1
+            i += 1
+        self._pos = i
+        # descarta o que já foi consumido para não reparsear texto antigo
+        if self._inicio is not None and self._inicio > 0 and not self.terminado:
+            corte = self._inicio
+            self._buf = buf[corte:]
+            self._pos -= corte
+            self._inicio = 0
+        return saida
+
+    @staticmethod
+    def _campo(trecho: str):
+        if not trecho.strip():
+            return []
+        return list(json.loads("{" + trecho + "}").items())
@@ -0,0 +1,166 @@
+# matriz_frete.py — cota UM pacote para vários destinos (e caixas candidatas) em paralelo
+#
+# Uso:
+#   python matriz_frete.py --cep-from 01001000 --dims 20x15x10 --peso 0.5
+#   python matriz_frete.py --cep-from 01001000 --dims 20x15x10 --caixas 30x20x15,36x27x18 -c 8 --json
+#   python matriz_frete.py --cep-from 01001000 --dims 20x15x10 --destinos destinos.csv   # uf,cep
+#
+# Cada par (destino, caixa) é um cotar_frete: mesma Session (keep-alive), mesmo cache
+# de cotações e mesma coalescência da tela; em paralelo com no máximo
+# MATRIZ_CONCORRENCIA chamadas simultâneas (mantenha <= HTTP_POOL_SIZE).
+import argparse
+import contextvars
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from consultor import SUPERFRETE_API_TOKEN, parse_dimensions, sanitize_cep, cotar_frete
+from resiliencia import definir_prazo, resetar_prazo
+
+MATRIZ_CONCORRENCIA = int(os.getenv("MATRIZ_CONCORRENCIA", "8"))
+MATRIZ_PRAZO_S = float(os.getenv("MATRIZ_PRAZO_S", "60"))  # orçamento da matriz inteira
+
+# Um CEP representativo (região central da capital) por UF
+CEPS_POR_UF = {
+    "AC": "69900062", "AL": "57020000", "AM": "69005000", "AP": "68900073", "BA": "40010000",
+    "CE": "60010000", "DF": "70040010", "ES": "29010000", "GO": "74003010", "MA": "65010000",
+    "MG": "30130000", "MS": "79002000", "MT": "78005000", "PA": "66010000", "PB": "58010000",
+    "PE": "50010000", "PI": "64000020", "PR": "80010000", "RJ": "20010000", "RN": "59010000",
+    "RO": "76801000", "RR": "69301000", "RS": "90010000", "SC": "88010000", "SE": "49010000",
+    "SP": "01001000", "TO": "77001000",
+}
+
+def ler_destinos(path: str) -> dict:
+    """CSV/JSONL com colunas destino|uf e cep -> {destino: cep}; CEPs inválidos são ignorados."""
+    destinos = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            linhas = (json.loads(t) for t in f if t.strip())
+        else:
+            linhas = csv.DictReader(f)
+        for row in linhas:
+            row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+            cep = sanitize_cep(str(row.get("cep") or ""))
+            if cep:
+                destinos[str(row.get("destino") or row.get("uf") or cep)] = cep
+    return destinos
+
+def _resumo_oferta(o: dict) -> dict:
+    return {k: o.get(k) for k in ("company", "service", "price", "days")}
+
+def _chave_prazo(o: dict):
+    # mais rápido; empate pelo menor preço (sem prazo/preço informados vão para o fim)
+    return (o["days"] if isinstance(o["days"], int) else 10**9, o["price"] or 1e12)
+
+def cotar_matriz(cep_from: str, caixas, peso_kg: float, destinos: dict | None = None,
+                 concorrencia: int = MATRIZ_CONCORRENCIA, prazo_s: float = MATRIZ_PRAZO_S) -> dict:
+    """Cota cada (destino, caixa) em paralelo e agrega o melhor preço/prazo por destino.
+
+    `caixas` é uma lista de (C, L, A) em cm; `peso_kg` é o conteúdo do pacote (o peso
+    conservador da caixa é aplicado por cotar_frete). Devolve:
+      linhas        : uma por (destino, caixa), com best_price/best_time ou error
+      melhor_preco  : por destino, a oferta mais barata entre as caixas
+      melhor_prazo  : por destino, a oferta mais rápida entre as caixas
+      stats         : cotacoes, erros, stale, segundos
+    """
+    destinos = destinos or CEPS_POR_UF
+    caixas = [tuple(c) for c in caixas]
+    tarefas = [(dest, cep, caixa) for dest, cep in destinos.items() for caixa in caixas]
+    t0 = time.perf_counter()
+
+    # prazo próprio da matriz, copiado para o contexto de cada tarefa (um contexto por thread)
+    token = definir_prazo(prazo_s)
+    try:
+        contextos = [contextvars.copy_context() for _ in tarefas]
+    finally:
+        resetar_prazo(token)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concorrencia, len(tarefas) or 1))) as ex:
+        futuros = [
+            ex.submit(ctx.run, cotar_frete, cep_from, cep, caixa, peso_kg)
+            for ctx, (dest, cep, caixa) in zip(contextos, tarefas)
+        ]
+        cotacoes = [f.result() for f in futuros]
+
+    linhas, melhor_preco, melhor_prazo = [], {}, {}
+    stats = {"cotacoes": len(tarefas), "erros": 0, "stale": 0}
+    for (dest, cep, caixa), cot in zip(tarefas, cotacoes):
+        linha = {"destino": dest, "cep": cep, "caixa": "{}x{}x{}".format(*(int(round(x)) for x in caixa))}
+        if cot.get("error"):
+            stats["erros"] += 1
+            linhas.append({**linha, "error": cot["error"]})
+            continue
+        if cot.get("stale"):
+            stats["stale"] += 1
+            linha["stale"] = True
+        bp, bt = _resumo_oferta(cot["best_price"]), _resumo_oferta(cot["best_time"])
+        linhas.append({**linha, "best_price": bp, "best_time": bt})
+
+        atual = melhor_preco.get(dest)
+        if bp["price"] and (atual is None or bp["price"] < atual["price"]):
+            melhor_preco[dest] = {**bp, "caixa": linha["caixa"]}
+        atual = melhor_prazo.get(dest)
+        if atual is None or _chave_prazo(bt) < _chave_prazo(atual):
+            melhor_prazo[dest] = {**bt, "caixa": linha["caixa"]}
+
+    stats["segundos"] = round(time.perf_counter() - t0, 3)
+    return {"linhas": linhas, "melhor_preco": melhor_preco, "melhor_prazo": melhor_prazo, "stats": stats}
+
+def tabela(matriz: dict) -> list[dict]:
+    """Uma linha por destino (ordem alfabética) com melhor preço e melhor prazo, pronta p/ st.dataframe/CSV."""
+    erros = {l["destino"]: l["error"] for l in matriz["linhas"] if l.get("error")}
+    out = []
+    for dest in sorted(set(matriz["melhor_preco"]) | set(matriz["melhor_prazo"]) | set(erros)):
+        bp = matriz["melhor_preco"].get(dest) or {}
+        bt = matriz["melhor_prazo"].get(dest) or {}
+        out.append({
+            "destino": dest,
+            "preco_R$": bp.get("price"),
+            "preco_servico": f"{bp.get('company', '-')} {bp.get('service', '-')}" if bp else "-",
+            "preco_prazo_dias": bp.get("days"),
+            "preco_caixa": bp.get("caixa"),
+            "rapido_dias": bt.get("days"),
+            "rapido_R$": bt.get("price"),
+            "rapido_servico": f"{bt.get('company', '-')} {bt.get('service', '-')}" if bt else "-",
+            "erro": erros.get(dest, "") if not bp else "",
+        })
+    return out
+
+# ==================== CLI ====================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Matriz de frete: um pacote para vários destinos (SuperFrete).")
+    ap.add_argument("--cep-from", required=True)
+    ap.add_argument("--dims", required=True, help="caixa CxLxA em cm")
+    ap.add_argument("--caixas", default="", help="caixas candidatas extras, separadas por vírgula")
+    ap.add_argument("--peso", type=float, default=0.3, help="peso do conteúdo (kg)")
+    ap.add_argument("--destinos", help="CSV/JSONL com destino|uf,cep (padrão: 1 CEP por UF)")
+    ap.add_argument("-c", "--concorrencia", type=int, default=MATRIZ_CONCORRENCIA)
+    ap.add_argument("--json", action="store_true", help="imprime a matriz completa em JSON")
+    args = ap.parse_args(argv)
+
+    cep_from = sanitize_cep(args.cep_from)
+    caixas = [parse_dimensions(d) for d in [args.dims, *args.caixas.split(",")] if d.strip()]
+    if not cep_from or not all(caixas):
+        ap.error("CEP de origem ou dimensões inválidos (use CxLxA em cm).")
+    if not SUPERFRETE_API_TOKEN:
+        ap.error("Defina SUPERFRETE_API_TOKEN.")
+
+    matriz = cotar_matriz(cep_from, caixas, args.peso, destinos=ler_destinos(args.destinos) if args.destinos else None,
+                          concorrencia=max(1, args.concorrencia))
+    if args.json:
+        print(json.dumps(matriz, ensure_ascii=False, indent=2))
+    else:
+        for l in tabela(matriz):
+            if l["erro"]:
+                print(f"{l['destino']:<6} erro: {l['erro']}")
+                continue
+            print(f"{l['destino']:<6} R${l['preco_R$']:>8.2f} {l['preco_servico']:<24} {l['preco_prazo_dias'] or '-':>3}d"
+                  f" | mais rápido {l['rapido_dias'] or '-'}d R${l['rapido_R$']:.2f} {l['rapido_servico']}")
+    s = matriz["stats"]
+    print(f"{s['cotacoes']} cotações em {s['segundos']}s ({s['erros']} erros, {s['stale']} da reserva)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
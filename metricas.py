@@ -0,0 +1,212 @@
+# metricas.py — tracing leve por etapa + métricas em memória (Prometheus / JSONL)
+#
+# Cada envio do formulário abre um Trace; as etapas (validação, roteamento, IA,
+# frete, render) viram amostras em histogramas do processo. As chamadas às APIs
+# anotam o trace corrente (tokens, status HTTP, cache) via contextvar, sem que o
+# chamador precise repassar nada.
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICAS_LOG = os.getenv("METRICAS_LOG", "")  # JSONL com 1 linha por trace (vazio = desliga)
+METRICAS_PORTA = int(os.getenv("METRICAS_PORTA", "0"))  # /metrics em texto Prometheus (0 = desliga)
+METRICAS_AMOSTRAS = int(os.getenv("METRICAS_AMOSTRAS", "2048"))  # janela por série p/ percentis
+
+_trace_atual: contextvars.ContextVar = contextvars.ContextVar("trace_atual", default=None)
+
+# ==================== REGISTRO ====================
+def _percentil(ordenado: list, q: float) -> float:
+    if not ordenado:
+        return 0.0
+    k = max(0, min(len(ordenado) - 1, math.ceil(q * len(ordenado)) - 1))
+    return ordenado[k]
+
+class Registro:
+    """Contadores e histogramas (janela das últimas N amostras) rotulados."""
+
+    def __init__(self, amostras: int = 2048):
+        self._lock = threading.Lock()
+        self._amostras = amostras
+        self._hist: dict[tuple, dict] = {}
+        self._cont: dict[tuple, float] = {}
+
+    @staticmethod
+    def _chave(nome: str, rotulos: dict) -> tuple:
+        return (nome, tuple(sorted((k, str(v)) for k, v in rotulos.items())))
+
+    def observar(self, nome: str, valor: float, **rotulos):
+        chave = self._chave(nome, rotulos)
+        with self._lock:
+            h = self._hist.get(chave)
+            if h is None:
+                h = self._hist[chave] = {"n": 0, "soma": 0.0, "janela": deque(maxlen=self._amostras)}
+            h["n"] += 1
+            h["soma"] += valor
+            h["janela"].append(valor)
+
+    def incrementar(self, nome: str, n: float = 1, **rotulos):
+        chave = self._chave(nome, rotulos)
+        with self._lock:
+            self._cont[chave] = self._cont.get(chave, 0) + n
+
+    def resumo(self) -> list[dict]:
+        """Uma linha por série de histograma: n, média e p50/p95/p99 da janela."""
+        with self._lock:
+            itens = [(k, h["n"], h["soma"], sorted(h["janela"])) for k, h in self._hist.items()]
+        linhas = []
+        for (nome, rotulos), n, soma, ordenado in sorted(itens):
+            linhas.append({
+                "metrica": nome, **dict(rotulos), "n": n,
+                "media": soma / n if n else 0.0,
+                "p50": _percentil(ordenado, 0.50),
+                "p95": _percentil(ordenado, 0.95),
+                "p99": _percentil(ordenado, 0.99),
+            })
+        return linhas
+
+    def contadores(self) -> list[dict]:
+        with self._lock:
+            itens = list(self._cont.items())
+        return [{"metrica": nome, **dict(rotulos), "valor": v} for (nome, rotulos), v in sorted(itens)]
+
+    def prometheus(self, extras: dict | None = None) -> str:
+        """Texto no formato de exposição do Prometheus (summaries com quantis da janela)."""
+        def _rot(r: dict) -> str:
+            if not r:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in sorted(r.items())) + "}"
+
+        out = []
+        for c in self.contadores():
+            nome = "consultor_" + c.pop("metrica")
+            v = c.pop("valor")
+            out.append(f"{nome}{_rot(c)} {v}")
+        with self._lock:
+            itens = [(k, h["n"], h["soma"], sorted(h["janela"])) for k, h in self._hist.items()]
+        for (nome, rotulos), n, soma, ordenado in sorted(itens):
+            base = "consultor_" + nome
+            r = dict(rotulos)
+            for q in (0.5, 0.95, 0.99):
+                out.append(f"{base}{_rot({**r, 'quantile': q})} {_percentil(ordenado, q)}")
+            out.append(f"{base}_sum{_rot(r)} {soma}")
+            out.append(f"{base}_count{_rot(r)} {n}")
+        for grupo, series in (extras or {}).items():
+            for nome_serie, valores in series.items():
+                for k, v in valores.items():
+                    if isinstance(v, (int, float)):
+                        out.append(f'consultor_{grupo}_{k}{{nome="{nome_serie}"}} {v}')
+        return "\n".join(out) + "\n"
+
+REGISTRO = Registro(METRICAS_AMOSTRAS)
+
+def observar(nome: str, valor: float, **rotulos):
+    REGISTRO.observar(nome, valor, **rotulos)
+
+def incrementar(nome: str, n: float = 1, **rotulos):
+    REGISTRO.incrementar(nome, n, **rotulos)
+
+# ==================== TRACE ====================
+def _acumula(atributo: str) -> bool:
+    return atributo.startswith("tokens_") or atributo == "retries" or atributo.endswith("_s")
+
+class Trace:
+    """Um envio do formulário: etapas cronometradas + atributos (tokens, status, cache...)."""
+
+    def __init__(self, nome: str = "consulta"):
+        self.nome = nome
+        self.id = uuid.uuid4().hex[:12]
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self.etapas: dict[str, float] = {}
+        self.atributos: dict = {}
+        self._token = _trace_atual.set(self)
+
+    @contextmanager
+    def etapa(self, nome: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_etapa(nome, time.perf_counter() - t0)
+
+    def registrar_etapa(self, nome: str, segundos: float):
+        self.etapas[nome] = self.etapas.get(nome, 0.0) + segundos
+        observar("etapa_segundos", segundos, etapa=nome)
+
+    def anotar(self, **kv):
+        """Contadores (tokens_*, retries, *_s) somam a cada anotação; o resto guarda o último valor."""
+        for k, v in kv.items():
+            if _acumula(k) and isinstance(v, (int, float)) and not isinstance(v, bool):
+                self.atributos[k] = self.atributos.get(k, 0) + v  # ex.: tokens de duas chamadas somam
+            else:
+                self.atributos[k] = v  # ex.: status da última tentativa, não a soma deles
+
+    def finalizar(self) -> dict:
+        total = time.perf_counter() - self._t0
+        observar("consulta_segundos", total)
+        try:
+            _trace_atual.reset(self._token)
+        except ValueError:
+            _trace_atual.set(None)  # finalizado em outro contexto
+        reg = {"trace": self.id, "nome": self.nome, "ts": round(self.inicio, 3), "total_s": round(total, 4),
+               "etapas": {k: round(v, 4) for k, v in self.etapas.items()}, **self.atributos}
+        if METRICAS_LOG:
+            _escrever_log(reg)
+        return reg
+
+def anotar(**kv):
+    """Anota o trace corrente (se houver)."""
+    t = _trace_atual.get()
+    if t is not None:
+        t.anotar(**kv)
+
+_log_lock = threading.Lock()
+
+def _escrever_log(reg: dict):
+    linha = json.dumps(reg, ensure_ascii=False, default=str) + "\n"
+    with _log_lock:
+        with open(METRICAS_LOG, "a", encoding="utf-8") as f:
+            f.write(linha)
+
+# ==================== ENDPOINT /metrics ====================
+_servidor = None
+
+def _extras() -> dict:
+    # estado de caches e pools na hora da coleta
+    from cache import stats_caches
+    from clientes import stats_conexoes
+    from similares import stats_similares
+    return {"cache": {**stats_caches(), **stats_similares()}, "conexoes": stats_conexoes()}
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = REGISTRO.prometheus(_extras()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+def iniciar_servidor(porta: int = METRICAS_PORTA):
+    """Sobe /metrics numa thread daemon (uma vez por processo)."""
+    global _servidor
+    if not porta:
+        return None
+    with _log_lock:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer(("0.0.0.0", porta), _Handler)
+            threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+    return _servidor
@@ -0,0 +1,106 @@
+# prompts.py — mensagens e formato de saída do consultor (IA)
+#
+# Tudo o que é fixo fica no início (system) e a mensagem do usuário leva só os dados do
+# envio: o ganho é prompt curto (~200 tokens de system). Nada é tokenizado aqui, e o
+# prompt fica abaixo do mínimo do cache de prefixo da OpenAI (~1024 tokens), então não
+# conte com desconto de cache; tokens_prompt_cache só mede se o provedor aplicar algum.
+# O schema vai como structured output (json_schema estrito), não como texto no prompt.
+import hashlib
+import json
+import os
+
+# Suba a versão sempre que mudar prompts/schema: ela entra na chave do cache do consultor.
+PROMPT_VERSION = "v3"
+
+CONSULTOR_SAIDA = os.getenv("CONSULTOR_SAIDA", "json_schema")  # json_schema | json_object (modelos sem suporte)
+CONSULTOR_MAX_TOKENS = int(os.getenv("CONSULTOR_MAX_TOKENS", "700"))  # teto da resposta (0 = sem teto)
+# riscos_e_mitigacoes / impacto_cubagem não aparecem na tela: só são pedidos se ligados
+CONSULTOR_CAMPOS_EXTRAS = os.getenv("CONSULTOR_CAMPOS_EXTRAS", "false").lower() == "true"
+
+# ==================== SCHEMA ====================
+def _obj(props: dict) -> dict:
+    # structured outputs estritos: todos os campos obrigatórios e nada além deles
+    return {"type": "object", "properties": props, "required": list(props), "additionalProperties": False}
+
+_TXT = {"type": "string"}
+
+# A ordem dos campos importa no streaming: o que a tela mostra primeiro vem primeiro.
+_CAMPOS = {
+    "resumo_curto": _TXT,
+    "caixa_recomendada": _obj({"descricao": _TXT, "dimensoes_cm": _TXT, "justificativa": _TXT}),
+    "protecao_interna": {"type": "array", "items": _obj({"tipo": _TXT, "qtde_sugerida": _TXT, "observacao": _TXT})},
+    "lacres_e_reforcos": {"type": "array", "items": _obj({"tipo": _TXT, "observacao": _TXT})},
+    "boas_praticas": {"type": "array", "items": _TXT},
+}
+_CAMPOS_EXTRAS = {
+    "riscos_e_mitigacoes": {"type": "array", "items": _obj({"risco": _TXT, "mitigacao": _TXT})},
+    "impacto_cubagem": _obj({"comentario": _TXT}),
+}
+
+SCHEMA_CONSULTOR = _obj({**_CAMPOS, **(_CAMPOS_EXTRAS if CONSULTOR_CAMPOS_EXTRAS else {})})
+
+def formato_resposta() -> dict:
+    """response_format da chamada: json_schema estrito (padrão) ou json_object."""
+    if CONSULTOR_SAIDA == "json_object":
+        return {"type": "json_object"}
+    return {"type": "json_schema",
+            "json_schema": {"name": "consultoria_embalagem", "strict": True, "schema": SCHEMA_CONSULTOR}}
+
+# ==================== MENSAGENS ====================
+def _exemplo(schema: dict):
+    # esqueleto compacto do schema (só no modo json_object, em que o schema não vai na API)
+    t = schema.get("type")
+    if t == "object":
+        return {k: _exemplo(v) for k, v in schema["properties"].items()}
+    if t == "array":
+        return [_exemplo(schema["items"])]
+    return "string"
+
+SYSTEM_PROMPT = (
+    "Você é o Consultor de Embalagens da SuperFrete. Responda em PT-BR, didático e direto. "
+    "Não invente políticas específicas de transportadoras. "
+    "Prefira custo baixo, segurança adequada e redução de cubagem; em trade-offs, explique em uma frase.\n"
+    "Siga a diretriz de embalagem enviada (tipo e dimensões): discorde apenas se houver risco claro "
+    "(ex.: fragilidade alta incompatível) e justifique. Se faltarem dados, assuma o conservador e diga isso "
+    "na justificativa.\n"
+    "Seja breve: resumo_curto com até 2 frases; justificativa com 1-2 frases; até 3 itens em "
+    "protecao_interna e lacres_e_reforcos; exatamente 3 boas_praticas curtas; dimensoes_cm no formato CxLxA."
+)
+if CONSULTOR_SAIDA == "json_object":
+    SYSTEM_PROMPT += "\nRetorne APENAS um JSON com esta estrutura, nesta ordem de campos:\n" + \
+        json.dumps(_exemplo(SCHEMA_CONSULTOR), ensure_ascii=False, separators=(",", ":"))
+
+def mensagens_consultor(payload: dict, tipo_preferido: str, embalagem_hint: str) -> list[dict]:
+    """Mensagens system (fixa) + user (só os dados do envio); iguais no modo normal e no streaming."""
+    dores = ", ".join(payload.get("dores") or []) or "-"
+    user_prompt = (
+        f"Categoria: {payload.get('categoria')}\n"
+        f"Produto: {payload.get('produto')}\n"
+        f"Fragilidade: {payload.get('fragilidade')}\n"
+        f"Item (cm, CxLxA): {payload.get('dimensoes_cm')}\n"
+        f"Peso do item (kg): {payload.get('peso_kg')}\n"
+        f"Quantidade por envio: {payload.get('qtd_por_envio')}\n"
+        f"Dores: {dores}\n"
+        f"Tipo preferido: {tipo_preferido}\n"
+        f"Dimensões sugeridas da embalagem: {embalagem_hint}"
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+def parametros_chamada(payload: dict, tipo_preferido: str, embalagem_hint: str) -> dict:
+    """kwargs comuns de chat.completions.create (mensagens, formato de saída e teto de tokens)."""
+    kw = {
+        "temperature": 0.2,
+        "response_format": formato_resposta(),
+        "messages": mensagens_consultor(payload, tipo_preferido, embalagem_hint),
+    }
+    if CONSULTOR_MAX_TOKENS > 0:
+        kw["max_tokens"] = CONSULTOR_MAX_TOKENS
+    return kw
+
+# Muda com qualquer alteração de prompt, schema ou limites: chaveia caches de respostas da IA
+ASSINATURA_PROMPT = PROMPT_VERSION + "-" + hashlib.sha256(json.dumps(
+    [SYSTEM_PROMPT, formato_resposta(), CONSULTOR_MAX_TOKENS], ensure_ascii=False, sort_keys=True,
+).encode("utf-8")).hexdigest()[:10]
@@ -0,0 +1,195 @@
+# regras.py — respostas do consultor montadas por regras (sem IA)
+#
+# Para famílias em que FAMILIAS + ESTIMATIVAS_DIM + roteador já decidem a embalagem,
+# a IA só parafraseia o roteador. Aqui montamos a MESMA estrutura que
+# call_consultor_ia devolve a partir de conhecimento tabelado.
+
+# ==================== CONHECIMENTO POR FAMÍLIA ====================
+TEMPLATES = {
+    "textil": {
+        "justificativa": "Tecido não quebra: envelope coextrusado protege de umidade e violação sem gerar cubagem.",
+        "protecao_interna": [
+            {"tipo": "Saco plástico individual", "qtde_sugerida": "1 por peça", "observacao": "Evita umidade e manchas."},
+        ],
+        "lacres_e_reforcos": [
+            {"tipo": "Adesivo permanente do próprio envelope", "observacao": "Evidencia violação; dispensa fita extra."},
+        ],
+        "riscos_e_mitigacoes": [
+            {"risco": "Umidade", "mitigacao": "Saco plástico interno ou envelope coextrusado."},
+            {"risco": "Violação", "mitigacao": "Envelope com lacre permanente e sem identificação do conteúdo."},
+        ],
+        "boas_praticas": [
+            "Dobre a peça no tamanho do envelope para não sobrar ar",
+            "Não use caixa para roupas: aumenta a cubagem sem ganho de proteção",
+            "Cole a etiqueta em superfície lisa, longe da aba",
+        ],
+        "cubagem": "Envelope acompanha o volume da peça; peso cubado costuma ficar abaixo do peso real.",
+    },
+    "livro_papel": {
+        "justificativa": "Envelope rígido evita dobras nos cantos; caixa baixa só compensa com mais de uma unidade.",
+        "protecao_interna": [
+            {"tipo": "Saco plástico", "qtde_sugerida": "1 por item", "observacao": "Protege contra umidade."},
+            {"tipo": "Papelão rígido (cantoneira ou placa)", "qtde_sugerida": "1-2 placas", "observacao": "Evita dobras de capa e cantos."},
+        ],
+        "lacres_e_reforcos": [
+            {"tipo": "Fita adesiva nas bordas", "observacao": "Reforça o fechamento do envelope rígido."},
+        ],
+        "riscos_e_mitigacoes": [
+            {"risco": "Cantos amassados", "mitigacao": "Placa de papelão rígido ou envelope com reforço."},
+            {"risco": "Umidade", "mitigacao": "Saco plástico antes do envelope."},
+        ],
+        "boas_praticas": [
+            "Escolha o envelope com no máximo 1 cm de folga em cada lado",
+            "Em mais de uma unidade, prefira caixa baixa em vez de vários envelopes",
+            "Proteja capas brilhantes do contato direto com fita",
+        ],
+        "cubagem": "Itens planos têm cubagem baixa; evite caixas altas.",
+    },
+    "ceramica_vidro": {
+        "justificativa": "Item frágil: caixa rígida com várias camadas de amortecimento e folga para absorver impacto.",
+        "protecao_interna": [
+            {"tipo": "Plástico bolha", "qtde_sugerida": "2-3 voltas", "observacao": "Envolva o item inteiro, com atenção a alças e bordas."},
+            {"tipo": "Preenchimento (papel amassado ou flocos)", "qtde_sugerida": "Preencher todos os vazios", "observacao": "O item não pode se mover ao sacudir a caixa."},
+        ],
+        "lacres_e_reforcos": [
+            {"tipo": "Fita adesiva em H", "observacao": "Fecha abas superior e inferior."},
+            {"tipo": "Etiqueta 'Frágil'", "observacao": "Não substitui a proteção interna."},
+        ],
+        "riscos_e_mitigacoes": [
+            {"risco": "Quebra por impacto", "mitigacao": "Camadas de bolha + preenchimento e ~2 cm de folga em todos os lados."},
+            {"risco": "Quebra por compressão", "mitigacao": "Caixa de parede dupla em itens pesados ou empilhados."},
+        ],
+        "boas_praticas": [
+            "Faça o teste de sacudir: nada pode se mexer dentro",
+            "Proteja alças e bicos separadamente",
+            "Nunca encoste o item na parede da caixa",
+        ],
+        "cubagem": "A folga aumenta a cubagem; mantenha ~2 cm por lado, não mais.",
+    },
+    "eletronicos_leves": {
+        "justificativa": "Caixa pequena protege contra compressão; acolchoamento evita choque nos componentes.",
+        "protecao_interna": [
+            {"tipo": "Plástico bolha", "qtde_sugerida": "1-2 voltas", "observacao": "Sobre a embalagem original, se houver."},
+            {"tipo": "Saco antiestático", "qtde_sugerida": "1", "observacao": "Para itens sem embalagem original."},
+        ],
+        "lacres_e_reforcos": [
+            {"tipo": "Fita adesiva em H", "observacao": "Fechamento seguro das abas."},
+            {"tipo": "Lacre de segurança", "observacao": "Dificulta violação e ajuda em disputas de extravio."},
+        ],
+        "riscos_e_mitigacoes": [
+            {"risco": "Impacto", "mitigacao": "Acolchoamento em todos os lados."},
+            {"risco": "Extravio/violação", "mitigacao": "Caixa sem identificação do conteúdo e lacre de segurança."},
+        ],
+        "boas_praticas": [
+            "Mantenha a embalagem original dentro da caixa de envio",
+            "Não identifique a marca do produto por fora",
+            "Fotografe o item embalado antes de fechar",
+        ],
+        "cubagem": "Caixa pequena com folga mínima mantém o peso cubado baixo.",
+    },
+    "cosmeticos": {
+        "justificativa": "Líquidos e cremes vazam sob pressão: vedação da tampa e proteção pontual são o essencial.",
+        "protecao_interna": [
+            {"tipo": "Filme ou fita na tampa", "qtde_sugerida": "1 por frasco", "observacao": "Evita vazamento."},
+            {"tipo": "Saco plástico com fecho", "qtde_sugerida": "1 por frasco", "observacao": "Contém vazamentos."},
+            {"tipo": "Plástico bolha", "qtde_sugerida": "1-2 voltas", "observacao": "Em frascos de vidro."},
+        ],
+        "lacres_e_reforcos": [
+            {"tipo": "Fita adesiva em H", "observacao": "Fechamento das abas."},
+        ],
+        "riscos_e_mitigacoes": [
+            {"risco": "Vazamento", "mitigacao": "Vedação da tampa + saco plástico individual."},
+            {"risco": "Quebra (vidro)", "mitigacao": "Bolha e preenchimento dos vazios."},
+        ],
+        "boas_praticas": [
+            "Envie os frascos em pé, com a tampa para cima",
+            "Separe frascos entre si para não colidirem",
+            "Verifique restrições de envio para inflamáveis (ex.: perfume)",
+        ],
+        "cubagem": "Itens pequenos: caixa ou blister justo evita pagar por ar.",
+    },
+    "joias_acessorios": {
+        "justificativa": "Itens pequenos e de valor: estojo protege e o envelope externo reduz custo e cubagem.",
+        "protecao_interna": [
+            {"tipo": "Estojo ou saquinho", "qtde_sugerida": "1 por peça", "observacao": "Evita riscos e emaranhados."},
+            {"tipo": "Plástico bolha", "qtde_sugerida": "1 volta", "observacao": "Em óculos e relógios."},
+        ],
+        "lacres_e_reforcos": [
+            {"tipo": "Envelope com lacre permanente", "observacao": "Evidencia violação."},
+        ],
+        "riscos_e_mitigacoes": [
+            {"risco": "Extravio/violação", "mitigacao": "Embalagem discreta e lacre permanente."},
+            {"risco": "Amassado (óculos)", "mitigacao": "Estojo rígido."},
+        ],
+        "boas_praticas": [
+            "Não indique o conteúdo por fora",
+            "Considere seguro para peças de maior valor",
+            "Prenda a peça dentro do estojo para não chacoalhar",
+        ],
+        "cubagem": "Volume pequeno: o peso real costuma prevalecer sobre o cubado.",
+    },
+}
+
+# Usado quando a família não tem template (ex.: fallback com a IA fora do ar)
+TEMPLATE_PADRAO = {
+    "justificativa": "Recomendação padrão conservadora: caixa de papelão com folga e proteção em todos os lados.",
+    "protecao_interna": [
+        {"tipo": "Plástico bolha", "qtde_sugerida": "1-2 voltas", "observacao": "Envolva o item inteiro."},
+        {"tipo": "Preenchimento (papel amassado)", "qtde_sugerida": "Preencher os vazios", "observacao": "O item não deve se mover."},
+    ],
+    "lacres_e_reforcos": [
+        {"tipo": "Fita adesiva em H", "observacao": "Fecha abas superior e inferior."},
+    ],
+    "riscos_e_mitigacoes": [
+        {"risco": "Impacto", "mitigacao": "Proteção em todos os lados e folga de ~2 cm."},
+    ],
+    "boas_praticas": [
+        "Faça o teste de sacudir antes de fechar",
+        "Use caixa nova e resistente ao peso do item",
+        "Cole a etiqueta na face maior, longe das emendas",
+    ],
+    "cubagem": "Mantenha a folga mínima segura para não pagar por ar.",
+}
+
+# Reforço extra aplicado quando a fragilidade é alta (em famílias resolvidas por regras)
+REFORCO_ALTA = {"tipo": "Camada extra de plástico bolha", "qtde_sugerida": "+1-2 voltas",
+                "observacao": "Fragilidade alta informada pelo lojista."}
+
+# ==================== MONTAGEM ====================
+def resposta_por_regras(payload: dict, tipo_preferido: str, embalagem_hint: str, familia: str) -> dict:
+    """Resposta no schema de call_consultor_ia, montada a partir de TEMPLATES (ou TEMPLATE_PADRAO)."""
+    t = TEMPLATES.get(familia, TEMPLATE_PADRAO)
+    qtd = int(payload.get("qtd_por_envio") or 1)
+    fragilidade = (payload.get("fragilidade") or "Média").lower()
+    dores = payload.get("dores") or []
+
+    protecao = [dict(p) for p in t["protecao_interna"]]
+    if fragilidade == "alta":
+        protecao.append(dict(REFORCO_ALTA))
+
+    boas = list(t["boas_praticas"])
+    if "Volume/cubagem" in dores:
+        boas.append("Reduza a folga interna ao mínimo seguro para baixar o peso cubado")
+    if "Extravio" in dores:
+        boas.append("Use lacre de segurança e embalagem sem identificação do conteúdo")
+    if "Custo de embalagem" in dores:
+        boas.append("Compre embalagens no tamanho padrão mais próximo e em lote")
+
+    justificativa = t["justificativa"]
+    if qtd > 1:
+        justificativa += f" Dimensões calculadas para acomodar as {qtd} unidades."
+
+    produto = payload.get("produto") or "o item"
+    return {
+        "caixa_recomendada": {
+            "descricao": tipo_preferido,
+            "dimensoes_cm": embalagem_hint,
+            "justificativa": justificativa,
+        },
+        "protecao_interna": protecao,
+        "lacres_e_reforcos": [dict(l) for l in t["lacres_e_reforcos"]],
+        "riscos_e_mitigacoes": [dict(r) for r in t["riscos_e_mitigacoes"]],
+        "impacto_cubagem": {"comentario": t["cubagem"]},
+        "boas_praticas": boas,
+        "resumo_curto": f"Para {produto}: {tipo_preferido.lower()} de {embalagem_hint} cm. {t['justificativa']}",
+    }
@@ -0,0 +1,253 @@
+# resiliencia.py — retry com backoff, orçamento de retries, circuit breaker e prazo total
+#
+# Compartilhado por OpenAI e SuperFrete. Cada upstream tem seu breaker e seu
+# orçamento de retries (por processo); o prazo da consulta corre num contextvar,
+# então chega às threads do frete via contextvars.copy_context().
+import contextvars
+import email.utils
+import os
+import random
+import threading
+import time
+
+import metricas
+
+RESILIENCIA_TENTATIVAS = int(os.getenv("RESILIENCIA_TENTATIVAS", "3"))  # total, incluindo a 1ª
+RESILIENCIA_BACKOFF_BASE = float(os.getenv("RESILIENCIA_BACKOFF_BASE", "0.5"))  # s
+RESILIENCIA_BACKOFF_TETO = float(os.getenv("RESILIENCIA_BACKOFF_TETO", "8"))  # s
+RESILIENCIA_ORCAMENTO_RETRY = float(os.getenv("RESILIENCIA_ORCAMENTO_RETRY", "0.2"))  # retries por sucesso
+CIRCUITO_FALHAS = int(os.getenv("CIRCUITO_FALHAS", "5"))  # falhas seguidas para abrir
+CIRCUITO_RESET_S = float(os.getenv("CIRCUITO_RESET_S", "30"))  # aberto por N s antes de testar de novo
+CONSULTA_PRAZO_S = float(os.getenv("CONSULTA_PRAZO_S", "25"))  # orçamento total de um envio
+
+STATUS_RETENTAVEIS = {408, 409, 429, 500, 502, 503, 504}
+
+# ==================== ERROS ====================
+class CircuitoAberto(RuntimeError):
+    """Upstream marcado como degradado: falha imediata sem chamar a rede."""
+
+class PrazoEsgotado(TimeoutError):
+    """O orçamento de tempo da consulta acabou."""
+
+class ErroUpstream(RuntimeError):
+    """Resposta HTTP de erro, com status e Retry-After (para quem usa requests)."""
+
+    def __init__(self, status_code: int, mensagem: str = "", retry_after: str | None = None):
+        super().__init__(f"Erro {status_code}: {mensagem}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def status_http(e: BaseException) -> int | None:
+    s = getattr(e, "status_code", None)
+    if s is None:
+        s = getattr(getattr(e, "response", None), "status_code", None)
+    return s if isinstance(s, int) else None
+
+def retentavel(e: BaseException) -> bool:
+    """Falhas transitórias: 429/5xx, timeouts e conexão. Falta de crédito (quota) não é."""
+    msg = str(e).lower()
+    if "insufficient_quota" in msg:
+        return False
+    if isinstance(e, PrazoEsgotado):
+        return False
+    s = status_http(e)
+    if s is not None:
+        return s in STATUS_RETENTAVEIS
+    nome = type(e).__name__.lower()
+    return "timeout" in nome or "connection" in nome or "rate limit" in msg
+
+def retry_after_s(e: BaseException) -> float | None:
+    """Segundos pedidos pelo servidor (Retry-After / retry-after-ms), se houver."""
+    bruto = getattr(e, "retry_after", None)
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if headers is not None:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            try:
+                return float(ms) / 1000.0
+            except ValueError:
+                pass
+        bruto = bruto or headers.get("retry-after")
+    if not bruto:
+        return None
+    try:
+        return max(0.0, float(bruto))
+    except ValueError:
+        data = email.utils.parsedate_to_datetime(bruto)
+        return max(0.0, data.timestamp() - time.time()) if data else None
+
+# ==================== PRAZO (deadline) ====================
+_prazo_atual: contextvars.ContextVar = contextvars.ContextVar("prazo_atual", default=None)
+
+class Prazo:
+    def __init__(self, segundos: float):
+        self.fim = time.monotonic() + segundos
+
+    def restante(self) -> float:
+        return max(0.0, self.fim - time.monotonic())
+
+    def limitar(self, timeout: float) -> float:
+        """min(timeout, restante); PrazoEsgotado se não sobrou nada."""
+        r = self.restante()
+        if r <= 0:
+            raise PrazoEsgotado("Prazo da consulta esgotado.")
+        return min(timeout, r)
+
+def definir_prazo(segundos: float = CONSULTA_PRAZO_S):
+    """Inicia o prazo da consulta no contexto atual; devolve o token (para resetar_prazo)."""
+    return _prazo_atual.set(Prazo(segundos) if segundos and segundos > 0 else None)
+
+def resetar_prazo(token):
+    try:
+        _prazo_atual.reset(token)
+    except ValueError:
+        _prazo_atual.set(None)
+
+def prazo_atual() -> Prazo | None:
+    return _prazo_atual.get()
+
+def timeout_no_prazo(timeout: float) -> float:
+    """Timeout de uma chamada respeitando o prazo da consulta (se houver)."""
+    p = _prazo_atual.get()
+    return p.limitar(timeout) if p is not None else timeout
+
+# ==================== CIRCUIT BREAKER ====================
+class CircuitBreaker:
+    """Fechado -> (N falhas seguidas) -> aberto -> (reset_s) -> meio-aberto: 1 chamada de teste."""
+
+    def __init__(self, nome: str, falhas: int = CIRCUITO_FALHAS, reset_s: float = CIRCUITO_RESET_S):
+        self.nome = nome
+        self.falhas_para_abrir = falhas
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._falhas < self.falhas_para_abrir:
+                return "fechado"
+            return "aberto" if time.monotonic() < self._aberto_ate else "meio_aberto"
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self._falhas < self.falhas_para_abrir:
+                return True
+            if time.monotonic() < self._aberto_ate or self._testando:
+                return False
+            self._testando = True  # meio-aberto: deixa passar uma chamada
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._testando = False
+
+    def liberar(self):
+        """Fim de uma chamada que não diz nada sobre a saúde do upstream (ex.: 4xx): só libera o teste."""
+        with self._lock:
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._testando = False
+            if self._falhas >= self.falhas_para_abrir:
+                self._aberto_ate = time.monotonic() + self.reset_s
+                abriu = True
+            else:
+                abriu = False
+        if abriu:
+            metricas.incrementar("circuito_aberto_total", upstream=self.nome)
+
+# ==================== ORÇAMENTO DE RETRIES ====================
+class OrcamentoRetries:
+    """Balde de fichas: cada sucesso deposita `razao`, cada retry gasta 1; começa com `minimo` fichas.
+
+    Em degradação os retries param de multiplicar a carga sobre o upstream.
+    """
+
+    def __init__(self, razao: float = RESILIENCIA_ORCAMENTO_RETRY, minimo: float = 10.0, maximo: float = 100.0):
+        self.razao = razao
+        self.maximo = maximo
+        self._fichas = minimo
+        self._lock = threading.Lock()
+
+    def depositar(self):
+        with self._lock:
+            self._fichas = min(self.maximo, self._fichas + self.razao)
+
+    def gastar(self) -> bool:
+        with self._lock:
+            if self._fichas < 1:
+                return False
+            self._fichas -= 1
+            return True
+
+_breakers: dict[str, CircuitBreaker] = {}
+_orcamentos: dict[str, OrcamentoRetries] = {}
+_registro_lock = threading.Lock()
+
+def breaker(upstream: str) -> CircuitBreaker:
+    with _registro_lock:
+        b = _breakers.get(upstream)
+        if b is None:
+            b = _breakers[upstream] = CircuitBreaker(upstream)
+        return b
+
+def orcamento(upstream: str) -> OrcamentoRetries:
+    with _registro_lock:
+        o = _orcamentos.get(upstream)
+        if o is None:
+            o = _orcamentos[upstream] = OrcamentoRetries()
+        return o
+
+def estado_upstreams() -> dict:
+    with _registro_lock:
+        nomes = list(_breakers)
+    return {n: breaker(n).estado for n in nomes}
+
+# ==================== EXECUÇÃO ====================
+def backoff_s(tentativa: int, base: float = RESILIENCIA_BACKOFF_BASE, teto: float = RESILIENCIA_BACKOFF_TETO) -> float:
+    """Exponencial com jitter completo: uniforme em [0, min(teto, base*2^tentativa)]."""
+    return random.uniform(0, min(teto, base * (2 ** tentativa)))
+
+def executar(upstream: str, func, tentativas: int = RESILIENCIA_TENTATIVAS):
+    """Chama func() com breaker, retries com backoff/Retry-After, orçamento e prazo da consulta.
+
+    Retry-After acima de RESILIENCIA_BACKOFF_TETO não é esperado: a falha sobe na hora.
+    """
+    b = breaker(upstream)
+    orc = orcamento(upstream)
+    for i in range(max(1, tentativas)):
+        if not b.permitir():
+            metricas.anotar(**{f"circuito_{upstream}": "aberto"})
+            raise CircuitoAberto(f"{upstream} indisponível no momento (circuito aberto).")
+        p = _prazo_atual.get()
+        if p is not None and p.restante() <= 0:
+            raise PrazoEsgotado("Prazo da consulta esgotado.")
+        try:
+            out = func()
+        except Exception as e:
+            if not retentavel(e):
+                # erro do cliente (4xx, quota, JSON): não conta como degradação nem como recuperação
+                b.liberar()
+                raise
+            b.falha()
+            if i + 1 >= tentativas or not orc.gastar():
+                raise
+            espera = retry_after_s(e)
+            if espera is not None and espera > RESILIENCIA_BACKOFF_TETO:
+                raise  # o servidor pediu mais que o teto: sem prazo (batch), seria uma thread parada por horas
+            espera = backoff_s(i) if espera is None else espera
+            if p is not None and espera >= p.restante():
+                raise  # esperar estouraria o prazo: melhor falhar (ou cair no fallback) já
+            metricas.incrementar("retries_total", upstream=upstream)
+            metricas.anotar(retries=1)
+            time.sleep(espera)
+            continue
+        b.sucesso()
+        orc.depositar()
+        return out
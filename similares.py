@@ -0,0 +1,186 @@
+# similares.py — reaproveita respostas de produtos parecidos (vizinho mais próximo, sem rede)
+#
+# O cache do consultor só acerta a entrada idêntica: "caneca de porcelana 300ml" e
+# "caneca porcelana 350 ml" viram duas chamadas à IA. Aqui cada resposta da IA entra num
+# índice de vetores de n-gramas de caracteres (hashing, sem vocabulário nem modelo) e uma
+# consulta nova reaproveita a resposta do vizinho mais parecido se a similaridade de
+# cosseno passar de CONSULTOR_SIMILAR_LIMIAR.
+#
+# Só são comparadas entradas do mesmo grupo: família, categoria, fragilidade, diretriz do
+# roteador (tipo + dimensões da embalagem), faixa de peso, quantidade e dores. A caixa
+# recomendada continua certa; o que muda entre vizinhos é só o nome do produto, que é
+# trocado pelo de quem perguntou nos textos da resposta reaproveitada.
+#
+# Memória limitada: matriz pré-alocada de CONSULTOR_SIMILAR_MAX x SIMILAR_DIM em int8
+# (vetor quantizado: 100 mil entradas ~ 25 MB) + respostas comprimidas (~0,5 KB cada);
+# cheia, sobrescreve as mais antigas. O NumPy só é importado quando o índice é usado.
+import json
+import math
+import os
+import re
+import threading
+import zlib
+
+import metricas
+from cache import chave_normalizada
+from classificador import dobrar_acentos
+from tabela_consultor import faixa_peso, trocar_nome
+
+CONSULTOR_SIMILAR = os.getenv("CONSULTOR_SIMILAR", "false").lower() == "true"
+CONSULTOR_SIMILAR_LIMIAR = float(os.getenv("CONSULTOR_SIMILAR_LIMIAR", "0.7"))  # cosseno mínimo p/ reaproveitar
+CONSULTOR_SIMILAR_MAX = int(os.getenv("CONSULTOR_SIMILAR_MAX", "100000"))  # entradas (0 = desliga)
+SIMILAR_DIM = 256  # dimensões do vetor (buckets de hashing)
+SIMILAR_K = 5      # vizinhos avaliados por consulta
+
+_PALAVRAS = re.compile(r"[a-z0-9]+")
+_IRRELEVANTES = {"de", "da", "do", "das", "dos", "com", "para", "em", "e", "a", "o", "p", "kit", "un", "unidade"}
+
+# ==================== VETORES ====================
+def _ngramas(texto: str):
+    palavras = [p for p in _PALAVRAS.findall(dobrar_acentos(texto)) if p not in _IRRELEVANTES]
+    for p in palavras:
+        yield "w:" + p  # a palavra inteira pesa junto com os pedaços
+        p = f" {p} "
+        for n in (3, 4):
+            for i in range(len(p) - n + 1):
+                yield p[i:i + n]
+
+def vetor(texto: str):
+    """n-gramas (3 e 4 caracteres + palavras) com hashing assinado, tf sublinear, norma 1 (np.float32)."""
+    import numpy as np
+    contagem: dict[int, int] = {}
+    for g in _ngramas(texto):
+        h = zlib.crc32(g.encode("utf-8"))
+        contagem[h] = contagem.get(h, 0) + 1
+    v = np.zeros(SIMILAR_DIM, dtype=np.float32)
+    for h, c in contagem.items():
+        # o bit de sinal faz colisões se cancelarem em média em vez de somarem
+        v[h % SIMILAR_DIM] += (1.0 + math.log(c)) * (1.0 if h & 0x80000000 else -1.0)
+    n = float(np.linalg.norm(v))
+    return v / n if n > 0 else v
+
+def grupo(prep: dict) -> int:
+    """Id (63 bits) do que precisa ser IGUAL para duas respostas serem intercambiáveis."""
+    p = prep["payload"]
+    peso = float(p.get("peso_kg") or 0)
+    k = chave_normalizada("similar", prep["familia"], p.get("categoria"), p.get("fragilidade"), prep["tipo_preferido"],
+                          prep["embalagem_hint"], faixa_peso(peso) or math.ceil(peso), p.get("qtd_por_envio"),
+                          sorted(p.get("dores") or []))
+    return int(k[:15], 16)
+
+# ==================== ÍNDICE ====================
+class IndiceSimilares:
+    """Vetores num buffer circular; busca top-k por produto escalar dentro do grupo."""
+
+    def __init__(self, capacidade: int = CONSULTOR_SIMILAR_MAX, limiar: float = CONSULTOR_SIMILAR_LIMIAR,
+                 k: int = SIMILAR_K):
+        import numpy as np
+        self.capacidade = max(0, int(capacidade))
+        self.limiar = float(limiar)
+        self.k = max(1, int(k))
+        self._lock = threading.Lock()
+        self._vetores = np.zeros((self.capacidade, SIMILAR_DIM), dtype=np.int8)
+        self._grupos = np.zeros(self.capacidade, dtype=np.int64)
+        self._respostas: list[bytes | None] = [None] * self.capacidade
+        self._produtos: list[str | None] = [None] * self.capacidade
+        self._posicao: dict[str, int] = {}  # chave exata -> slot (não duplica a mesma entrada)
+        self._chaves: list[str | None] = [None] * self.capacidade
+        self._proximo = 0
+        self._n = 0
+        self._stats = {"consultas": 0, "acertos": 0}
+
+    def __len__(self):
+        return self._n
+
+    def adicionar(self, prep: dict, resposta: dict):
+        if self.capacidade == 0:
+            return
+        produto = prep["payload"].get("produto") or ""
+        g = grupo(prep)
+        chave = f"{g}:{' '.join(_PALAVRAS.findall(dobrar_acentos(produto)))}"
+        v = vetor(produto)
+        dado = zlib.compress(json.dumps(resposta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        with self._lock:
+            i = self._posicao.get(chave)
+            if i is None:
+                i = self._proximo
+                self._proximo = (i + 1) % self.capacidade
+                self._n = min(self._n + 1, self.capacidade)
+                antiga = self._chaves[i]
+                if antiga is not None:
+                    self._posicao.pop(antiga, None)
+                self._posicao[chave] = i
+                self._chaves[i] = chave
+            self._vetores[i] = (v * 127.0).round()  # norma 1 -> componentes em [-1, 1]
+            self._grupos[i] = g
+            self._respostas[i] = dado
+            self._produtos[i] = produto
+
+    def vizinhos(self, prep: dict) -> list[tuple[float, int, str]]:
+        """Até k (similaridade, slot, chave do slot) do mesmo grupo, da mais parecida para a menos."""
+        import numpy as np
+        if self._n == 0:
+            return []
+        g = grupo(prep)
+        q = vetor(prep["payload"].get("produto") or "")
+        with self._lock:
+            idx = np.flatnonzero(self._grupos[:self._n] == g)
+            if idx.size == 0:
+                return []
+            sims = self._vetores[idx].astype(np.float32) @ (q / 127.0)
+            k = min(self.k, idx.size)
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            # a chave identifica a entrada: o slot pode ser sobrescrito depois que o lock sai
+            return [(float(sims[t]), int(idx[t]), self._chaves[int(idx[t])]) for t in top]
+
+    def buscar(self, prep: dict) -> tuple[dict, str, float] | None:
+        """(resposta, produto de origem, similaridade) do melhor vizinho acima do limiar, ou None.
+
+        A resposta vem com o produto de quem perguntou no lugar do produto de origem.
+        """
+        dado = produto = sim = None
+        viz = self.vizinhos(prep)
+        with self._lock:
+            for s, slot, chave in viz:
+                if s < self.limiar:
+                    break
+                if self._chaves[slot] == chave:  # ainda é a mesma entrada (o anel não girou por cima)
+                    dado, produto, sim = self._respostas[slot], self._produtos[slot], round(s, 4)
+                    break
+            acerto = dado is not None
+            self._stats["consultas"] += 1
+            self._stats["acertos"] += acerto
+        metricas.incrementar("similar_consultas_total", resultado="hit" if acerto else "miss")
+        if not acerto:
+            return None
+        metricas.anotar(similar=sim)
+        resposta = trocar_nome(json.loads(zlib.decompress(dado)), produto, prep["payload"].get("produto"))
+        return resposta, produto, sim
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["itens"] = self._n
+            s["capacidade"] = self.capacidade
+            bytes_resp = sum(len(r) for r in self._respostas[:self._n] if r)
+        s["hit_rate"] = round(s["acertos"] / s["consultas"], 4) if s["consultas"] else 0.0
+        s["memoria_mb"] = round((self._vetores.nbytes + self._grupos.nbytes + bytes_resp) / 2**20, 1)
+        return s
+
+_indice: IndiceSimilares | None = None
+_indice_lock = threading.Lock()
+
+def obter_indice() -> IndiceSimilares | None:
+    """Índice do processo (None se CONSULTOR_SIMILAR estiver desligado)."""
+    global _indice
+    if not CONSULTOR_SIMILAR or CONSULTOR_SIMILAR_MAX <= 0:
+        return None
+    with _indice_lock:
+        if _indice is None:
+            _indice = IndiceSimilares()
+        return _indice
+
+def stats_similares() -> dict:
+    """{"similares": stats} para juntar a stats_caches() (vazio se desligado)."""
+    return {"similares": _indice.stats()} if _indice is not None else {}
@@ -0,0 +1,293 @@
+# tabela_consultor.py — respostas da IA pré-computadas para a grade do roteador
+#
+# Uso:
+#   python tabela_consultor.py -o .cache/tabela_consultor.json.gz -c 8
+#   python tabela_consultor.py -o .cache/tabela_consultor.json.gz --produtos catalogo.csv --top 200
+#
+# O roteador reduz a entrada a poucas combinações: família (6, sem "outros") x
+# fragilidade (3) x embalagem (tamanhos de ESTIMATIVAS_DIM + o chute genérico de cada
+# família) x faixa de peso (CONSULTOR_TABELA_PESOS). Este script pede a recomendação da
+# IA para a grade inteira (e para os N produtos mais frequentes de um catálogo) e grava
+# tudo num JSON gzip versionado. O app/API carrega o arquivo no import (CONSULTOR_TABELA)
+# e responde essas combinações sem chamar a IA.
+#
+# A grade é gerada com um nome genérico por família ("peça de roupa") e o peso do topo da
+# faixa; ao servir, o nome genérico no texto da resposta vira o produto de quem perguntou.
+# "outros" fica fora: a família não diz nada sobre o item.
+#
+# O arquivo guarda a assinatura do prompt (prompts.ASSINATURA_PROMPT) e o modelo: se
+# qualquer um mudar, a tabela é ignorada até ser gerada de novo.
+import argparse
+import bisect
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+from cache import chave_normalizada
+from classificador import dobrar_acentos
+from prompts import ASSINATURA_PROMPT
+
+CONSULTOR_TABELA = os.getenv("CONSULTOR_TABELA", ".cache/tabela_consultor.json.gz")  # vazio = desliga
+# limites (kg) das faixas de peso da grade; acima do último, a consulta vai para a IA
+CONSULTOR_TABELA_PESOS = [float(p) for p in os.getenv("CONSULTOR_TABELA_PESOS", "0.5,1,2,5").split(",") if p.strip()]
+FORMATO = 2  # suba se o layout do arquivo mudar
+
+FRAGILIDADES = ("Baixa", "Média", "Alta")
+# Um produto que o classificador põe em cada família (só para o roteador achar a família)
+PRODUTO_POR_FAMILIA = {
+    "textil": "camiseta",
+    "livro_papel": "livro",
+    "ceramica_vidro": "caneca de cerâmica",
+    "eletronicos_leves": "carregador",
+    "cosmeticos": "creme",
+    "joias_acessorios": "pulseira",
+}
+# O que a IA vê como "Produto" na grade: genérico, trocado pelo produto real ao servir
+ROTULO_POR_FAMILIA = {
+    "textil": "peça de roupa",
+    "livro_papel": "livro ou caderno",
+    "ceramica_vidro": "peça de cerâmica ou vidro",
+    "eletronicos_leves": "eletrônico pequeno",
+    "cosmeticos": "frasco de cosmético",
+    "joias_acessorios": "joia ou acessório",
+}
+
+# ==================== CHAVES ====================
+def faixa_peso(peso_kg: float) -> float | None:
+    """Menor limite de CONSULTOR_TABELA_PESOS que comporta o peso; None acima do último."""
+    i = bisect.bisect_left(CONSULTOR_TABELA_PESOS, round(float(peso_kg), 3))
+    return CONSULTOR_TABELA_PESOS[i] if i < len(CONSULTOR_TABELA_PESOS) else None
+
+def chave_grade(familia: str, fragilidade: str, tipo_preferido: str, embalagem_hint: str, faixa: float) -> str:
+    return chave_normalizada("grade", familia, fragilidade, tipo_preferido, embalagem_hint, faixa)
+
+def chave_produto(prep: dict) -> str:
+    p = dict(prep["payload"])
+    p["dores"] = sorted(p.get("dores") or [])
+    return chave_normalizada("produto", p, prep["tipo_preferido"], prep["embalagem_hint"])
+
+def na_grade(prep: dict) -> bool:
+    """A grade vale para 1 unidade sem dores específicas, de família conhecida e até o maior peso."""
+    p = prep["payload"]
+    return (p.get("qtd_por_envio") == 1 and not p.get("dores") and prep["familia"] in ROTULO_POR_FAMILIA
+            and faixa_peso(p.get("peso_kg") or 0) is not None)
+
+_PALAVRAS = re.compile(r"[a-z0-9]+")
+
+def _dobrado(texto: str) -> tuple[str, list[int]]:
+    # texto sem acento/caixa + posição no original de cada caractere dobrado
+    partes, origem = [], []
+    for i, ch in enumerate(texto):
+        d = dobrar_acentos(ch)
+        partes.append(d)
+        origem.extend([i] * len(d))
+    return "".join(partes), origem
+
+def _trocar_texto(texto: str, padrao, novo: str) -> str:
+    dobrado, origem = _dobrado(texto)
+    partes, fim = [], 0
+    for m in padrao.finditer(dobrado):
+        ini = origem[m.start()]
+        partes += [texto[fim:ini], novo]
+        fim = origem[m.end() - 1] + 1
+    return "".join(partes) + texto[fim:] if partes else texto
+
+def _trocar(v, padrao, novo: str):
+    if isinstance(v, str):
+        return _trocar_texto(v, padrao, novo)
+    if isinstance(v, list):
+        return [_trocar(x, padrao, novo) for x in v]
+    if isinstance(v, dict):
+        return {k: _trocar(x, padrao, novo) for k, x in v.items()}
+    return v
+
+def trocar_nome(resposta: dict, antigo: str, novo: str) -> dict:
+    """`antigo` -> `novo` em todos os textos da resposta; também usado por similares.py.
+
+    Casa só palavras inteiras, sem acento nem caixa e com plural simples (como o classificador):
+
+    >>> trocar_nome({"t": "Fone bem protegido; o telefone não."}, "fone", "headset")
+    {'t': 'headset bem protegido; o telefone não.'}
+    >>> trocar_nome({"t": ["Peças de Roupa dobradas", "panela"]}, "peça de roupa", "camiseta")
+    {'t': ['camiseta dobradas', 'panela']}
+    """
+    antigo, novo = (antigo or "").strip(), (novo or "").strip()
+    palavras = _PALAVRAS.findall(dobrar_acentos(antigo))
+    if not palavras or not novo or palavras == _PALAVRAS.findall(dobrar_acentos(novo)):
+        return resposta
+    corpo = "[^a-z0-9]+".join(re.escape(p) + "(?:es|s)?" for p in palavras)
+    return _trocar(resposta, re.compile(rf"(?<![a-z0-9]){corpo}(?![a-z0-9])"), novo)
+
+def personalizar(resposta: dict, familia: str, produto: str) -> dict:
+    """Resposta da grade com o produto real no lugar do nome genérico da família."""
+    return trocar_nome(resposta, ROTULO_POR_FAMILIA.get(familia), produto)
+
+# ==================== ÍNDICE EM MEMÓRIA ====================
+class TabelaConsultor:
+    """chave -> JSON cru da resposta; vazia se o arquivo não existe ou foi gerado com outro prompt."""
+
+    def __init__(self, celulas: dict | None = None, modelo: str | None = None, motivo: str | None = None):
+        self.celulas = celulas or {}
+        self.modelo = modelo
+        self.motivo = motivo  # por que está vazia (sem_arquivo, prompt_mudou, ...)
+
+    def __len__(self):
+        return len(self.celulas)
+
+    def buscar(self, prep: dict, model: str) -> dict | None:
+        if not self.celulas or model != self.modelo:
+            return None
+        content, grade = self.celulas.get(chave_produto(prep)), False
+        if content is None and na_grade(prep):
+            p = prep["payload"]
+            content, grade = self.celulas.get(chave_grade(
+                prep["familia"], p.get("fragilidade"), prep["tipo_preferido"], prep["embalagem_hint"],
+                faixa_peso(p.get("peso_kg") or 0))), True
+        metricas.incrementar("tabela_consultor_total", resultado="hit" if content is not None else "miss")
+        if content is None:
+            return None
+        metricas.anotar(tabela_consultor="grade" if grade else "produto")
+        # um dict novo por hit (sem aliasing entre sessões)
+        resposta = json.loads(content)
+        return personalizar(resposta, prep["familia"], prep["payload"].get("produto")) if grade else resposta
+
+def carregar(path: str) -> TabelaConsultor:
+    if not path or not os.path.exists(path):
+        return TabelaConsultor(motivo="sem_arquivo")
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        return TabelaConsultor(motivo="arquivo_invalido")
+    if dados.get("formato") != FORMATO:
+        return TabelaConsultor(motivo="formato")
+    if dados.get("assinatura_prompt") != ASSINATURA_PROMPT:
+        return TabelaConsultor(motivo="prompt_mudou")
+    return TabelaConsultor(dados.get("celulas") or {}, dados.get("modelo"))
+
+def salvar(path: str, celulas: dict, modelo: str):
+    pasta = os.path.dirname(os.path.abspath(path))
+    os.makedirs(pasta, exist_ok=True)
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump({"formato": FORMATO, "assinatura_prompt": ASSINATURA_PROMPT, "modelo": modelo,
+                   "gerada_em": time.strftime("%Y-%m-%dT%H:%M:%S"), "celulas": celulas},
+                  f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)  # quem lê nunca vê um arquivo pela metade
+
+# Carregada uma vez por processo (sys.modules mantém entre reruns do Streamlit)
+TABELA = carregar(CONSULTOR_TABELA)
+
+def buscar(prep: dict, model: str) -> dict | None:
+    """Resposta pré-computada para o `preparar_consulta`, ou None (fora da tabela)."""
+    return TABELA.buscar(prep, model)
+
+def recarregar(path: str | None = None) -> TabelaConsultor:
+    global TABELA
+    TABELA = carregar(path or CONSULTOR_TABELA)
+    return TABELA
+
+# ==================== GERAÇÃO ====================
+def tamanhos_por_familia() -> dict:
+    """Família -> dimensões de item (cm): as de ESTIMATIVAS_DIM + o chute genérico do estimador."""
+    from consultor import ESTIMATIVAS_DIM, estimar_dimensoes_se_necessario
+    out = {fam: [] for fam in PRODUTO_POR_FAMILIA}
+    for (fam, _), dims in ESTIMATIVAS_DIM.items():
+        if dims not in out[fam]:
+            out[fam].append(dims)
+    for fam in out:
+        generico = tuple(estimar_dimensoes_se_necessario("", fam))
+        if generico not in out[fam]:
+            out[fam].append(generico)
+    return out
+
+def consultas_da_grade() -> list[tuple[str, dict]]:
+    """(chave, prep) para cada família x fragilidade x tamanho x faixa de peso (pelo topo da faixa)."""
+    from consultor import preparar_consulta
+    out = []
+    for fam, tamanhos in tamanhos_por_familia().items():
+        for dims in tamanhos:
+            for frag in FRAGILIDADES:
+                for faixa in CONSULTOR_TABELA_PESOS:
+                    prep = preparar_consulta(PRODUTO_POR_FAMILIA[fam], frag, peso_kg=faixa, dim="{}x{}x{}".format(*dims))
+                    prep["payload"]["produto"] = ROTULO_POR_FAMILIA[fam]
+                    out.append((chave_grade(fam, frag, prep["tipo_preferido"], prep["embalagem_hint"], faixa), prep))
+    return out
+
+def consultas_do_catalogo(path: str, top: int) -> list[tuple[str, dict]]:
+    """(chave, prep) dos `top` itens mais repetidos do catálogo (mesmo formato do batch.py)."""
+    from batch import ler_catalogo, normalizar_linha
+    from consultor import EntradaInvalida, parse_dimensions, preparar_consulta, validar_entrada
+    contagem, itens = Counter(), {}
+    for _, row in ler_catalogo(path):
+        try:
+            item = validar_entrada(normalizar_linha(row))
+        except EntradaInvalida:
+            continue  # linha inválida: o batch.py a marca com "erro"
+        for campo in ("cep_from", "cep_to", "matriz", "nao_sei_dim"):
+            item.pop(campo)
+        k = chave_normalizada(item)
+        contagem[k] += 1
+        itens.setdefault(k, item)
+    out = []
+    for k, _ in contagem.most_common(top):
+        item = itens[k]
+        prep = preparar_consulta(
+            item["produto"], item["fragilidade"], qtd=item["qtd"], peso_kg=item["peso_kg"],
+            categoria=item["categoria"], dim=item["dim"], nao_sei_dim=not parse_dimensions(item["dim"] or ""),
+            tamanho_roupa=item["tamanho_roupa"], dores=item["dores"],
+        )
+        if prep:
+            out.append((chave_produto(prep), prep))
+    return out
+
+def gerar(consultas: list[tuple[str, dict]], model: str, concorrencia: int = 4) -> tuple[dict, list]:
+    """Chama a IA para cada consulta (com o cache do consultor); devolve (celulas, erros)."""
+    from consultor import call_consultor_ia
+
+    def _uma(prep):
+        res = call_consultor_ia(prep["payload"], prep["tipo_preferido"], prep["embalagem_hint"], model=model)
+        return json.dumps(res, ensure_ascii=False, separators=(",", ":"))
+
+    celulas, erros = {}, []
+    unicas = dict(consultas)  # tamanhos repetidos entre famílias/catálogo viram uma chamada só
+    with ThreadPoolExecutor(max_workers=max(1, concorrencia)) as ex:
+        futuros = [(k, ex.submit(_uma, prep)) for k, prep in unicas.items()]
+        for k, fut in futuros:
+            try:
+                celulas[k] = fut.result()
+            except Exception as e:
+                erros.append(f"{k[:12]}: {type(e).__name__}: {e}")
+    return celulas, erros
+
+# ==================== CLI ====================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Gera a tabela pré-computada de respostas do consultor (IA).")
+    ap.add_argument("-o", "--saida", default=CONSULTOR_TABELA or ".cache/tabela_consultor.json.gz")
+    ap.add_argument("--modelo", default="gpt-4o-mini")
+    ap.add_argument("--produtos", help="catálogo CSV/JSONL (formato do batch.py) para os produtos mais frequentes")
+    ap.add_argument("--top", type=int, default=100, help="quantos produtos do catálogo entram")
+    ap.add_argument("-c", "--concorrencia", type=int, default=4)
+    args = ap.parse_args(argv)
+
+    consultas = consultas_da_grade()
+    if args.produtos:
+        consultas += consultas_do_catalogo(args.produtos, max(0, args.top))
+    t0 = time.perf_counter()
+    celulas, erros = gerar(consultas, args.modelo, args.concorrencia)
+    for e in erros:
+        print("erro:", e, file=sys.stderr)
+    if not celulas:
+        sys.exit("Nenhuma resposta gerada; a tabela não foi gravada.")
+    salvar(args.saida, celulas, args.modelo)
+    print(f"{len(celulas)} respostas ({len(erros)} erros) em {time.perf_counter() - t0:.1f}s -> {args.saida} "
+          f"[{ASSINATURA_PROMPT}, {args.modelo}]", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
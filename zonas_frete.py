@@ -0,0 +1,169 @@
+# zonas_frete.py — tabela de fretes por zona de CEP (FRETE_MODO=zonas)
+#
+# O preço do frete depende da região de origem/destino, não do CEP exato: 01001-000 e
+# 01310-100 custam o mesmo para 20010-000. Aqui cada CEP vira uma zona (faixas de um
+# arquivo ou os primeiros FRETE_ZONA_DIGITOS dígitos) e cada célula zona_origem x
+# zona_destino x faixa de peso x faixa de dimensões guarda a cotação real do pacote no
+# limite de cima da faixa (peso máximo e arestas máximas), que vale para qualquer pedido
+# dela. Todo pedido recebe essa cotação, marcada como estimativa; só células novas ou
+# vencidas (FRETE_ZONA_TTL) chamam a SuperFrete — as vencidas em segundo plano,
+# servindo o valor anterior enquanto isso.
+#
+# Arquivo de faixas (FRETE_ZONAS_ARQUIVO), CSV com cabeçalho:
+#   cep_inicio,cep_fim,zona
+#   01000000,05999999,SP-capital
+#   06000000,19999999,SP-interior
+# CEPs fora das faixas caem no prefixo.
+import bisect
+import csv
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+from cache import chave_normalizada, obter_cache, obter_single_flight
+
+FRETE_ZONA_DIGITOS = int(os.getenv("FRETE_ZONA_DIGITOS", "3"))  # prefixo do CEP que define a zona
+FRETE_ZONAS_ARQUIVO = os.getenv("FRETE_ZONAS_ARQUIVO", "")  # CSV cep_inicio,cep_fim,zona (opcional)
+FRETE_ZONA_TTL = float(os.getenv("FRETE_ZONA_TTL", "604800"))  # s até a célula ser recotada (7 dias)
+FRETE_ZONA_PESOS = [float(p) for p in os.getenv(
+    "FRETE_ZONA_PESOS", "0.3,0.5,0.75,1,1.5,2,3,4,5,6,7,8,9,10,12,15,20,25,30").split(",") if p.strip()]
+FRETE_ZONA_DIM_PASSO = float(os.getenv("FRETE_ZONA_DIM_PASSO", "5"))  # cm
+FRETE_ZONAS_MAX = int(os.getenv("FRETE_ZONAS_MAX", "50000"))  # células em memória
+FRETE_ZONAS_DB = os.getenv("FRETE_ZONAS_DB", "")  # ex.: .cache/frete_zonas.sqlite (sobrevive a restarts)
+
+# ==================== ZONAS ====================
+def ler_faixas(path: str) -> list[tuple[int, int, str]]:
+    """CSV cep_inicio,cep_fim,zona -> [(inicio, fim, zona)] ordenado pelo início."""
+    faixas = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            row = {str(k).strip().lower(): (v or "").strip() for k, v in row.items() if k is not None}
+            ini, fim = "".join(filter(str.isdigit, row.get("cep_inicio", ""))), "".join(filter(str.isdigit, row.get("cep_fim", "")))
+            if len(ini) == 8 and len(fim) == 8 and row.get("zona"):
+                faixas.append((int(ini), int(fim), row["zona"]))
+    faixas.sort()
+    return faixas
+
+_faixas = ler_faixas(FRETE_ZONAS_ARQUIVO) if FRETE_ZONAS_ARQUIVO else []
+_inicios = [f[0] for f in _faixas]
+
+def zona_do_cep(cep: str) -> str:
+    """Zona de um CEP (8 dígitos): a faixa do arquivo que o contém ou o prefixo."""
+    if _faixas:
+        n = int(cep)
+        i = bisect.bisect_right(_inicios, n) - 1
+        if i >= 0 and n <= _faixas[i][1]:
+            return _faixas[i][2]
+    return cep[:FRETE_ZONA_DIGITOS]
+
+# ==================== FAIXAS DE PESO/DIMENSÃO ====================
+def faixa_peso(peso_kg: float) -> float:
+    """Menor limite de FRETE_ZONA_PESOS que comporta o peso (acima do último: kg inteiro)."""
+    i = bisect.bisect_left(FRETE_ZONA_PESOS, round(float(peso_kg), 3))
+    if i < len(FRETE_ZONA_PESOS):
+        return FRETE_ZONA_PESOS[i]
+    return float(-(-float(peso_kg) // 1))
+
+def faixa_dims(dims) -> tuple:
+    """Arestas em ordem crescente, arredondadas para cima no passo (a orientação não muda o preço)."""
+    passo = FRETE_ZONA_DIM_PASSO if FRETE_ZONA_DIM_PASSO > 0 else 1.0
+    return tuple(int(-(-x // passo) * passo) for x in sorted(dims))
+
+def celula(cep_from: str, cep_to: str, dims, peso_kg: float) -> tuple:
+    """(zona de origem, zona de destino, peso máximo da faixa, arestas máximas da faixa)."""
+    return (zona_do_cep(cep_from), zona_do_cep(cep_to), faixa_peso(peso_kg), faixa_dims(dims))
+
+# ==================== TABELA ====================
+def _tabela():
+    # ttl=0: a célula não expira no cache; a idade é decidida aqui (vencida ainda serve)
+    return obter_cache("frete_zonas", maxsize=FRETE_ZONAS_MAX, ttl=0,
+                       db_path=FRETE_ZONAS_DB or None, db_max_linhas=FRETE_ZONAS_MAX * 4)
+
+_recotando: set[str] = set()
+_recotando_lock = threading.Lock()
+_pool = None
+
+def _pool_recotacao() -> ThreadPoolExecutor:
+    global _pool
+    with _recotando_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="frete-zonas")
+        return _pool
+
+def _compacta(cot: dict) -> dict:
+    # sem o '_raw' das ofertas: a célula vai para memória/SQLite
+    limpa = lambda o: {k: v for k, v in o.items() if k != "_raw"}
+    return {"best_price": limpa(cot["best_price"]), "best_time": limpa(cot["best_time"]),
+            "offers": [limpa(o) for o in cot.get("offers") or []]}
+
+def _atualizar(chave: str, cotar, dims, peso_kg: float) -> dict:
+    """Cota de verdade o pacote no limite da faixa e grava a célula se deu certo; devolve a cotação como veio."""
+    cot = cotar(dims, peso_kg)
+    if not cot.get("error") and not cot.get("stale"):
+        _tabela().set(chave, {"cot": _compacta(cot), "ts": time.time()})
+    return cot
+
+def semear(cep_from: str, cep_to: str, dims, peso_kg: float, cot: dict, ts: float) -> bool:
+    """Preenche a célula com uma cotação real já conhecida (ex.: do histórico), se ela estiver vazia
+    ou for mais antiga. `dims`/`peso_kg` são os do pacote cotado (peso já com a caixa); só serve
+    a cotação de um pacote que já está no limite da faixa. True se gravou."""
+    if cot.get("error") or cot.get("stale") or cot.get("estimativa"):
+        return False
+    if FRETE_ZONA_TTL > 0 and time.time() - ts > FRETE_ZONA_TTL:
+        return False
+    zo, zd, fp, fd = celula(cep_from, cep_to, dims, peso_kg)
+    if abs(fp - float(peso_kg)) > 1e-6 or any(abs(a - b) > 1e-6 for a, b in zip(fd, sorted(dims))):
+        return False  # pacote menor que o limite: a cotação subestimaria o resto da faixa
+    chave = chave_normalizada("frete_zonas", zo, zd, fp, fd)
+    item = _tabela().get(chave)
+    if item is not None and item["ts"] >= ts:
+        return False
+    _tabela().set(chave, {"cot": _compacta(cot), "ts": ts})
+    return True
+
+def _recotar_em_segundo_plano(chave: str, cotar, dims, peso_kg: float):
+    with _recotando_lock:
+        if chave in _recotando:
+            return
+        _recotando.add(chave)
+
+    def _rodar():
+        try:
+            obter_single_flight("frete_zonas").do(chave, lambda: _atualizar(chave, cotar, dims, peso_kg))
+        except Exception:
+            metricas.incrementar("frete_zonas_total", resultado="erro_recotacao")
+        finally:
+            with _recotando_lock:
+                _recotando.discard(chave)
+
+    _pool_recotacao().submit(_rodar)
+
+def cotar_por_zona(cep_from: str, cep_to: str, dims, peso_kg: float, cotar) -> dict:
+    """Cotação da célula do pedido; `cotar(dims, peso_kg)` só para célula nova ou vencida, e sempre
+    com o pacote no limite de cima da faixa, nunca com o do pedido.
+
+    Célula conhecida: devolve a cotação guardada com estimativa=True e a zona. Vencida:
+    o mesmo, e recota em segundo plano. Nova: espera a cotação da faixa (pedidos simultâneos
+    da mesma célula compartilham a chamada e recebem a mesma estimativa).
+    """
+    zo, zd, fp, fd = celula(cep_from, cep_to, dims, peso_kg)
+    chave = chave_normalizada("frete_zonas", zo, zd, fp, fd)
+    zona = {"estimativa": True, "zona": f"{zo}>{zd}"}
+    limite = (fd[::-1], fp)  # arestas da maior para a menor (comprimento x largura x altura)
+    item = _tabela().get(chave)
+    if item is not None:
+        vencida = FRETE_ZONA_TTL > 0 and time.time() - item["ts"] > FRETE_ZONA_TTL
+        metricas.incrementar("frete_zonas_total", resultado="vencida" if vencida else "hit")
+        metricas.anotar(frete_zona="vencida" if vencida else "hit")
+        if vencida:
+            _recotar_em_segundo_plano(chave, cotar, *limite)
+        return {**item["cot"], **zona, "idade_s": int(time.time() - item["ts"])}
+
+    metricas.incrementar("frete_zonas_total", resultado="miss")
+    metricas.anotar(frete_zona="miss")
+    cot = obter_single_flight("frete_zonas").do(chave, lambda: _atualizar(chave, cotar, *limite))
+    if cot.get("error") or cot.get("stale"):
+        return cot
+    return {**cot, **zona, "idade_s": 0}